@@ -16,9 +16,12 @@ from io import StringIO
 import contextlib
 from importlib.machinery import SourceFileLoader
 import tempfile
+import pickle
+import traceback
 from collections import OrderedDict
 
 from lopper.fmt import LopperFmt
+from lopper.cache import LopperCache
 
 from lopper.tree import LopperNode, LopperTree, LopperTreePrinter, LopperProp
 import lopper.tree
@@ -76,8 +79,18 @@ class LopperSDT:
       - tree (LopperTree): node/property representation of the system device tree
       - dry_run (bool): whether or not changes should be written to disk
       - output_file (string): default output file for writing
+      - jobs (int): the maximum number of lops (or batch jobs) to execute concurrently
+      - include_paths (string): the paths searched for files included by the inputs
+      - lop_handlers (OrderedDict): class variable, the registered lop handlers
+                                    (regex, handler), indexed by lop type. See
+                                    lop_register()
+      - lop_dispatch (dict): class variable, the handler of each lop compatible
+                             string that has been executed
 
     """
+    lop_handlers = OrderedDict()
+    lop_dispatch = {}
+
     def __init__(self, sdt_file):
         self.dts = sdt_file
         self.dtb = ""
@@ -99,6 +112,9 @@ class LopperSDT:
         self.permissive = False
         self.merge = False
         self.support_files = False
+        self.warm_start = False
+        self.jobs = 1
+        self.include_paths = ""
 
     def setup(self, sdt_file, input_files, include_paths, force=False, libfdt=True, config=None):
         """executes setup and initialization tasks for a system device tree
@@ -113,6 +129,10 @@ class LopperSDT:
            force (bool,optional): flag indicating if files should be overwritten and compilation
                                   forced. Default is False.
 
+        If warm_start is set, a snapshot of the loaded system device tree is
+        kept in the cache (see LopperCache), and is used instead of compiling
+        and loading the tree when the inputs are unchanged.
+
         Returns:
            Nothing
 
@@ -237,32 +257,109 @@ class LopperSDT:
             # we need the original location of the main SDT file on the search path
             # in case there are dtsi files, etc.
             include_paths += " " + str(sdt_file.parent) + " "
-            self.dtb = Lopper.dt_compile( fp, input_files, include_paths, force, self.outdir,
-                                          self.save_temps, self.verbose, self.enhanced, self.permissive )
 
-            if self.use_libfdt:
-                self.FDT = Lopper.dt_to_fdt(self.dtb, 'rb')
-            else:
-                lopper.log._info( f"using python devicetree for parsing" )
+            snapshot_cache = None
+            snapshot_secret = None
+            if self.warm_start:
+                # warm start uses the cache, even if it isn't enabled for
+                # the compiled inputs
+                snapshot_cache = LopperCache.open( enable = True )
+                # snapshots are unpickled, so they are only used from a cache
+                # that others can't write, and must be authenticated with a
+                # secret that only the user can read
+                if snapshot_cache:
+                    snapshot_secret = snapshot_cache.secret()
+                    if not snapshot_secret or not snapshot_cache.trusted():
+                        lopper.log._warning( f"cache {snapshot_cache.path} is not private, warm start is disabled" )
+                        snapshot_cache = None
+
+            self.tree = None
+            if snapshot_cache:
+                # the snapshot key covers everything that was used to build
+                # the tree, except for the files included by the inputs. They
+                # are dependencies of the snapshot entry
+                lopper_sources = sorted( Path( lopper_directory ).glob( "*.py" ) )
+                snapshot_key = snapshot_cache.key( "snapshot", LopperTree.snapshot_version,
+                                                   [ LopperCache.file_digest( f ) for f in lopper_sources ],
+                                                   [ LopperCache.tool_id( t ) for t in [ "cpp", "pcpp", "dtc" ] ],
+                                                   sorted( (k,v) for k,v in os.environ.items() if k.startswith( "LOPPER_" ) ),
+                                                   os.getcwd(), self.outdir, include_paths, self.use_libfdt,
+                                                   self.enhanced, self.permissive, self.merge,
+                                                   [ (f, LopperCache.file_digest( f )) for f in sdt_files ] )
+                snapshot_dtb_key = snapshot_cache.key( snapshot_key, "dtb" )
+
+                snapshot, messages = snapshot_cache.lookup( snapshot_key )
+                snapshot_dtb = None
+                if snapshot and self.use_libfdt:
+                    snapshot_dtb, messages = snapshot_cache.lookup( snapshot_dtb_key )
+
+                if snapshot and (snapshot_dtb or not self.use_libfdt) and \
+                   snapshot_cache.trusted( snapshot ):
+                    self.tree = LopperTree.snapshot_read( str(snapshot), snapshot_key, snapshot_secret )
+
+                if self.tree:
+                    lopper.log._info( f"system device tree loaded from snapshot: {snapshot}" )
+                    # the dtb is in the cache, make sure it isn't cleaned up
+                    self.dtb = None
+                    if self.use_libfdt:
+                        self.FDT = Lopper.dt_to_fdt( str(snapshot_dtb), 'rb' )
+                    else:
+                        self.FDT = None
 
-                # TODO: "FDT" should now be "token" or something equally generic
-                self.FDT = self.dtb
-                self.dtb = ""
+                # collect the dependencies of the (cached) compilation
+                LopperCache.dependencies.clear()
 
-            dct = Lopper.export( self.FDT )
+            if not self.tree:
+                self.dtb = Lopper.dt_compile( fp, input_files, include_paths, force, self.outdir,
+                                              self.save_temps, self.verbose, self.enhanced, self.permissive )
 
-            self.tree = LopperTree()
-            self.tree.strict = not self.permissive
-            self.tree.load( dct )
+                if self.use_libfdt:
+                    self.FDT = Lopper.dt_to_fdt(self.dtb, 'rb')
+                else:
+                    lopper.log._info( f"using python devicetree for parsing" )
+
+                    # TODO: "FDT" should now be "token" or something equally generic
+                    self.FDT = self.dtb
+                    self.dtb = ""
 
-            # join any extended trees to the one we just created
-            for t in sdt_extended_trees:
-                for node in t:
-                    if node.abs_path != "/":
-                        # old: deep copy the node
-                        # new_node = node()
-                        # assign it to the main system device tree
-                        self.tree = self.tree.add( node, merge=self.merge )
+                if self.use_libfdt:
+                    # the nodes are loaded as the FDT is walked, and properties
+                    # are decoded as they are used
+                    dct = Lopper.export_nodes( self.FDT, lazy=True )
+                else:
+                    dct = Lopper.export( self.FDT )
+
+                self.tree = LopperTree()
+                self.tree.strict = not self.permissive
+                self.tree.load( dct )
+
+                # join any extended trees to the one we just created
+                for t in sdt_extended_trees:
+                    for node in t:
+                        if node.abs_path != "/":
+                            # old: deep copy the node
+                            # new_node = node()
+                            # assign it to the main system device tree
+                            self.tree = self.tree.add( node, merge=self.merge )
+
+                if snapshot_cache:
+                    snapshot_deps = list( LopperCache.dependencies ) + \
+                                    [ os.path.abspath( f ) for f in sdt_files ]
+                    # the concatenated input is temporary, its contents are
+                    # covered by the input files
+                    snapshot_deps = [ d for d in snapshot_deps if d != os.path.abspath( fpp.name ) ]
+
+                    # a snapshot that can't be written is not an error, the
+                    # next run compiles the inputs again
+                    try:
+                        with tempfile.TemporaryDirectory() as snapshot_dir:
+                            snapshot = os.path.join( snapshot_dir, "snapshot" )
+                            if self.tree.snapshot_write( snapshot, snapshot_key, snapshot_secret ):
+                                if self.use_libfdt:
+                                    snapshot_cache.store( snapshot_dtb_key, self.dtb, snapshot_deps )
+                                snapshot_cache.store( snapshot_key, snapshot, snapshot_deps )
+                    except OSError as e:
+                        lopper.log._warning( f"unable to write the warm start snapshot: {e}" )
 
             fpp.close()
         elif re.search( ".yaml$", self.dts ):
@@ -329,12 +426,16 @@ class LopperSDT:
             # the system device tree is a dtb
             self.dtb = sdt_file
             self.dts = sdt_file
-            if not self.use_libfdt:
-                lopper.log._error( f"dtb system device tree passed ({self.dts}), and libfdt is disabled" )
-                sys.exit(1)
-            self.FDT = Lopper.dt_to_fdt(self.dtb, 'rb')
+            if self.use_libfdt:
+                self.FDT = Lopper.dt_to_fdt(self.dtb, 'rb')
+                nodes = Lopper.export_nodes( self.FDT, lazy=True )
+            else:
+                # no libfdt, the dtb is read directly
+                self.FDT = None
+                with open( self.dtb, 'rb' ) as f:
+                    nodes = Lopper.dtb_export_nodes( f.read(), lazy=True )
             self.tree = LopperTree()
-            self.tree.load( Lopper.export( self.FDT ) )
+            self.tree.load( nodes )
             self.tree.strict = not self.permissive
 
         try:
@@ -375,6 +476,27 @@ class LopperSDT:
             print( "   output: %s" % self.output_file )
             print( "" )
 
+        self.include_paths = include_paths
+        self.lops.extend( self.lops_load( lop_files, include_paths, force, config ) )
+
+    def lops_load( self, lop_files, include_paths = "", force = False, config = None ):
+        """Load lop files
+
+        Compiles (if required) and loads lop files (.dts, .dtb, .yaml or .json)
+        into lop containers that can be queued for execution.
+
+        Args:
+           lop_files (list): the lop files
+           include_paths (string,optional): paths to search for included files
+           force (bool,optional): flag indicating if files should be overwritten and compilation
+                                  forced. Default is False.
+           config (ConfigParser,optional): the lopper configuration
+
+        Returns:
+           list: the loaded lops (LopperFile)
+
+        """
+        lops = []
         # Individually compile the input files. At some point these may be
         # concatenated with the main SDT if dtc is doing some of the work, but for
         # now, libfdt is doing the transforms so we compile them separately
@@ -399,7 +521,7 @@ class LopperSDT:
                     lop.tree = LopperTree()
                     lop.tree.load( dct )
 
-                self.lops.append( lop )
+                lops.append( lop )
             elif re.search( ".yaml$", ifile ):
                 yaml = LopperYAML( ifile, config=config )
                 yaml_tree = yaml.to_tree()
@@ -409,7 +531,7 @@ class LopperSDT:
                 lop.dtb = ""
                 lop.fdt = None
                 lop.tree = yaml_tree
-                self.lops.append( lop )
+                lops.append( lop )
             elif re.search( ".json$", ifile ):
                 json = LopperJSON( json=ifile, config=config )
                 json_tree = json.to_tree()
@@ -419,12 +541,22 @@ class LopperSDT:
                 lop.dtb = ""
                 lop.fdt = None
                 lop.tree = json_tree
-                self.lops.append( lop )
+                lops.append( lop )
             elif re.search( ".dtb$", ifile ):
                 lop = LopperFile( ifile )
                 lop.dts = ""
-                lop.dtb = ifile
-                self.lops.append( lop )
+                if self.use_libfdt:
+                    lop.dtb = ifile
+                else:
+                    lop.dtb = ""
+                    lop.fdt = None
+                    with open( ifile, 'rb' ) as f:
+                        dct = Lopper.dtb_export( f.read(), strict=True )
+                    lop.tree = LopperTree()
+                    lop.tree.load( dct )
+                lops.append( lop )
+
+        return lops
 
     def assists_setup( self, assists = []):
         """
@@ -440,7 +572,7 @@ class LopperSDT:
     def assist_autorun_setup( self, module_name, module_args = [] ):
         lt = LopperTree()
 
-        lopper.log._debug( f"setting up module {module_name} with args:{module_args}" )
+        lopper.log._debug( lambda: f"setting up module {module_name} with args:{module_args}" )
 
         lt['/']['compatible'] = [ 'system-device-tree-v1' ]
         lt['/']['priority'] = [ 3 ]
@@ -473,7 +605,7 @@ class LopperSDT:
         lop.fdt = None
         lop.tree = lt
 
-        lopper.log._debug( f"generated assist run for {module_name}" )
+        lopper.log._debug( lambda: f"generated assist run for {module_name}" )
 
         self.lops.insert( 0, lop )
 
@@ -541,14 +673,17 @@ class LopperSDT:
             tree_to_write = self.tree
 
         if re.search( ".dtb", output_filename ):
-            if self.use_libfdt:
-                fdt = Lopper.fdt()
-                Lopper.sync( fdt, tree_to_write.export() )
-                Lopper.write_fdt( fdt, output_filename, overwrite, self.verbose )
-            else:
-                lopper.log._error( f"dtb output selected ({output_filename}), but libfdt is not enabled" )
+            o = Path(output_filename)
+            if o.exists() and not overwrite:
+                lopper.log._error( f"output file {output_filename} exists and force overwrite is not enabled" )
                 sys.exit(1)
 
+            # the dtb is encoded directly from the tree, this is the same as
+            # syncing to a new FDT and writing it, but doesn't require libfdt
+            lopper.log._info( f"writing output dtb: {output_filename}" )
+            with open( output_filename, 'wb' ) as w:
+                w.write( Lopper.encode_dtb( tree_to_write.export() ) )
+
         elif re.search( ".dts", output_filename ):
             o = Path(output_filename)
             if o.exists() and not overwrite:
@@ -715,7 +850,7 @@ class LopperSDT:
 
                 ln = ln + lop_node
 
-                lopper.log._debug( f"generated load lop for assist {a}" )
+                lopper.log._debug( lambda: f"generated load lop for assist {a}" )
 
                 assist_count = assist_count + 1
 
@@ -857,6 +992,9 @@ class LopperSDT:
         specific information from the caller being passed in the options
         variable.
 
+        The lop is executed by the handler registered for its type, see
+        lop_register().
+
         Args:
             lops_fdt (FDT): lopper operation flattened device tree
             lop_node_number (int): node number for the operation in lops_fdt
@@ -867,820 +1005,1008 @@ class LopperSDT:
 
         """
 
-        # TODO: stop using this and go to the searching in the lops processing loop.
         lop_type = lop_node['compatible'].value[0]
-        # TODO: lop_args is really a "subtype"
-        try:
-            lop_args = lop_node['compatible'].value[1]
-        except:
-            lop_args = ""
 
-        lopper.log._debug( f"executing lop: {lop_type}" )
+        lopper.log._debug( lambda: f"executing lop: {lop_type}" )
 
-        if re.search( ".*,exec.*$", lop_type ):
-            lopper.log._debug( f"code exec jump" )
-            try:
-                try:
-                    node_spec = lop_node['node'].value[0]
-                except:
-                    if self.tree.__selected__:
-                        node_spec = self.tree.__selected__[0]
-                    else:
-                        node_spec = ""
+        handler = LopperSDT.lop_handler( lop_type )
+        if handler:
+            return handler( self, lop_node, lops_tree, options )
 
-                if not options:
-                    options = {}
+        # if the lop isn't handled, we return false by default
+        return False
 
-                try:
-                    options_spec = lop_node['options'].value
-                except:
-                    options_spec = ""
+    @staticmethod
+    def lop_register( lop_type, handler, regex = None ):
+        """Register a lop handler
 
-                if options_spec:
-                    for o in options_spec:
-                        opt_key,opt_val = o.split(":")
-                        if opt_key:
-                            options[opt_key] = opt_val
+        Lops are dispatched to a handler by the first value of their
+        'compatible' property. Each registered handler has a regex that is
+        matched against the compatible string, the first handler (in
+        registration order) that matches is used. The result is remembered,
+        so dispatching a lop is a single lookup.
 
-                exec_tgt = lop_node['exec'].value[0]
-                target_node = lops_tree.pnode( exec_tgt )
+        Registering a handler for an existing lop type replaces the handler,
+        which allows the built in lops to be overridden.
 
-                lopper.log._debug( f"exec phandle: {hex(exec_tgt)} target: {target_node}", lop_node )
+        Args:
+            lop_type (string): the type of the lop (i.e. "modify")
+            handler (function): called as handler( sdt, lop_node, lops_tree, options ),
+                                returns True if the lop was successful
+            regex (string,optional): the regex for the compatible string. The
+                                     default matches "<vendor>,lop,<lop_type>"
+                                     with an optional "-v<version>" suffix
 
-                if target_node:
-                    try:
-                        if node_spec:
-                            options['start_node'] = node_spec
+        Returns:
+            Nothing
+        """
+        if not regex:
+            regex = ".*,lop,{}(-v[0-9]+)?$".format( re.escape( lop_type ) )
 
-                        ret = self.exec_lop( target_node, lops_tree, options )
-                    except Exception as e:
-                        lopper.log._warning( f"exec block caused exception: {e}" )
-                        ret = False
+        LopperSDT.lop_handlers[lop_type] = ( re.compile( regex ), handler )
+        LopperSDT.lop_dispatch = {}
 
-                    return ret
-                else:
-                    return False
+    @staticmethod
+    def lop_handler( lop_type ):
+        """Find the handler of a lop
 
-            except Exception as e:
-                lopper.log._warning( f"exec lop exception: {e}" )
-                return False
+        Args:
+            lop_type (string): the compatible string of the lop
 
-        if re.search( ".*,print.*$", lop_type ):
-            print_props = lop_node.props('print.*')
-            for print_prop in print_props:
-                for line in print_prop.value:
-                    if type(line) == str:
-                        print( line )
-                    else:
-                        # is it a phandle?
-                        node = self.tree.pnode(line)
-                        if node:
-                            print( "%s {" % node )
-                            for p in node:
-                                print( "    %s" % p )
-                            print( "}" )
+        Returns:
+            function: the lop handler, or None if there isn't one
+        """
+        try:
+            return LopperSDT.lop_dispatch[lop_type]
+        except KeyError:
+            pass
 
-            return True
+        handler = None
+        for regex, h in LopperSDT.lop_handlers.values():
+            if regex.search( lop_type ):
+                handler = h
+                break
+
+        LopperSDT.lop_dispatch[lop_type] = handler
+
+        return handler
+
+    def lop_exec( self, lop_node, lops_tree, options = None ):
+        """Execute an exec lop
 
-        if re.search( ".*,select.*$", lop_type ):
-            select_props = lop_node.props( 'select.*' )
+        Runs the lop referenced (by phandle) in the 'exec' property, with the
+        node and options of the exec lop.
 
+        Args:
+            lop_node (LopperNode): the lop
+            lops_tree (LopperTree): the tree containing the lop
+            options (dictionary,optional): lop specific options passed from the caller
+
+        Returns:
+            boolean
+        """
+        lopper.log._debug( "code exec jump" )
+        try:
             try:
-                tree_name = lop_node['tree'].value[0]
-                try:
-                    tree = self.subtrees[tree_name]
-                except:
-                    lopper.log._error( f"tree name provided ({tree_name}), but not found" )
-                    sys.exit(1)
+                node_spec = lop_node['node'].value[0]
             except:
-                tree = self.tree
-
-            #
-            # to do an "or" condition
-            #    select_1 = "/path/or/regex/to/nodes:prop:val";
-            #    select_2 = "/path/or/2nd/regex:prop2:val2";
-            #
-            # to do an "and" condition:
-            #    select_1 = "/path/or/regex/to/nodes:prop:val";
-            #    select_2 = ":prop2:val2";
-            #
-            selected_nodes = []
-            selected_nodes_possible = []
-            for sel in select_props:
-                if sel.value == ['']:
-                    lopper.log._debug( f"clearing selected nodes" )
-                    tree.__selected__ = []
+                if self.tree.__selected__:
+                    node_spec = self.tree.__selected__[0]
                 else:
-                    # if different node regex + properties are listed in the same
-                    # select = "foo","bar","blah", they are always AND conditions.
-                    for s in sel.value:
-                        lopper.log._debug( f"running node selection: {s} ({selected_nodes_possible})" )
-                        try:
-                            node_regex, prop, prop_val = s.split(":")
-                        except:
-                            node_regex = s
-                            prop = ""
-                            prop_val = ""
-
-                        if node_regex:
-                            if node_regex.startswith( "/" ):
-                                if selected_nodes_possible:
-                                    selected_nodes_possible = selected_nodes_possible + tree.nodes( node_regex )
-                                else:
-                                    selected_nodes_possible = tree.nodes( node_regex )
-                            else:
-                                # search with it as a label
-                                if selected_nodes_possible:
-                                    selected_nodes_possible = selected_nodes_possible + tree.lnodes( node_regex )
-                                else:
-                                    selected_nodes_possible = tree.lnodes( node_regex )
+                    node_spec = ""
 
-                        else:
-                            # if the node_regex is empty, we operate on previously
-                            # selected nodes.
-                            if selected_nodes:
-                                selected_nodes_possible = selected_nodes
-                            else:
-                                selected_nodes_possible = tree.__selected__
+            if not options:
+                options = {}
 
-                            if self.verbose > 1:
-                                lopper.log._debug( f"selected potential nodes:" )
-                                for n in selected_nodes_possible:
-                                    print( "       %s" % n )
-
-                        if prop and prop_val:
-                            invert_result = False
-                            if re.search( "\!", prop_val ):
-                                invert_result = True
-                                prop_val = re.sub( '^\!', '', prop_val )
-                                lopper.log._debug( f"select: inverting result" )
-
-                            # in case this is a formatted list, ask lopper to convert
-                            prop_val = Lopper.property_convert( prop_val )
-
-                            # construct a test prop, so we can use the internal compare
-                            test_prop = LopperProp( prop, -1, None, prop_val )
-                            test_prop.ptype = test_prop.property_type_guess( True )
-
-                            # we need this list(), since the removes below will yank items out of
-                            # our iterator if we aren't careful
-                            for sl in list(selected_nodes_possible):
-                                try:
-                                    sl_prop = sl[prop]
-                                except Exception as e:
-                                    sl_prop = None
-                                    are_they_equal = False
+            try:
+                options_spec = lop_node['options'].value
+            except:
+                options_spec = ""
 
-                                if sl_prop:
-                                    if self.verbose > 2:
-                                        test_prop.__dbg__ = self.verbose
-
-                                    are_they_equal = test_prop.compare( sl_prop )
-                                    if invert_result:
-                                        are_they_equal = not are_they_equal
-
-                                    if are_they_equal:
-                                        if not sl in selected_nodes:
-                                            selected_nodes.append( sl )
-                                    else:
-                                        # no match, you are out! (only if this is an AND operation though, which
-                                        # is indicated by the lack of a node regex)
-                                        if not node_regex:
-                                            if sl in selected_nodes:
-                                                selected_nodes.remove( sl )
-                                else:
-                                    # no prop, you are out! (only if this is an AND operation though, which
-                                    # is indicated by the lack of a node regex)
-                                    if not node_regex:
-                                        if sl in selected_nodes:
-                                            selected_nodes.remove( sl )
+            if options_spec:
+                for o in options_spec:
+                    opt_key,opt_val = o.split(":")
+                    if opt_key:
+                        options[opt_key] = opt_val
 
-                        if prop and not prop_val:
-                            # an empty property value means we are testing if the property exists
+            exec_tgt = lop_node['exec'].value[0]
+            target_node = lops_tree.pnode( exec_tgt )
 
-                            # if the property name is "!<property>" and the val is empty, then we
-                            # are testing if it doesn't exist.
+            lopper.log._debug( lambda: f"exec phandle: {hex(exec_tgt)} target: {target_node}", lop_node )
 
-                            prop_exists_test = True
-                            if re.search( "\!", prop ):
-                                prop_exists_test = False
+            if target_node:
+                try:
+                    if node_spec:
+                        options['start_node'] = node_spec
 
-                            # remove any leading '!' from the name.
-                            prop = re.sub( '^\!', '', prop )
+                    ret = self.exec_lop( target_node, lops_tree, options )
+                except Exception as e:
+                    lopper.log._warning( f"exec block caused exception: {e}" )
+                    ret = False
 
-                            for sl in list(selected_nodes_possible):
-                                try:
-                                    sl_prop = sl[prop]
-                                except Exception as e:
-                                    sl_prop = None
-
-                                if prop_exists_test:
-                                    if sl_prop != None:
-                                        if not sl in selected_nodes:
-                                            selected_nodes.append( sl )
-                                    else:
-                                        if sl in selected_nodes:
-                                            selected_nodes.remove( sl )
-                                else:
-                                    # we are looking for the *lack* of a property
-                                    if sl_prop:
-                                        if sl in selected_nodes:
-                                            selected_nodes.remove( sl )
-                                    else:
-                                        if not sl in selected_nodes:
-                                            selected_nodes.append( sl )
+                return ret
+            else:
+                return False
 
-                        if not prop and not prop_val:
-                            selected_nodes = selected_nodes_possible
+        except Exception as e:
+            lopper.log._warning( f"exec lop exception: {e}" )
+            return False
 
+    def lop_print( self, lop_node, lops_tree, options = None ):
+        """Execute a print lop
 
-                    if self.verbose > 1:
-                        lopper.log._debug( f"select pass done: selected nodes:" )
-                        for n in selected_nodes:
-                            print( "    %s" % n )
+        Outputs the values of the 'print*' properties of the lop. A value that
+        is a phandle outputs the referenced node.
 
-                    # these are now our possible selected nodes for any follow
-                    # up "or" conditions
-                    selected_nodes_possible = selected_nodes
+        Args:
+            lop_node (LopperNode): the lop
+            lops_tree (LopperTree): the tree containing the lop
+            options (dictionary,optional): lop specific options passed from the caller
 
-            # update the tree selection with our results
-            tree.__selected__ = selected_nodes
+        Returns:
+            boolean
+        """
+        print_props = lop_node.props('print.*')
+        for print_prop in print_props:
+            for line in print_prop.value:
+                if type(line) == str:
+                    print( line )
+                else:
+                    # is it a phandle?
+                    node = self.tree.pnode(line)
+                    if node:
+                        print( "%s {" % node )
+                        for p in node:
+                            print( "    %s" % p )
+                        print( "}" )
 
-            if tree.__selected__:
-                return True
+        return True
 
-            return False
+    def lop_select( self, lop_node, lops_tree, options = None ):
+        """Execute a select lop
 
-        if re.search( ".*,meta.*$", lop_type ):
-            if re.search( "phandle-desc", lop_args ):
-                lopper.log._debug( f"processing phandle meta data {type(Lopper)}")
+        Selects the nodes that match the 'select*' expressions of the lop. The
+        selected nodes are used by follow up lops.
 
-                # grab all the defaults
-                Lopper.phandle_possible_prop_dict = Lopper.phandle_possible_properties()
-                try:
-                    del Lopper.phandle_possible_prop_dict["DEFAULT"]
-                except:
-                    pass
-
-                # now override, remove, extend
-                for p in lop_node:
-                    # we skip compatible, since that is actually the compatibility value
-                    # of the node, not a meta data entry. Everything else is though
-                    if p.name != "compatible":
-                        if re.search( r'^reset$', p.name ):
-                            lopper.log._debug( f"resetting phandle table" )
-                            Lopper.phandle_possible_prop_dict = OrderedDict()
-                        elif re.search( r'^lopper-comment.*', p.name ):
-                            # skip
-                            pass
-                        elif re.search( r'^\-.*', p.name ):
-                            # delete
-                            p.name = re.sub( r'^\-', '', p.name )
-                            try:
-                                del Lopper.phandle_possible_prop_dict[p.name]
-                            except:
-                                pass
-                        else:
-                            Lopper.phandle_possible_prop_dict[p.name] = [ p.value[0] ]
+        Args:
+            lop_node (LopperNode): the lop
+            lops_tree (LopperTree): the tree containing the lop
+            options (dictionary,optional): lop specific options passed from the caller
 
-            return True
+        Returns:
+            boolean
+        """
+        select_props = lop_node.props( 'select.*' )
 
-        if re.search( ".*,output$", lop_type ):
+        try:
+            tree_name = lop_node['tree'].value[0]
             try:
-                output_file_name = lop_node['outfile'].value[0]
+                tree = self.subtrees[tree_name]
             except:
-                lopper.log._error( f"cannot get output file name from lop" )
+                lopper.log._error( f"tree name provided ({tree_name}), but not found" )
                 sys.exit(1)
+        except:
+            tree = self.tree
+
+        #
+        # to do an "or" condition
+        #    select_1 = "/path/or/regex/to/nodes:prop:val";
+        #    select_2 = "/path/or/2nd/regex:prop2:val2";
+        #
+        # to do an "and" condition:
+        #    select_1 = "/path/or/regex/to/nodes:prop:val";
+        #    select_2 = ":prop2:val2";
+        #
+        selected_nodes = []
+        selected_nodes_possible = []
+        for sel in select_props:
+            if sel.value == ['']:
+                lopper.log._debug( "clearing selected nodes" )
+                tree.__selected__ = []
+            else:
+                # if different node regex + properties are listed in the same
+                # select = "foo","bar","blah", they are always AND conditions.
+                for s in sel.value:
+                    lopper.log._debug( lambda: f"running node selection: {s} ({selected_nodes_possible})" )
+                    try:
+                        node_regex, prop, prop_val = s.split(":")
+                    except:
+                        node_regex = s
+                        prop = ""
+                        prop_val = ""
+
+                    if node_regex:
+                        if node_regex.startswith( "/" ):
+                            if selected_nodes_possible:
+                                selected_nodes_possible = selected_nodes_possible + tree.nodes( node_regex )
+                            else:
+                                selected_nodes_possible = tree.nodes( node_regex )
+                        else:
+                            # search with it as a label
+                            if selected_nodes_possible:
+                                selected_nodes_possible = selected_nodes_possible + tree.lnodes( node_regex )
+                            else:
+                                selected_nodes_possible = tree.lnodes( node_regex )
 
-            lopper.log._debug( f"outfile is: {output_file_name}" )
+                    else:
+                        # if the node_regex is empty, we operate on previously
+                        # selected nodes.
+                        if selected_nodes:
+                            selected_nodes_possible = selected_nodes
+                        else:
+                            selected_nodes_possible = tree.__selected__
 
-            try:
-                tree_name = lop_node['tree'].value[0]
-                try:
-                    tree = self.subtrees[tree_name]
-                except:
-                    lopper.log._error( f"tree name provided ({tree_name}), but not found" )
-                    sys.exit(1)
-            except:
-                tree = self.tree
+                        if self.verbose > 1:
+                            lopper.log._debug( "selected potential nodes:" )
+                            for n in selected_nodes_possible:
+                                print( "       %s" % n )
+
+                    if prop and prop_val:
+                        invert_result = False
+                        if re.search( "\!", prop_val ):
+                            invert_result = True
+                            prop_val = re.sub( '^\!', '', prop_val )
+                            lopper.log._debug( "select: inverting result" )
+
+                        # in case this is a formatted list, ask lopper to convert
+                        prop_val = Lopper.property_convert( prop_val )
+
+                        # construct a test prop, so we can use the internal compare
+                        test_prop = LopperProp( prop, -1, None, prop_val )
+                        test_prop.ptype = test_prop.property_type_guess( True )
+
+                        # we need this list(), since the removes below will yank items out of
+                        # our iterator if we aren't careful
+                        for sl in list(selected_nodes_possible):
+                            try:
+                                sl_prop = sl[prop]
+                            except Exception as e:
+                                sl_prop = None
+                                are_they_equal = False
 
+                            if sl_prop:
+                                if self.verbose > 2:
+                                    test_prop.__dbg__ = self.verbose
 
-            output_nodes = []
-            try:
-                output_regex = lop_node['nodes'].value
-            except:
-                output_regex = []
+                                are_they_equal = test_prop.compare( sl_prop )
+                                if invert_result:
+                                    are_they_equal = not are_they_equal
 
-            if not output_regex:
-                if tree.__selected__:
-                    output_nodes = tree.__selected__
+                                if are_they_equal:
+                                    if not sl in selected_nodes:
+                                        selected_nodes.append( sl )
+                                else:
+                                    # no match, you are out! (only if this is an AND operation though, which
+                                    # is indicated by the lack of a node regex)
+                                    if not node_regex:
+                                        if sl in selected_nodes:
+                                            selected_nodes.remove( sl )
+                            else:
+                                # no prop, you are out! (only if this is an AND operation though, which
+                                # is indicated by the lack of a node regex)
+                                if not node_regex:
+                                    if sl in selected_nodes:
+                                        selected_nodes.remove( sl )
 
-            if not output_regex and not output_nodes:
-                return False
+                    if prop and not prop_val:
+                        # an empty property value means we are testing if the property exists
 
-            lopper.log._debug( f"output regex: {output_regex}" )
+                        # if the property name is "!<property>" and the val is empty, then we
+                        # are testing if it doesn't exist.
 
-            output_tree = None
-            if output_regex:
-                output_nodes = []
-                # select some nodes!
-                if "*" in output_regex:
-                    output_tree = LopperTree( True )
-                    output_tree.load( tree.export() )
-                    output_tree.strict = not self.permissive
-                else:
-                    # we can gather the output nodes and unify with the selected
-                    # copy below.
-                    for regex in output_regex:
-                        split_node = regex.split(":")
-                        o_node_regex = split_node[0]
-                        o_prop_name = ""
-                        o_prop_val = ""
-                        if len(split_node) > 1:
-                            o_prop_name = split_node[1]
-                            if len(split_node) > 2:
-                                o_prop_val = split_node[2]
-
-                        # Note: we may want to switch this around, and copy the old tree and
-                        #       delete nodes. This will be important if we run into some
-                        #       strangely formatted ones that we can't copy.
+                        prop_exists_test = True
+                        if re.search( "\!", prop ):
+                            prop_exists_test = False
 
-                        try:
-                            # if there's no / anywhere in the regex, then it is just
-                            # a node name, and we need to wrap it in a regex. This is
-                            # for compatibility with when just node names were allowed
-                            c = re.findall( '/', o_node_regex )
-                            if not c:
-                                o_node_regex = ".*" + o_node_regex
-
-                            o_nodes = tree.nodes(o_node_regex)
-                            if not o_nodes:
-                                # was it a label ?
-                                label_nodes = []
-                                try:
-                                    o_nodes = tree.lnodes(o_node_regex)
-                                except Exception as e:
-                                    pass
-
-                            for o in o_nodes:
-                                lopper.log._debug( f"output lop, checking node: {o.abs_path}" )
-
-                                # we test for a property in the node if it was defined
-                                if o_prop_name:
-                                    p = tree[o].propval(o_prop_name)
-                                    if o_prop_val:
-                                        if p:
-                                            if o_prop_val in p:
-                                                if not o in output_nodes:
-                                                    output_nodes.append( o )
+                        # remove any leading '!' from the name.
+                        prop = re.sub( '^\!', '', prop )
+
+                        for sl in list(selected_nodes_possible):
+                            try:
+                                sl_prop = sl[prop]
+                            except Exception as e:
+                                sl_prop = None
+
+                            if prop_exists_test:
+                                if sl_prop != None:
+                                    if not sl in selected_nodes:
+                                        selected_nodes.append( sl )
+                                else:
+                                    if sl in selected_nodes:
+                                        selected_nodes.remove( sl )
+                            else:
+                                # we are looking for the *lack* of a property
+                                if sl_prop:
+                                    if sl in selected_nodes:
+                                        selected_nodes.remove( sl )
                                 else:
-                                    if not o in output_nodes:
-                                        output_nodes.append( o )
+                                    if not sl in selected_nodes:
+                                        selected_nodes.append( sl )
 
-                        except Exception as e:
-                            lopper.log._warning( f"exception caught during output processing: {e}" )
-
-                if output_regex:
-                    if self.verbose > 2:
-                        lopper.log._debug( f"output lop, final nodes:" )
-                        for oo in output_nodes:
-                            print( "       %s" % oo.abs_path )
-
-                if not output_tree and output_nodes:
-                    output_tree = LopperTreePrinter()
-                    output_tree.strict = not self.permissive
-                    output_tree.__dbg__ = self.verbose
-                    for on in output_nodes:
-                        # make a deep copy of the selected node
-                        new_node = on()
-                        new_node.__dbg__ = self.verbose
-                        # and assign it to our tree
-                        # if the performance of this becomes a problem, we can use
-                        # direct calls to Lopper.node_copy_from_path()
-                        output_tree + new_node
+                    if not prop and not prop_val:
+                        selected_nodes = selected_nodes_possible
 
-            if not self.dryrun:
-                if output_tree:
-                    output_file_full = self.outdir + "/" + output_file_name
 
-                    if self.use_libfdt:
-                        # create a FDT
-                        dct = output_tree.export()
-                        out_fdt = Lopper.fdt()
-                        Lopper.sync( out_fdt, dct )
-
-                    # we should consider checking the type, and not doing the export
-                    # if going to dts, since that is already easily done with the tree.
-                    self.write( output_tree, output_file_full, True, self.enhanced )
-            else:
-                lopper.log._info( f"dryrun detected, not writing output file {output_file_name}" )
+                if self.verbose > 1:
+                    lopper.log._debug( "select pass done: selected nodes:" )
+                    for n in selected_nodes:
+                        print( "    %s" % n )
+
+                # these are now our possible selected nodes for any follow
+                # up "or" conditions
+                selected_nodes_possible = selected_nodes
+
+        # update the tree selection with our results
+        tree.__selected__ = selected_nodes
 
+        if tree.__selected__:
             return True
-        if re.search( ".*,tree$", lop_type ):
-            # TODO: consolidate this with the output lop
-            try:
-                tree_name = lop_node['tree'].value[0]
-            except:
-                lopper.log._error( f"tree lop: cannot get tree name from lop" )
-                sys.exit(1)
 
-            lopper.log._debug( f"tree lop: tree is: {tree_name}" )
+        return False
+
+    def lop_meta( self, lop_node, lops_tree, options = None ):
+        """Execute a meta lop
 
-            tree_nodes = []
+        Updates the lopper meta data (i.e. the phandle descriptions) with the
+        properties of the lop.
+
+        Args:
+            lop_node (LopperNode): the lop
+            lops_tree (LopperTree): the tree containing the lop
+            options (dictionary,optional): lop specific options passed from the caller
+
+        Returns:
+            boolean
+        """
+        # TODO: lop_args is really a "subtype"
+        try:
+            lop_args = lop_node['compatible'].value[1]
+        except:
+            lop_args = ""
+
+        if re.search( "phandle-desc", lop_args ):
+            lopper.log._debug( lambda: f"processing phandle meta data {type(Lopper)}")
+
+            # grab all the defaults
+            Lopper.phandle_possible_prop_dict = Lopper.phandle_possible_properties()
             try:
-                tree_regex = lop_node['nodes'].value
+                del Lopper.phandle_possible_prop_dict["DEFAULT"]
             except:
-                tree_regex = []
+                pass
 
-            if not tree_regex:
-                if self.tree.__selected__:
-                    tree_nodes = self.tree.__selected__
+            # now override, remove, extend
+            for p in lop_node:
+                # we skip compatible, since that is actually the compatibility value
+                # of the node, not a meta data entry. Everything else is though
+                if p.name != "compatible":
+                    if re.search( r'^reset$', p.name ):
+                        lopper.log._debug( "resetting phandle table" )
+                        Lopper.phandle_possible_prop_dict = OrderedDict()
+                    elif re.search( r'^lopper-comment.*', p.name ):
+                        # skip
+                        pass
+                    elif re.search( r'^\-.*', p.name ):
+                        # delete
+                        p.name = re.sub( r'^\-', '', p.name )
+                        try:
+                            del Lopper.phandle_possible_prop_dict[p.name]
+                        except:
+                            pass
+                    else:
+                        Lopper.phandle_possible_prop_dict[p.name] = [ p.value[0] ]
 
-            if not tree_regex and not tree_nodes:
-                lopper.log._warning( f"tree lop: no nodes or regex proviced for tree, returning" )
-                return False
+        return True
 
-            new_tree = None
-            if tree_regex:
-                tree_nodes = []
-                # select some nodes!
-                if "*" in tree_regex:
-                    new_tree = LopperTree( True )
-                    new_tree.strict = False
-                    new_tree.load( Lopper.export( self.FDT ) )
-                    new_tree.resolve()
-                    new_tree.strict = not self.permissive
-                else:
-                    # we can gather the tree nodes and unify with the selected
-                    # copy below.
-                    for regex in tree_regex:
-
-                        split_node = regex.split(":")
-                        o_node_regex = split_node[0]
-                        o_prop_name = ""
-                        o_prop_val = ""
-                        if len(split_node) > 1:
-                            o_prop_name = split_node[1]
-                            if len(split_node) > 2:
-                                o_prop_val = split_node[2]
-
-                        # Note: we may want to switch this around, and copy the old tree and
-                        #       delete nodes. This will be important if we run into some
-                        #       strangely formatted ones that we can't copy.
+    def lop_output( self, lop_node, lops_tree, options = None ):
+        """Execute an output lop
 
-                        try:
-                            # if there's no / anywhere in the regex, then it is just
-                            # a node name, and we need to wrap it in a regex. This is
-                            # for compatibility with when just node names were allowed
-                            c = re.findall( '/', o_node_regex )
-                            if not c:
-                                o_node_regex = ".*" + o_node_regex
-
-                            o_nodes = self.tree.nodes(o_node_regex)
-                            if not o_nodes:
-                                # was it a label ?
-                                label_nodes = []
-                                try:
-                                    o_nodes = self.tree.lnodes(o_node_regex)
-                                except Exception as e:
-                                    pass
-
-                            for o in o_nodes:
-                                # we test for a property in the node if it was defined
-                                if o_prop_name:
-                                    p = self.tree[o].propval(o_prop_name)
-                                    if o_prop_val:
-                                        if p:
-                                            if o_prop_val in p:
-                                                if not o in tree_nodes:
-                                                    tree_nodes.append( o )
-                                else:
-                                    if not o in tree_nodes:
-                                        tree_nodes.append( o )
+        Writes the selected (or listed) nodes of the tree to the output files of
+        the lop.
 
-                        except Exception as e:
-                            lopper.log._warning( f"exception caught during tree processing: {e}" )
-
-                if not new_tree and tree_nodes:
-                    new_tree = LopperTreePrinter()
-                    new_tree.strict = not self.permissive
-                    new_tree.__dbg__ = self.verbose
-                    for on in tree_nodes:
-                        # make a deep copy of the selected node
-                        new_node = on()
-                        new_node.__dbg__ = self.verbose
-                        # and assign it to our tree
-                        # if the performance of this becomes a problem, we can use
-                        # direct calls to Lopper.node_copy_from_path()
-                        new_tree + new_node
-
-            if new_tree:
-                self.subtrees[tree_name] = new_tree
-            else:
-                lopper.log._error( f"no tree created, exiting" )
-                sys.exit(1)
+        Args:
+            lop_node (LopperNode): the lop
+            lops_tree (LopperTree): the tree containing the lop
+            options (dictionary,optional): lop specific options passed from the caller
 
-            return True
+        Returns:
+            boolean
+        """
+        try:
+            output_file_name = lop_node['outfile'].value[0]
+        except:
+            lopper.log._error( f"cannot get output file name from lop" )
+            sys.exit(1)
 
-        if re.search( ".*,assist-v1$", lop_type ):
-            # also note: this assist may change from being called as
-            # part of the lop loop, to something that is instead
-            # called by walking the entire device tree, looking for
-            # matching nodes and making assists at that moment.
-            #
-            # but that sort of node walking, will invoke the assists
-            # out of order with other lopper operations, so it isn't
-            # particularly feasible or desireable.
-            #
+        lopper.log._debug( lambda: f"outfile is: {output_file_name}" )
+
+        try:
+            tree_name = lop_node['tree'].value[0]
             try:
-                cb_tgt_node_name = lop_node['node'].value[0]
+                tree = self.subtrees[tree_name]
             except:
-                lopper.log._error( f"cannot find target node for assist" )
+                lopper.log._error( f"tree name provided ({tree_name}), but not found" )
                 sys.exit(1)
+        except:
+            tree = self.tree
 
-            cb_outdir = self.outdir
-            try:
-                cb = lop_node.propval('assist')[0]
-                cb_id = lop_node.propval('id')[0]
-                cb_opts = lop_node.propval('options')[0]
-                cb_opts = cb_opts.lstrip()
-                if cb_opts:
-                    cb_opts = cb_opts.split( ' ' )
-                else:
-                    cb_opts = []
-                if lop_node.propval('outdir') != ['']:
-                    cb_outdir = lop_node.propval('outdir')[0]
-            except Exception as e:
-                lopper.log._error( f"callback options are missing: {e}" )
-                sys.exit(1)
 
-            try:
-                cb_node = self.tree.nodes(cb_tgt_node_name )[0]
-            except:
-                cb_node = None
+        output_nodes = []
+        try:
+            output_regex = lop_node['nodes'].value
+        except:
+            output_regex = []
 
-            if not cb_node:
-                if self.werror:
-                    lopper.log._error( f"cannot find assist target node in tree" )
-                    sys.exit(1)
-                else:
-                    return False
+        if not output_regex:
+            if tree.__selected__:
+                output_nodes = tree.__selected__
 
-            if self.verbose:
-                lopper.log._info( f"assist lop detected" )
-                if cb:
-                    print( "        cb: %s" % cb )
-                print( "        id: %s opts: %s" % (cb_id,cb_opts) )
+        if not output_regex and not output_nodes:
+            return False
+
+        lopper.log._debug( lambda: f"output regex: {output_regex}" )
+
+        output_tree = None
+        if output_regex:
+            output_nodes = []
+            # select some nodes!
+            if "*" in output_regex:
+                output_tree = LopperTree( True )
+                output_tree.load( tree.export() )
+                output_tree.strict = not self.permissive
+            else:
+                # we can gather the output nodes and unify with the selected
+                # copy below.
+                for regex in output_regex:
+                    split_node = regex.split(":")
+                    o_node_regex = split_node[0]
+                    o_prop_name = ""
+                    o_prop_val = ""
+                    if len(split_node) > 1:
+                        o_prop_name = split_node[1]
+                        if len(split_node) > 2:
+                            o_prop_val = split_node[2]
+
+                    # Note: we may want to switch this around, and copy the old tree and
+                    #       delete nodes. This will be important if we run into some
+                    #       strangely formatted ones that we can't copy.
 
-            cb_funcs = self.find_compatible_assist( cb_node, cb_id )
-            if cb_funcs:
-                for cb_func in cb_funcs:
                     try:
-                        if not cb_func( cb_node, self, { 'verbose' : self.verbose, 'outdir' : cb_outdir, 'args': cb_opts } ):
-                            lopper.log._warning( f"the assist returned false, check for errors ..." )
+                        # if there's no / anywhere in the regex, then it is just
+                        # a node name, and we need to wrap it in a regex. This is
+                        # for compatibility with when just node names were allowed
+                        c = re.findall( '/', o_node_regex )
+                        if not c:
+                            o_node_regex = ".*" + o_node_regex
+
+                        o_nodes = tree.nodes(o_node_regex)
+                        if not o_nodes:
+                            # was it a label ?
+                            label_nodes = []
+                            try:
+                                o_nodes = tree.lnodes(o_node_regex)
+                            except Exception as e:
+                                pass
+
+                        for o in o_nodes:
+                            lopper.log._debug( lambda: f"output lop, checking node: {o.abs_path}" )
+
+                            # we test for a property in the node if it was defined
+                            if o_prop_name:
+                                p = tree[o].propval(o_prop_name)
+                                if o_prop_val:
+                                    if p:
+                                        if o_prop_val in p:
+                                            if not o in output_nodes:
+                                                output_nodes.append( o )
+                            else:
+                                if not o in output_nodes:
+                                    output_nodes.append( o )
+
                     except Exception as e:
-                        lopper.log._warning( f"assist %{cb_func} failed: {e}" )
-                        exc_type, exc_obj, exc_tb = sys.exc_info()
-                        fname = os.path.split(exc_tb.tb_frame.f_code.co_filename)[1]
-                        print(exc_type, fname, exc_tb.tb_lineno)
-                        # exit if warnings are treated as errors
-                        if self.werror:
-                            sys.exit(1)
+                        lopper.log._warning( f"exception caught during output processing: {e}" )
+
+            if output_regex:
+                if self.verbose > 2:
+                    lopper.log._debug( "output lop, final nodes:" )
+                    for oo in output_nodes:
+                        print( "       %s" % oo.abs_path )
+
+        # the listed (or selected) nodes are copied into the output tree
+        if not output_tree and output_nodes:
+            # the tree is only exported by write(), it doesn't print (and
+            # open stdout) itself
+            output_tree = LopperTree()
+            output_tree.strict = not self.permissive
+            output_tree.__dbg__ = self.verbose
+            for on in output_nodes:
+                # make a deep copy of the selected node
+                new_node = on()
+                new_node.__dbg__ = self.verbose
+                # and assign it to our tree
+                # if the performance of this becomes a problem, we can use
+                # direct calls to Lopper.node_copy_from_path()
+                output_tree + new_node
+
+        if not self.dryrun:
+            if output_tree:
+                output_file_full = self.outdir + "/" + output_file_name
+
+                if self.use_libfdt:
+                    # create a FDT
+                    dct = output_tree.export()
+                    out_fdt = Lopper.fdt()
+                    Lopper.sync( out_fdt, dct )
+
+                # we should consider checking the type, and not doing the export
+                # if going to dts, since that is already easily done with the tree.
+                self.write( output_tree, output_file_full, True, self.enhanced )
+        else:
+            lopper.log._info( f"dryrun detected, not writing output file {output_file_name}" )
+
+        return True
+
+    def lop_tree( self, lop_node, lops_tree, options = None ):
+        """Execute a tree lop
+
+        Creates a new (sub)tree from the selected (or listed) nodes of the
+        system device tree.
 
-                        return False
+        Args:
+            lop_node (LopperNode): the lop
+            lops_tree (LopperTree): the tree containing the lop
+            options (dictionary,optional): lop specific options passed from the caller
+
+        Returns:
+            boolean
+        """
+        # TODO: consolidate this with the output lop
+        try:
+            tree_name = lop_node['tree'].value[0]
+        except:
+            lopper.log._error( f"tree lop: cannot get tree name from lop" )
+            sys.exit(1)
+
+        lopper.log._debug( lambda: f"tree lop: tree is: {tree_name}" )
+
+        tree_nodes = []
+        try:
+            tree_regex = lop_node['nodes'].value
+        except:
+            tree_regex = []
+
+        if not tree_regex:
+            if self.tree.__selected__:
+                tree_nodes = self.tree.__selected__
+
+        if not tree_regex and not tree_nodes:
+            lopper.log._warning( f"tree lop: no nodes or regex proviced for tree, returning" )
+            return False
+
+        new_tree = None
+        if tree_regex:
+            tree_nodes = []
+            # select some nodes!
+            if "*" in tree_regex:
+                new_tree = LopperTree( True )
+                new_tree.strict = False
+                if self.FDT:
+                    new_tree.load( Lopper.export( self.FDT ) )
+                else:
+                    # loaded from a snapshot, there is no FDT
+                    new_tree.load( self.tree.export() )
+                new_tree.resolve()
+                new_tree.strict = not self.permissive
             else:
-                lopper.log._info( f"no compatible assist found, skipping: {cb_tgt_node_name}{cb}")
-                return False
+                # we can gather the tree nodes and unify with the selected
+                # copy below.
+                for regex in tree_regex:
+
+                    split_node = regex.split(":")
+                    o_node_regex = split_node[0]
+                    o_prop_name = ""
+                    o_prop_val = ""
+                    if len(split_node) > 1:
+                        o_prop_name = split_node[1]
+                        if len(split_node) > 2:
+                            o_prop_val = split_node[2]
+
+                    # Note: we may want to switch this around, and copy the old tree and
+                    #       delete nodes. This will be important if we run into some
+                    #       strangely formatted ones that we can't copy.
 
-            return True
+                    try:
+                        # if there's no / anywhere in the regex, then it is just
+                        # a node name, and we need to wrap it in a regex. This is
+                        # for compatibility with when just node names were allowed
+                        c = re.findall( '/', o_node_regex )
+                        if not c:
+                            o_node_regex = ".*" + o_node_regex
+
+                        o_nodes = self.tree.nodes(o_node_regex)
+                        if not o_nodes:
+                            # was it a label ?
+                            label_nodes = []
+                            try:
+                                o_nodes = self.tree.lnodes(o_node_regex)
+                            except Exception as e:
+                                pass
 
-        if re.search( ".*,lop,load$", lop_type ):
-            prop_id = ""
-            prop_extension = ""
+                        for o in o_nodes:
+                            # we test for a property in the node if it was defined
+                            if o_prop_name:
+                                p = self.tree[o].propval(o_prop_name)
+                                if o_prop_val:
+                                    if p:
+                                        if o_prop_val in p:
+                                            if not o in tree_nodes:
+                                                tree_nodes.append( o )
+                            else:
+                                if not o in tree_nodes:
+                                    tree_nodes.append( o )
 
-            try:
-                load_prop = lop_node['load'].value[0]
-            except:
-                load_prop = ""
+                    except Exception as e:
+                        lopper.log._warning( f"exception caught during tree processing: {e}" )
+
+            if not new_tree and tree_nodes:
+                new_tree = LopperTreePrinter()
+                new_tree.strict = not self.permissive
+                new_tree.__dbg__ = self.verbose
+                for on in tree_nodes:
+                    # make a deep copy of the selected node
+                    new_node = on()
+                    new_node.__dbg__ = self.verbose
+                    # and assign it to our tree
+                    # if the performance of this becomes a problem, we can use
+                    # direct calls to Lopper.node_copy_from_path()
+                    new_tree + new_node
+
+        if new_tree:
+            self.subtrees[tree_name] = new_tree
+        else:
+            lopper.log._error( f"no tree created, exiting" )
+            sys.exit(1)
 
-            if load_prop:
-                # for submodule loading
-                for p in self.load_paths:
-                    if p not in sys.path:
-                        sys.path.append( p )
+        return True
 
-                lopper.log._info( f"loading module {load_prop}" )
+    def lop_assist( self, lop_node, lops_tree, options = None ):
+        """Execute an assist lop
 
-                mod_file = self.assist_find( load_prop, self.load_paths )
-                if not mod_file:
-                    lopper.log._error( f"unable to find assist ({load_prop })" )
-                    sys.exit(1)
+        Finds the assist that is compatible with the 'id' of the lop, and runs
+        it against the tree.
 
-                mod_file_abs = mod_file.resolve()
-                # append the directory of the located module onto the search
-                # path. This is needed if that module imports something from
-                # its own directory
-                sys.path.append( str(mod_file_abs.parent) )
+        Args:
+            lop_node (LopperNode): the lop
+            lops_tree (LopperTree): the tree containing the lop
+            options (dictionary,optional): lop specific options passed from the caller
+
+        Returns:
+            boolean
+        """
+        # also note: this assist may change from being called as
+        # part of the lop loop, to something that is instead
+        # called by walking the entire device tree, looking for
+        # matching nodes and making assists at that moment.
+        #
+        # but that sort of node walking, will invoke the assists
+        # out of order with other lopper operations, so it isn't
+        # particularly feasible or desireable.
+        #
+        try:
+            cb_tgt_node_name = lop_node['node'].value[0]
+        except:
+            lopper.log._error( f"cannot find target node for assist" )
+            sys.exit(1)
+
+        cb_outdir = self.outdir
+        try:
+            cb = lop_node.propval('assist')[0]
+            cb_id = lop_node.propval('id')[0]
+            cb_opts = lop_node.propval('options')[0]
+            cb_opts = cb_opts.lstrip()
+            if cb_opts:
+                cb_opts = cb_opts.split( ' ' )
+            else:
+                cb_opts = []
+            if lop_node.propval('outdir') != ['']:
+                cb_outdir = lop_node.propval('outdir')[0]
+        except Exception as e:
+            lopper.log._error( f"callback options are missing: {e}" )
+            sys.exit(1)
+
+        try:
+            cb_node = self.tree.nodes(cb_tgt_node_name )[0]
+        except:
+            cb_node = None
+
+        if not cb_node:
+            if self.werror:
+                lopper.log._error( f"cannot find assist target node in tree" )
+                sys.exit(1)
+            else:
+                return False
+
+        if self.verbose:
+            lopper.log._info( f"assist lop detected" )
+            if cb:
+                print( "        cb: %s" % cb )
+            print( "        id: %s opts: %s" % (cb_id,cb_opts) )
+
+        cb_funcs = self.find_compatible_assist( cb_node, cb_id )
+        if cb_funcs:
+            for cb_func in cb_funcs:
                 try:
-                    imported_module = SourceFileLoader( mod_file.name, str(mod_file_abs) ).load_module()
+                    if not cb_func( cb_node, self, { 'verbose' : self.verbose, 'outdir' : cb_outdir, 'args': cb_opts } ):
+                        lopper.log._warning( f"the assist returned false, check for errors ..." )
                 except Exception as e:
-                    lopper.log._error( f"could not load assist: {mod_file_abs}: {e}" )
-                    sys.exit(1)
+                    lopper.log._warning( f"assist %{cb_func} failed: {e}" )
+                    exc_type, exc_obj, exc_tb = sys.exc_info()
+                    fname = os.path.split(exc_tb.tb_frame.f_code.co_filename)[1]
+                    print(exc_type, fname, exc_tb.tb_lineno)
+                    # exit if warnings are treated as errors
+                    if self.werror:
+                        sys.exit(1)
+
+                    return False
+        else:
+            lopper.log._info( f"no compatible assist found, skipping: {cb_tgt_node_name}{cb}")
+            return False
+
+        return True
 
-                assist_properties = {}
+    def lop_load( self, lop_node, lops_tree, options = None ):
+        """Execute a load lop
+
+        Loads the module (assist) of the lop, and makes it available to follow
+        up lops.
+
+        Args:
+            lop_node (LopperNode): the lop
+            lops_tree (LopperTree): the tree containing the lop
+            options (dictionary,optional): lop specific options passed from the caller
+
+        Returns:
+            boolean
+        """
+        prop_id = ""
+        prop_extension = ""
+
+        try:
+            load_prop = lop_node['load'].value[0]
+        except:
+            load_prop = ""
+
+        if load_prop:
+            # for submodule loading
+            for p in self.load_paths:
+                if p not in sys.path:
+                    sys.path.append( p )
+
+            lopper.log._info( f"loading module {load_prop}" )
+
+            mod_file = self.assist_find( load_prop, self.load_paths )
+            if not mod_file:
+                lopper.log._error( f"unable to find assist ({load_prop })" )
+                sys.exit(1)
+
+            mod_file_abs = mod_file.resolve()
+            # append the directory of the located module onto the search
+            # path. This is needed if that module imports something from
+            # its own directory
+            sys.path.append( str(mod_file_abs.parent) )
+            try:
+                imported_module = SourceFileLoader( mod_file.name, str(mod_file_abs) ).load_module()
+            except Exception as e:
+                lopper.log._error( f"could not load assist: {mod_file_abs}: {e}" )
+                sys.exit(1)
+
+            assist_properties = {}
+            try:
+                props = lop_node['props'].value
+            except:
+                # does the module have a "props" routine for extra querying ?
                 try:
-                    props = lop_node['props'].value
+                    props = imported_module.props()
                 except:
-                    # does the module have a "props" routine for extra querying ?
+                    props = []
+
+            for p in props:
+                # TODO: we can generate and evaluate these generically, right now, this
+                #       is ok as a proof of concept only
+                if p == "file_ext":
                     try:
-                        props = imported_module.props()
+                        prop_extension = lop_node['file_ext'].value[0]
                     except:
-                        props = []
-
-                for p in props:
-                    # TODO: we can generate and evaluate these generically, right now, this
-                    #       is ok as a proof of concept only
-                    if p == "file_ext":
                         try:
-                            prop_extension = lop_node['file_ext'].value[0]
+                            prop_extension = imported_module.file_ext()
                         except:
-                            try:
-                                prop_extension = imported_module.file_ext()
-                            except:
-                                prop_extension = ""
+                            prop_extension = ""
 
-                        assist_properties['mask'] = prop_extension
+                    assist_properties['mask'] = prop_extension
 
-                    if p == "id":
+                if p == "id":
+                    try:
+                        prop_id = lop_node['id'].value[0]
+                    except:
                         try:
-                            prop_id = lop_node['id'].value[0]
+                            prop_id = imported_module.id()
                         except:
-                            try:
-                                prop_id = imported_module.id()
-                            except:
-                                prop_id = ""
+                            prop_id = ""
 
-                        assist_properties['id'] = prop_id
+                    assist_properties['id'] = prop_id
 
-                # TODO: move this "assist already available" check into a function
-                already_loaded = False
-                if self.assists:
-                    for a in self.assists:
-                        try:
-                            if Path(a.file).resolve() == mod_file.resolve():
-                                already_loaded = True
-                                a.module = imported_module
-                                a.properties = assist_properties
-                        except:
-                            pass
-                if not already_loaded:
-                    lopper.log._info( f"loading assist with properties ({prop_extension}, {prop_id})", prop_extension )
-                    self.assists.append( LopperAssist( mod_file.name, imported_module, assist_properties ) )
+            # TODO: move this "assist already available" check into a function
+            already_loaded = False
+            if self.assists:
+                for a in self.assists:
+                    try:
+                        if Path(a.file).resolve() == mod_file.resolve():
+                            already_loaded = True
+                            a.module = imported_module
+                            a.properties = assist_properties
+                    except:
+                        pass
+            if not already_loaded:
+                lopper.log._info( f"loading assist with properties ({prop_extension}, {prop_id})", prop_extension )
+                self.assists.append( LopperAssist( mod_file.name, imported_module, assist_properties ) )
 
-            return True
+        return True
 
-        if re.search( ".*,lop,add$", lop_type ):
-            lopper.log._info( f"node add lop" )
+    def lop_add( self, lop_node, lops_tree, options = None ):
+        """Execute an add lop
 
-            try:
-                src_node_name = lop_node['node_src'].value[0]
-            except:
-                lopper.log._error( f"node add detected, but no node name found" )
-                sys.exit(1)
+        Adds the node of the lop to the tree.
 
-            try:
-                tree_name = lop_node['tree'].value[0]
-                try:
-                    tree = self.subtrees[tree_name]
-                except:
-                    lopper.log._error( f"tree name provided ({tree_name}), but not found", True )
-            except:
-                tree = self.tree
+        Args:
+            lop_node (LopperNode): the lop
+            lops_tree (LopperTree): the tree containing the lop
+            options (dictionary,optional): lop specific options passed from the caller
 
+        Returns:
+            boolean
+        """
+        lopper.log._info( f"node add lop" )
 
-            lops_node_path = lop_node.abs_path
-            src_node_path = lops_node_path + "/" + src_node_name
+        try:
+            src_node_name = lop_node['node_src'].value[0]
+        except:
+            lopper.log._error( f"node add detected, but no node name found" )
+            sys.exit(1)
 
+        try:
+            tree_name = lop_node['tree'].value[0]
             try:
-                dest_node_path = lop_node["node_dest"].value[0]
+                tree = self.subtrees[tree_name]
             except:
-                dest_node_path = "/" + src_node_name
+                lopper.log._error( f"tree name provided ({tree_name}), but not found", True )
+        except:
+            tree = self.tree
 
 
-            lopper.log._info( f"add node name: {src_node_path} node path: {dest_node_path}" )
+        lops_node_path = lop_node.abs_path
+        src_node_path = lops_node_path + "/" + src_node_name
 
+        try:
+            dest_node_path = lop_node["node_dest"].value[0]
+        except:
+            dest_node_path = "/" + src_node_name
 
-            if tree:
-                src_node = lops_tree[src_node_path]
 
-                # copy the source node
-                dst_node = src_node()
-                # adjust the path to where it will land
-                dst_node.abs_path = dest_node_path
+        lopper.log._info( f"add node name: {src_node_path} node path: {dest_node_path}" )
 
-                # add it to the tree, and this will adjust the children appropriately
-                tree + dst_node
-            else:
-                lopper.log._error( f"unable to copy node: {src_node_name}", True )
 
-            return True
+        if tree:
+            src_node = lops_tree[src_node_path]
 
-        if re.search( ".*,lop,conditional.*$", lop_type ):
-            lopper.log._info( f"conditional lop found" )
+            # copy the source node
+            dst_node = src_node()
+            # adjust the path to where it will land
+            dst_node.abs_path = dest_node_path
 
-            try:
-                tree_name = lop_node['tree'].value[0]
-                try:
-                    tree = self.subtrees[tree_name]
-                except:
-                    lopper.log._error( f"tree name provided ({tree_name}), but not found", True)
-            except:
-                tree = self.tree
+            # add it to the tree, and this will adjust the children appropriately
+            tree + dst_node
+        else:
+            lopper.log._error( f"unable to copy node: {src_node_name}", True )
 
-            this_lop_subnodes = lop_node.subnodes()
-            # the "cond_root" property of the lop node is the name of a node
-            # under the same lop node that is the start of the conditional node
-            # chain. If one wasn't provided, we start at '/'
-            try:
-                root = lop_node["cond_root"].value[0]
-            except:
-                root = "/"
+        return True
 
-            try:
-                conditional_start = lops_tree[lop_node.abs_path + "/" + root]
-            except:
-                lopper.log._info( f"conditional node {lop_node.abs_path + '/' + root} not found, returning" )
-                return False
+    def lop_conditional( self, lop_node, lops_tree, options = None ):
+        """Execute a conditional lop
 
+        Tests the conditions of the lop against the tree, and executes the true
+        or false lop blocks according to the result.
+
+        Args:
+            lop_node (LopperNode): the lop
+            lops_tree (LopperTree): the tree containing the lop
+            options (dictionary,optional): lop specific options passed from the caller
+
+        Returns:
+            boolean
+        """
+        lopper.log._info( f"conditional lop found" )
+
+        try:
+            tree_name = lop_node['tree'].value[0]
             try:
-                cond_select = lop_node["cond_select"]
+                tree = self.subtrees[tree_name]
             except:
-                cond_select = None
+                lopper.log._error( f"tree name provided ({tree_name}), but not found", True)
+        except:
+            tree = self.tree
 
-            # the subnodes of the conditional lop represent the set of conditions
-            # to use. The deepest node is what we'll be comparing
-            cond_nodes = conditional_start.subnodes()
-            # get the last node
-            cond_last_node = cond_nodes[-1]
+        this_lop_subnodes = lop_node.subnodes()
+        # the "cond_root" property of the lop node is the name of a node
+        # under the same lop node that is the start of the conditional node
+        # chain. If one wasn't provided, we start at '/'
+        try:
+            root = lop_node["cond_root"].value[0]
+        except:
+            root = "/"
 
-            if cond_select:
-                cond_path = cond_select.value[0]
-            else:
-                # drop the path to the this conditional lop from the full path of
-                # the last node in the chain. That's the path we'll look for in the
-                # system device tree.
-                cond_path = re.sub( lop_node.abs_path, "", cond_last_node.abs_path)
-
-            sdt_tgt_nodes = tree.nodes(cond_path)
-            if not sdt_tgt_nodes:
-                lopper.log._debug( f"no target nodes found at: {cond_path}, returning" )
-                return False
+        try:
+            conditional_start = lops_tree[lop_node.abs_path + "/" + root]
+        except:
+            lopper.log._info( f"conditional node {lop_node.abs_path + '/' + root} not found, returning" )
+            return False
 
-            tgt_matches = []
-            tgt_false_matches = []
-            # iterate the properties in the final node of the conditional tree,
-            # these are the conditions that we are checking.
-            for cond_prop in cond_last_node:
-                cond_prop_name = cond_prop.name
-                invert_check = ""
-                # remove __not__ from the end of a property name, that is an
-                # indication for us only, and won't be in the SDT node
-                if cond_prop.name.endswith( "__not__" ):
-                    cond_prop_name = re.sub( "__not__$", "", cond_prop.name )
-                    invert_check = "not"
-
-                lopper.log._debug( f"conditional property: {cond_prop_name} tgt_nodes: {sdt_tgt_nodes}" )
-
-                for tgt_node in sdt_tgt_nodes:
-                    # is the property present in the target node ?
-                    try:
-                        tgt_node_prop = tgt_node[cond_prop_name]
-                    except:
-                        tgt_node_prop = None
-
-                    # no need to compare if the target node doesn't have the property
-                    if tgt_node_prop:
-                        check_val = cond_prop.compare( tgt_node_prop )
-
-                        # if there was an inversion in the name, flip the result
-                        check_val_final = eval( "{0} {1}".format(invert_check, check_val ))
-                        lopper.log._debug( f"   ({tgt_node.abs_path}:{tgt_node_prop.value[0]}) condition check final value: {invert_check} {check_val} was {check_val_final}")
-                        if check_val_final:
-                            # if not already in the list, we need to add the target node
-                            if not tgt_node in tgt_matches:
-                                tgt_matches.append(tgt_node)
-                        else:
-                            # if subsequent props are not True, then we need to yank out
-                            # the node from our match list
-                            if tgt_node in tgt_matches:
-                                tgt_matches.remove(tgt_node)
-                            # and add it to the false matches list
-                            if not tgt_node in tgt_false_matches:
-                                tgt_false_matches.append(tgt_node)
-                    else:
-                        # if it doesn't have it, that has to be a false!
-                        lopper.log._debug( f"system device tree node '{tgt_node}' does not have property '{cond_prop_name}'" )
+        try:
+            cond_select = lop_node["cond_select"]
+        except:
+            cond_select = None
+
+        # the subnodes of the conditional lop represent the set of conditions
+        # to use. The deepest node is what we'll be comparing
+        cond_nodes = conditional_start.subnodes()
+        # get the last node
+        cond_last_node = cond_nodes[-1]
 
+        if cond_select:
+            cond_path = cond_select.value[0]
+        else:
+            # drop the path to the this conditional lop from the full path of
+            # the last node in the chain. That's the path we'll look for in the
+            # system device tree.
+            cond_path = re.sub( lop_node.abs_path, "", cond_last_node.abs_path)
+
+        sdt_tgt_nodes = tree.nodes(cond_path)
+        if not sdt_tgt_nodes:
+            lopper.log._debug( lambda: f"no target nodes found at: {cond_path}, returning" )
+            return False
+
+        tgt_matches = []
+        tgt_false_matches = []
+        # iterate the properties in the final node of the conditional tree,
+        # these are the conditions that we are checking.
+        for cond_prop in cond_last_node:
+            cond_prop_name = cond_prop.name
+            invert_check = ""
+            # remove __not__ from the end of a property name, that is an
+            # indication for us only, and won't be in the SDT node
+            if cond_prop.name.endswith( "__not__" ):
+                cond_prop_name = re.sub( "__not__$", "", cond_prop.name )
+                invert_check = "not"
+
+            lopper.log._debug( lambda: f"conditional property: {cond_prop_name} tgt_nodes: {sdt_tgt_nodes}" )
+
+            for tgt_node in sdt_tgt_nodes:
+                # is the property present in the target node ?
+                try:
+                    tgt_node_prop = tgt_node[cond_prop_name]
+                except:
+                    tgt_node_prop = None
+
+                # no need to compare if the target node doesn't have the property
+                if tgt_node_prop:
+                    check_val = cond_prop.compare( tgt_node_prop )
+
+                    # if there was an inversion in the name, flip the result
+                    check_val_final = eval( "{0} {1}".format(invert_check, check_val ))
+                    lopper.log._debug( lambda: f"   ({tgt_node.abs_path}:{tgt_node_prop.value[0]}) condition check final value: {invert_check} {check_val} was {check_val_final}")
+                    if check_val_final:
+                        # if not already in the list, we need to add the target node
+                        if not tgt_node in tgt_matches:
+                            tgt_matches.append(tgt_node)
+                    else:
                         # if subsequent props are not True, then we need to yank out
                         # the node from our match list
                         if tgt_node in tgt_matches:
@@ -1688,346 +2014,676 @@ class LopperSDT:
                         # and add it to the false matches list
                         if not tgt_node in tgt_false_matches:
                             tgt_false_matches.append(tgt_node)
+                else:
+                    # if it doesn't have it, that has to be a false!
+                    lopper.log._debug( lambda: f"system device tree node '{tgt_node}' does not have property '{cond_prop_name}'" )
+
+                    # if subsequent props are not True, then we need to yank out
+                    # the node from our match list
+                    if tgt_node in tgt_matches:
+                        tgt_matches.remove(tgt_node)
+                    # and add it to the false matches list
+                    if not tgt_node in tgt_false_matches:
+                        tgt_false_matches.append(tgt_node)
+
+        # loop over the true matches, executing their operations, if one of them returns
+        # false, we stop the loop
+        for tgt_match in tgt_matches:
+            try:
+                # we look through all the subnodes of this lopper operation. If any of them
+                # start with "true", it is a nested lop that we will execute
+                for n in this_lop_subnodes:
+                    if n.name.startswith( "true" ):
+                        lopper.log._debug( lambda: f"true subnode found with lop:{n['compatible'].value[0]}" )
+                        try:
+                            # run the lop, passing the target node as an option (the lop may
+                            # or may not use it)
+                            ret = self.exec_lop( n, lops_tree, { 'start_node' : tgt_match.abs_path } )
+                        except Exception as e:
+                            lopper.log._warning( f"true block had an exception: {e}" )
+                            ret = False
 
-            # loop over the true matches, executing their operations, if one of them returns
-            # false, we stop the loop
-            for tgt_match in tgt_matches:
-                try:
-                    # we look through all the subnodes of this lopper operation. If any of them
-                    # start with "true", it is a nested lop that we will execute
-                    for n in this_lop_subnodes:
-                        if n.name.startswith( "true" ):
-                            lopper.log._debug( f"true subnode found with lop:{n['compatible'].value[0]}" )
-                            try:
-                                # run the lop, passing the target node as an option (the lop may
-                                # or may not use it)
-                                ret = self.exec_lop( n, lops_tree, { 'start_node' : tgt_match.abs_path } )
-                            except Exception as e:
-                                lopper.log._warning( f"true block had an exception: {e}" )
-                                ret = False
+                        # no more looping if the called lop return False
+                        if ret == False:
+                            lopper.log._debug( "code block returned false, stop executing true blocks" )
+                            break
+            except Exception as e:
+                lopper.log._warning( f"conditional had exception: {e}" )
 
-                            # no more looping if the called lop return False
-                            if ret == False:
-                                lopper.log._debug( f"code block returned false, stop executing true blocks" )
-                                break
-                except Exception as e:
-                    lopper.log._warning( f"conditional had exception: {e}" )
+        # just like the target matches, we iterate any failed matches to see
+        # if false blocks were defined.
+        for tgt_match in tgt_false_matches:
+            # no match, is there a false block ?
+            try:
+                for n in this_lop_subnodes:
+                    if n.name.startswith( "false" ):
+                        lopper.log._debug( lambda: f"false subnode found with lop: {n['compatible'].value[0]}" )
 
-            # just like the target matches, we iterate any failed matches to see
-            # if false blocks were defined.
-            for tgt_match in tgt_false_matches:
-                # no match, is there a false block ?
-                try:
-                    for n in this_lop_subnodes:
-                        if n.name.startswith( "false" ):
-                            lopper.log._debug( f"false subnode found with lop: {n['compatible'].value[0]}" )
+                        try:
+                            ret = self.exec_lop( n, lops_tree, { 'start_node' : tgt_match.abs_path } )
+                        except Exception as e:
+                            lopper.log._warning( f"false block had an exception: {e}" )
+                            ret = False
 
-                            try:
-                                ret = self.exec_lop( n, lops_tree, { 'start_node' : tgt_match.abs_path } )
-                            except Exception as e:
-                                lopper.log._warning( f"false block had an exception: {e}" )
-                                ret = False
+                        # if any of the blocks return False, we are done
+                        if ret == False:
+                            lopper.log._debug( "code block returned false, stop executing true blocks" )
+                            break
+            except Exception as e:
+                lopper.log._warning( f"conditional false block had exception: {e}" )
 
-                            # if any of the blocks return False, we are done
-                            if ret == False:
-                                lopper.log._debug( f"code block returned false, stop executing true blocks" )
-                                break
-                except Exception as e:
-                    lopper.log._warning( f"conditional false block had exception: {e}" )
+        return ret
 
-            return ret
+    def lop_code( self, lop_node, lops_tree, options = None ):
+        """Execute a code (or xlate) lop
 
-        if re.search( ".*,lop,code.*$", lop_type ) or re.search( ".*,lop,xlate.*$", lop_type ):
-            # execute a block of python code against a specified start_node
-            code = lop_node['code'].value[0]
+        Executes the python code block of the lop against the selected nodes
+        (or start node) of the tree.
 
-            if not options:
-                options = {}
+        Args:
+            lop_node (LopperNode): the lop
+            lops_tree (LopperTree): the tree containing the lop
+            options (dictionary,optional): lop specific options passed from the caller
 
-            try:
-                options_spec = lop_node['options'].value
-            except:
-                options_spec = ""
+        Returns:
+            boolean
+        """
+        lop_type = lop_node['compatible'].value[0]
 
-            try:
-                tree_name = lop_node['tree'].value[0]
-                try:
-                    tree = self.subtrees[tree_name]
-                except:
-                    lopper.log._error( f"tree name provided ({tree_name}), but not found", True )
-            except:
-                tree = self.tree
+        # execute a block of python code against a specified start_node
+        code = lop_node['code'].value[0]
 
-            if options_spec:
-                for o in options_spec:
-                    opt_key,opt_val = o.split(":")
-                    if opt_key:
-                        options[opt_key] = opt_val
+        if not options:
+            options = {}
 
-            try:
-                start_node = options['start_node']
-            except:
-                # were there selected nodes ? Make them the context, unless overrriden
-                # by an explicit start_node property
-                if tree.__selected__:
-                    start_node = tree.__selected__[0]
-                else:
-                    start_node = "/"
+        try:
+            options_spec = lop_node['options'].value
+        except:
+            options_spec = ""
 
+        try:
+            tree_name = lop_node['tree'].value[0]
             try:
-                inherit_list = lop_node['inherit'].value[0].replace(" ","").split(",")
+                tree = self.subtrees[tree_name]
             except:
-                inherit_list = []
+                lopper.log._error( f"tree name provided ({tree_name}), but not found", True )
+        except:
+            tree = self.tree
 
-            lopper.log._debug( f"code lop found, node context: {start_node}" )
+        if options_spec:
+            for o in options_spec:
+                opt_key,opt_val = o.split(":")
+                if opt_key:
+                    options[opt_key] = opt_val
+
+        try:
+            start_node = options['start_node']
+        except:
+            # were there selected nodes ? Make them the context, unless overrriden
+            # by an explicit start_node property
+            if tree.__selected__:
+                start_node = tree.__selected__[0]
+            else:
+                start_node = "/"
+
+        try:
+            inherit_list = lop_node['inherit'].value[0].replace(" ","").split(",")
+        except:
+            inherit_list = []
+
+        try:
+            lop_node['batch']
+            batch = True
+        except:
+            batch = False
+
+        lopper.log._debug( lambda: f"code lop found, node context: {start_node}" )
+
+        if batch:
+            # run the code once, against all of the selected nodes (or
+            # the nodes under the start node). The nodes it returns are
+            # the new selection.
+            if tree.__selected__:
+                node_list = tree.__selected__
+            else:
+                try:
+                    node_list = tree[start_node].subnodes()
+                except:
+                    lopper.log._error( f"code lop: start node {start_node} not found", True )
 
             if re.search( ".*,lop,xlate.*$", lop_type ):
                 inherit_list.append( "lopper_lib" )
 
-                if tree.__selected__:
-                    node_list = tree.__selected__
-                else:
-                    node_list = [ "/" ]
+            selected = tree.exec_batch( start_node, node_list, code, options,
+                                        inherit_list, self.load_paths )
+            # who knows what the command did, better sync!
+            tree.sync()
 
-                for n in node_list:
-                    ret = tree.exec_cmd( n, code, options, inherit_list, self.load_paths )
-                    # who knows what the command did, better sync!
-                    tree.sync()
+            tree.__selected__ = selected
+
+            if tree.__selected__:
+                return True
+
+            return False
+
+        if re.search( ".*,lop,xlate.*$", lop_type ):
+            inherit_list.append( "lopper_lib" )
+
+            if tree.__selected__:
+                node_list = tree.__selected__
             else:
-                ret = tree.exec_cmd( start_node, code, options, inherit_list, self.load_paths )
+                node_list = [ "/" ]
+
+            for n in node_list:
+                ret = tree.exec_cmd( n, code, options, inherit_list, self.load_paths )
                 # who knows what the command did, better sync!
                 tree.sync()
+        else:
+            ret = tree.exec_cmd( start_node, code, options, inherit_list, self.load_paths )
+            # who knows what the command did, better sync!
+            tree.sync()
 
-            return ret
+        return ret
 
-        if re.search( ".*,lop,modify$", lop_type ):
-            node_name = lop_node.name
-            lopper.log._info( f"node {node_name} is a compatible modify lop" )
-            try:
-                prop = lop_node["modify"].value[0]
-            except:
-                prop = ""
+    def lop_modify( self, lop_node, lops_tree, options = None ):
+        """Execute a modify lop
 
-            try:
-                tree_name = lop_node['tree'].value[0]
-                try:
-                    tree = self.subtrees[tree_name]
-                except:
-                    lopper.log._error( f"tree name provided ({tree_name}), but not found", True )
-            except:
-                tree = self.tree
+        Modifies (adds, deletes, renames or updates properties of) the nodes
+        that match the 'modify' expression of the lop.
+
+        Args:
+            lop_node (LopperNode): the lop
+            lops_tree (LopperTree): the tree containing the lop
+            options (dictionary,optional): lop specific options passed from the caller
 
+        Returns:
+            boolean
+        """
+        node_name = lop_node.name
+        lopper.log._info( f"node {node_name} is a compatible modify lop" )
+        try:
+            prop = lop_node["modify"].value[0]
+        except:
+            prop = ""
+
+        try:
+            tree_name = lop_node['tree'].value[0]
             try:
-                nodes_selection = lop_node["nodes"].value[0]
+                tree = self.subtrees[tree_name]
             except:
-                nodes_selection = ""
-            if prop:
-                lopper.log._debug( f"modify property found: {prop}" )
-
-                # format is: "path":"property":"replacement"
-                #    - modify to "nothing", is a remove operation
-                #    - modify with no property is node operation (rename or remove)
-                modify_expr = prop.split(":")
-                # combine these into the assigment, once everything has bee tested
-                modify_path = modify_expr[0]
-                modify_prop = modify_expr[1]
-                modify_val = modify_expr[2]
-
-                lopper.log._info( f"modify path: {modify_expr[0]}" )
-                lopper.log._info( f"modify prop: {modify_expr[1]}" )
-                lopper.log._info( f"modify repl: {modify_expr[2]}" )
-                if nodes_selection:
-                    lopper.log._info( f"modify regex: {nodes_selection}" )
-
-                # if modify_expr[0] (the nodes) is empty, we use the selected nodes
-                # if they are available
-                if not modify_path:
-                    if not tree.__selected__:
-                        lopper.log._warning( f"no nodes supplied to modify, and no nodes are selected" )
-                        return False
-                    else:
-                        nodes = tree.__selected__
+                lopper.log._error( f"tree name provided ({tree_name}), but not found", True )
+        except:
+            tree = self.tree
+
+        try:
+            nodes_selection = lop_node["nodes"].value[0]
+        except:
+            nodes_selection = ""
+        if prop:
+            lopper.log._debug( lambda: f"modify property found: {prop}" )
+
+            # format is: "path":"property":"replacement"
+            #    - modify to "nothing", is a remove operation
+            #    - modify with no property is node operation (rename or remove)
+            modify_expr = prop.split(":")
+            # combine these into the assigment, once everything has bee tested
+            modify_path = modify_expr[0]
+            modify_prop = modify_expr[1]
+            modify_val = modify_expr[2]
+
+            lopper.log._info( f"modify path: {modify_expr[0]}" )
+            lopper.log._info( f"modify prop: {modify_expr[1]}" )
+            lopper.log._info( f"modify repl: {modify_expr[2]}" )
+            if nodes_selection:
+                lopper.log._info( f"modify regex: {nodes_selection}" )
+
+            # if modify_expr[0] (the nodes) is empty, we use the selected nodes
+            # if they are available
+            if not modify_path:
+                if not tree.__selected__:
+                    lopper.log._warning( f"no nodes supplied to modify, and no nodes are selected" )
+                    return False
                 else:
+                    nodes = tree.__selected__
+            else:
+                try:
+                    nodes = tree.subnodes( tree[modify_path] )
+                except Exception as e:
+                    lopper.log._debug( lambda: f"modify lop: node issue: {e}" )
+                    nodes = []
+
+            if modify_prop:
+                # property operation
+                if not modify_val:
+                    lopper.log._info( f"property remove operation detected: {modify_path} {modify_prop}" )
+
                     try:
-                        nodes = tree.subnodes( tree[modify_path] )
+                        # TODO: make a special case of the property_modify_below
+                        tree.sync()
+
+                        for n in nodes:
+                            try:
+                                n.delete( modify_prop )
+                            except:
+                                lopper.log._warning( f"property {modify_prop} not found, and not deleted" )
+                                # no big deal if it doesn't have the property
+                                pass
+
+                        tree.sync()
                     except Exception as e:
-                        lopper.log._debug( f"modify lop: node issue: {e}" )
-                        nodes = []
+                        lopper.log._error( f"unable to remove property {modify_path}/{modify_prop} ({e})", True )
+                else:
+                    lopper.log._info( f"property modify operation detected" )
+
+                    # set the tree state to "syncd", so we'll be able to test for changed
+                    # state later.
+                    tree.sync()
+
+                    # we re-do the nodes fetch here, since there are slight behaviour/return
+                    # differences between nodes() (what this has always used), and subnodes()
+                    # which is what we do above. We can re-test and reconcile this in the future.
+                    if modify_path:
+                        nodes = tree.nodes( modify_path )
+                    else:
+                        nodes = tree.__selected__
 
-                if modify_prop:
-                    # property operation
-                    if not modify_val:
-                        lopper.log._info( f"property remove operation detected: {modify_path} {modify_prop}" )
+                    if not nodes:
+                        lopper.log._warning( f"node {modify_path} not found,  property {modify_prop} not modified " )
 
+                    # if the value has a "&", it is a phandle, and we need
+                    # to try and look it up.
+                    if re.search( '&', modify_val ):
+                        node = modify_val.split( '#' )[0]
                         try:
-                            # TODO: make a special case of the property_modify_below
-                            tree.sync()
+                            node_property =  modify_val.split( '#' )[1]
+                        except:
+                            node_property = None
+
+                        phandle_node_name = re.sub( '&', '', node )
+                        pfnodes = tree.nodes( phandle_node_name )
+                        if not pfnodes:
+                            pfnodes = tree.lnodes( phandle_node_name )
+                            if not pfnodes:
+                                # was it a local phandle (i.e. in the lop tree?)
+                                pfnodes = lops_tree.nodes( phandle_node_name )
+                                if not pfnodes:
+                                    pfnodes = lops_tree.lnodes( phandle_node_name )
 
-                            for n in nodes:
+                        if node_property:
+                            # there was a node property, that means we actualy need
+                            # to lookup the phandle and find a property within it. That's
+                            # the replacement value
+                            if pfnodes:
                                 try:
-                                    n.delete( modify_prop )
+                                    modify_val = pfnodes[0][node_property].value
                                 except:
-                                    lopper.log._warning( f"property {modify_prop} not found, and not deleted" )
-                                    # no big deal if it doesn't have the property
-                                    pass
+                                    modify_val = pfnodes[0].phandle
+                            else:
+                                modify_val = 0
+                        else:
+                            if pfnodes:
+                                phandle = pfnodes[0].phandle
+                                if not phandle:
+                                    # this is a reference, generate a phandle
+                                    pfnodes[0].phandle = tree.phandle_gen()
+                                    phandle = pfnodes[0].phandle
+                            else:
+                                phandle = 0
 
-                            tree.sync()
-                        except Exception as e:
-                            lopper.log._error( f"unable to remove property {modify_path}/{modify_prop} ({e})", True )
-                    else:
-                        lopper.log._info( f"property modify operation detected" )
+                            modify_val = phandle
 
-                        # set the tree state to "syncd", so we'll be able to test for changed
-                        # state later.
-                        tree.sync()
+                    else:
+                        modify_val = Lopper.property_convert( modify_val )
 
-                        # we re-do the nodes fetch here, since there are slight behaviour/return
-                        # differences between nodes() (what this has always used), and subnodes()
-                        # which is what we do above. We can re-test and reconcile this in the future.
-                        if modify_path:
-                            nodes = tree.nodes( modify_path )
+                    for n in nodes:
+                        if type( modify_val ) == list:
+                            n[modify_prop] = modify_val
                         else:
-                            nodes = tree.__selected__
+                            n[modify_prop] = [ modify_val ]
 
-                        if not nodes:
-                            lopper.log._warning( f"node {modify_path} not found,  property {modify_prop} not modified " )
+                    tree.sync()
+            else:
+                lopper.log._warning( f"modify lop, node operation" )
 
-                        # if the value has a "&", it is a phandle, and we need
-                        # to try and look it up.
-                        if re.search( '&', modify_val ):
-                            node = modify_val.split( '#' )[0]
-                            try:
-                                node_property =  modify_val.split( '#' )[1]
-                            except:
-                                node_property = None
+                # drop the list, since if we are modifying a node, it is just one
+                # target node.
+                try:
+                    node = nodes[0]
+                except:
+                    node = None
 
-                            phandle_node_name = re.sub( '&', '', node )
-                            pfnodes = tree.nodes( phandle_node_name )
-                            if not pfnodes:
-                                pfnodes = tree.lnodes( phandle_node_name )
-                                if not pfnodes:
-                                    # was it a local phandle (i.e. in the lop tree?)
-                                    pfnodes = lops_tree.nodes( phandle_node_name )
-                                    if not pfnodes:
-                                        pfnodes = lops_tree.lnodes( phandle_node_name )
-
-                            if node_property:
-                                # there was a node property, that means we actualy need
-                                # to lookup the phandle and find a property within it. That's
-                                # the replacement value
-                                if pfnodes:
-                                    try:
-                                        modify_val = pfnodes[0][node_property].value
-                                    except:
-                                        modify_val = pfnodes[0].phandle
-                                else:
-                                    modify_val = 0
-                            else:
-                                if pfnodes:
-                                    phandle = pfnodes[0].phandle
-                                    if not phandle:
-                                        # this is a reference, generate a phandle
-                                        pfnodes[0].phandle = tree.phandle_gen()
-                                        phandle = pfnodes[0].phandle
-                                else:
-                                    phandle = 0
+                if not node:
+                    lopper.log._error( f"no nodes found for {modify_path}", True )
 
-                                modify_val = phandle
+                # node operation
+                # in case /<name>/ was passed as the new name, we need to drop them
+                # since they aren't valid in set_name()
+                if modify_val:
+                    modify_source_path = Path(node.abs_path)
 
-                        else:
-                            modify_val = Lopper.property_convert( modify_val )
+                    if modify_val.startswith( "/" ):
+                        modify_dest_path = Path( modify_val )
+                    else:
+                        modify_dest_path = Path( "/" + modify_val )
 
-                        for n in nodes:
-                            if type( modify_val ) == list:
-                                n[modify_prop] = modify_val
-                            else:
-                                n[modify_prop] = [ modify_val ]
+                    if modify_source_path.parent != modify_dest_path.parent:
+                        lopper.log._debug( lambda: f"[{tree}] node move: {modify_source_path} -> {modify_dest_path}" )
+                        # deep copy the node
+                        new_dst_node = node()
+                        new_dst_node.abs_path = modify_val
+
+                        tree + new_dst_node
+
+                        # delete the old node
+                        tree.delete( node )
 
                         tree.sync()
+
+                    if modify_source_path.name != modify_dest_path.name:
+                        lopper.log._debug( lambda: f"[{tree}] node rename: {modify_source_path.name} -> {modify_dest_path.name}" )
+
+                        modify_val = modify_val.replace( '/', '' )
+                        try:
+
+                            # is there already a node at the new destination path ?
+                            try:
+                                old_node = tree[str(modify_dest_path)]
+                                if old_node:
+                                    # we can error, or we'd have to delete the old one, and
+                                    # then let the rename happen. But really, you can just
+                                    # write a lop that takes care of that before calling such
+                                    # a bad rename lop.
+                                    lopper.log._debug( lambda: f"node exists at rename target: {old_node.abs_path}" )
+                                    lopper.log._debug( "Deleting it, to allow rename to continue" )
+
+                                    tree.delete( old_node )
+                            except Exception as e:
+                                # no node at the dest
+                                pass
+
+                            # change the name of the node
+                            node.name = modify_val
+                            tree.sync()
+
+                        except Exception as e:
+                            lopper.log._error( f"cannot rename node '{node.abs_path}' to '{modify_val}' ({e})", True )
                 else:
-                    lopper.log._warning( f"modify lop, node operation" )
+                    # first we see if the node prefix is an exact match
+                    node_to_remove = node
 
-                    # drop the list, since if we are modifying a node, it is just one
-                    # target node.
-                    try:
-                        node = nodes[0]
-                    except:
-                        node = None
+                    if not node_to_remove:
+                        lopper.log._warning( f"Cannot find node {node.abs_path} for delete operation"  )
+                        if self.werror:
+                            sys.exit(1)
+                    else:
+                        try:
+                            tree.delete( node_to_remove )
+                            tree.sync()
+                        except:
+                            lopper.log._warning( f"could not remove node number: {node_to_remove.abs_path}" )
 
-                    if not node:
-                        lopper.log._error( f"no nodes found for {modify_path}", True )
+        return True
 
-                    # node operation
-                    # in case /<name>/ was passed as the new name, we need to drop them
-                    # since they aren't valid in set_name()
-                    if modify_val:
-                        modify_source_path = Path(node.abs_path)
+    def lops_plan( self, lops_tree ):
+        """Build the execution plan of a lop file
 
-                        if modify_val.startswith( "/" ):
-                            modify_dest_path = Path( modify_val )
-                        else:
-                            modify_dest_path = Path( "/" + modify_val )
+        Finds the lops (in order) of a lop file, and parses their execution
+        controls once:
 
-                        if modify_source_path.parent != modify_dest_path.parent:
-                            lopper.log._debug( f"[{tree}] node move: {modify_source_path} -> {modify_dest_path}" )
-                            # deep copy the node
-                            new_dst_node = node()
-                            new_dst_node.abs_path = modify_val
+           - lops that are part of a conditional lop are not executed
+             directly (the conditional executes them), and are dropped
+           - the 'noexec' property
+           - the 'cond' property: the lop whose result determines if the
+             lop is executed
 
-                            tree + new_dst_node
+        Args:
+            lops_tree (LopperTree): the tree of the lop file
 
-                            # delete the old node
-                            tree.delete( node )
+        Returns:
+            list: (LopperNode, noexec, string) tuples. The lops, their noexec
+                  property (or False) and the name of their cond lop (or None)
+        """
+        lop_test = re.compile('system-device-tree-v1,lop.*')
+        lop_cond_test = re.compile('.*,lop,conditional.*$' )
+
+        plan = []
+        skip_list = set()
+        for f in lops_tree:
+            if not any(lop_test.match(i) for i in f.type):
+                continue
+
+            # past here, we know the node is a lop variant, we need one
+            # more check. Is the parent conditional ? if so, we don't
+            # excute it directly.
+            if any( lop_cond_test.match(i) for i in f.type):
+                # every node below the conditional is skipped, not just its
+                # children. For historical reasons, the conditional itself is
+                # in its subnodes, yank it out or we'll be skipped!
+                skip_list = set( n.abs_path for n in f.subnodes() if n is not f )
+
+            if f.abs_path in skip_list:
+                lopper.log._debug( lambda: f"noexec or skip set for:{f.abs_path}" )
+                continue
 
-                            tree.sync()
+            try:
+                noexec = f['noexec']
+            except:
+                noexec = False
 
-                        if modify_source_path.name != modify_dest_path.name:
-                            lopper.log._debug( f"[{tree}] node rename: {modify_source_path.name} -> {modify_dest_path.name}" )
+            try:
+                cond_exec = f['cond'].value[0]
+                cond_lop = lops_tree.pnode(cond_exec).name
+            except Exception as e:
+                cond_lop = None
 
-                            modify_val = modify_val.replace( '/', '' )
-                            try:
+            plan.append( (f, noexec, cond_lop) )
 
-                                # is there already a node at the new destination path ?
-                                try:
-                                    old_node = tree[str(modify_dest_path)]
-                                    if old_node:
-                                        # we can error, or we'd have to delete the old one, and
-                                        # then let the rename happen. But really, you can just
-                                        # write a lop that takes care of that before calling such
-                                        # a bad rename lop.
-                                        lopper.log._debug( f"node exists at rename target: {old_node.abs_path}" )
-                                        lopper.log._debug( f"Deleting it, to allow rename to continue" )
-
-                                        tree.delete( old_node )
-                                except Exception as e:
-                                    # no node at the dest
-                                    pass
-
-                                # change the name of the node
-                                node.name = modify_val
-                                tree.sync()
+        return plan
 
-                            except Exception as e:
-                                lopper.log._error( f"cannot rename node '{node.abs_path}' to '{modify_val}' ({e})", True )
-                    else:
-                        # first we see if the node prefix is an exact match
-                        node_to_remove = node
+    def lop_access( self, lop_node ):
+        """Get the read and write sets of a lop
 
-                        if not node_to_remove:
-                            lopper.log._warning( f"Cannot find node {node.abs_path} for delete operation"  )
-                            if self.werror:
-                                sys.exit(1)
-                        else:
-                            try:
-                                tree.delete( node_to_remove )
-                                tree.sync()
-                            except:
-                                lopper.log._warning( f"could not remove node number: {node_to_remove.abs_path}" )
+        The read and write sets describe what a lop uses and changes, they
+        are used to find the lops that can be executed concurrently (see
+        lops_schedule()).
 
-            return True
+        Currently only output lops have known access sets: they read a
+        tree, and write their output file. All other lops may change the
+        trees, or the state of lopper, and must execute on their own.
 
-        # if the lop didn't return, we return false by default
-        return False
+        Args:
+            lop_node (LopperNode): the lop
+
+        Returns:
+            tuple: (set) the reads, (set) the writes of the lop, or None if
+                   the lop must be executed on its own
+        """
+        lop_type = lop_node['compatible'].value[0]
+        if LopperSDT.lop_handler( lop_type ) != LopperSDT.lop_output:
+            return None
+
+        try:
+            output_file_name = lop_node['outfile'].value[0]
+        except:
+            return None
+
+        try:
+            tree_name = lop_node['tree'].value[0]
+        except:
+            tree_name = ""
+
+        output_file_full = os.path.realpath( self.outdir + "/" + output_file_name )
+
+        return ( { ("tree", tree_name) }, { ("file", output_file_full) } )
+
+    def lops_schedule( self, plan ):
+        """Group the lops of an execution plan into stages
+
+        The stages are executed in order. The lops in a stage do not conflict
+        (none of them writes what another reads or writes, see lop_access()),
+        so they can be executed concurrently. Lops are only grouped with the
+        lops that are next to them in the plan, the order of conflicting lops
+        is never changed.
+
+        Lops with a 'cond' property depend on the result of another lop, and
+        are executed on their own. If concurrent execution is not enabled (see
+        the jobs attribute), every lop is its own stage.
+
+        Args:
+            plan (list): the plan entries (see lops_plan())
+
+        Returns:
+            list: the stages, each a list of plan entries
+        """
+        parallel = self.jobs > 1 and hasattr( os, "fork" )
+        if parallel:
+            # the output of the workers is captured via the file descriptors
+            try:
+                sys.stdout.fileno()
+                sys.stderr.fileno()
+            except Exception:
+                parallel = False
+
+        stages = []
+        stage = []
+        stage_reads = set()
+        stage_writes = set()
+        for entry in plan:
+            f, noexec, cond_lop = entry
+
+            access = None
+            if parallel and not cond_lop:
+                if noexec:
+                    # it won't execute, it can't conflict
+                    access = ( set(), set() )
+                else:
+                    access = self.lop_access( f )
+
+            if access == None:
+                if stage:
+                    stages.append( stage )
+                stages.append( [ entry ] )
+                stage = []
+                stage_reads = set()
+                stage_writes = set()
+                continue
+
+            reads, writes = access
+            if writes & ( stage_reads | stage_writes ) or reads & stage_writes:
+                stages.append( stage )
+                stage = []
+                stage_reads = set()
+                stage_writes = set()
+
+            stage.append( entry )
+            stage_reads |= reads
+            stage_writes |= writes
+
+        if stage:
+            stages.append( stage )
+
+        return stages
+
+    def lops_parallel( self, stage, lops_tree, lop_results ):
+        """Execute the lops of a stage concurrently
+
+        Each lop is executed in a forked worker process (at most 'jobs' at a
+        time), which shares the loaded trees with lopper. The output of the
+        workers is captured, and once all the lops have completed, it is
+        replayed and the results are logged in the order of the lops. So the
+        results are the same as executing the lops in order.
+
+        Args:
+            stage (list): the plan entries (see lops_schedule())
+            lops_tree (LopperTree): the tree containing the lops
+            lop_results (dict): the results of the executed lops, indexed by
+                                lop name. Updated with the results of the stage
+
+        Returns:
+            Nothing
+        """
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        workers = []
+        running = {}
+        for f, noexec, cond_lop in stage:
+            if noexec:
+                workers.append( None )
+                continue
+
+            while len(running) >= self.jobs:
+                pid, status = os.wait()
+                running.pop( pid, None )
+
+            out = tempfile.TemporaryFile()
+            err = tempfile.TemporaryFile()
+            ret = tempfile.TemporaryFile()
+
+            pid = os.fork()
+            if pid == 0:
+                # worker: run the lop, and report the result. The worker must
+                # never return to the caller (or run the exit handlers)
+                try:
+                    os.dup2( out.fileno(), sys.stdout.fileno() )
+                    os.dup2( err.fileno(), sys.stderr.fileno() )
+                    try:
+                        result = ( "result", self.exec_lop( f, lops_tree ) )
+                    except SystemExit as e:
+                        result = ( "exit", e.code )
+                    except Exception as e:
+                        traceback.print_exc()
+                        result = ( "exception", str(e) )
+
+                    sys.stdout.flush()
+                    sys.stderr.flush()
+                    try:
+                        pickle.dump( result, ret )
+                    except Exception:
+                        pickle.dump( ( result[0], bool(result[1]) ), ret )
+                    ret.flush()
+                finally:
+                    os._exit( 0 )
+
+            running[pid] = f
+            workers.append( ( out, err, ret ) )
+
+        while running:
+            pid, status = os.wait()
+            running.pop( pid, None )
+
+        for ( f, noexec, cond_lop ), files in zip( stage, workers ):
+            if not files:
+                lopper.log._debug( lambda: f"noexec or skip set for:{f.abs_path}" )
+                continue
+
+            lopper.log._info( f"------> processing lop: {f.abs_path}" )
+
+            out, err, ret = files
+            for stream, output in [ ( sys.stdout, out ), ( sys.stderr, err ) ]:
+                output.seek( 0 )
+                captured = output.read()
+                output.close()
+                if captured:
+                    stream.flush()
+                    stream.buffer.write( captured )
+                    stream.flush()
+
+            ret.seek( 0 )
+            try:
+                kind, result = pickle.load( ret )
+            except Exception:
+                kind, result = ( "exception", "lop worker did not complete" )
+            ret.close()
+
+            if kind == "exit":
+                sys.exit( result )
+            if kind == "exception":
+                lopper.log._error( f"lop {f.abs_path} failed: {result}", True )
+
+            lop_results[f.name] = result
+            if self.verbose:
+                print( "[INFO]: ------> logged result %s for lop %s" % (result,f.name))
 
     def perform_lops(self):
         """Execute all loaded lops
@@ -2118,49 +2774,33 @@ class LopperSDT:
 
             lops_runqueue[lops_file_priority].append(x)
 
-        lopper.log._debug( f"lops runqueue: {lops_runqueue}" )
+        lopper.log._debug( lambda: f"lops runqueue: {lops_runqueue}" )
 
         lop_results = {}
         # iterate over the lops (by lop-file priority)
         for pri in range(1,10):
             for x in lops_runqueue[pri]:
                 fdt_tree = x.tree
-                lop_test = re.compile('system-device-tree-v1,lop.*')
-                lop_cond_test = re.compile('.*,lop,conditional.*$' )
-                skip_list = []
-                for f in fdt_tree:
-                    if not any(lop_test.match(i) for i in f.type):
+                for stage in self.lops_schedule( self.lops_plan( fdt_tree ) ):
+                    if len(stage) > 1:
+                        self.lops_parallel( stage, fdt_tree, lop_results )
                         continue
 
-                    # past here, we know the node is a lop variant, we need one
-                    # more check. Is the parent conditional ? if so, we don't
-                    # excute it directly.
-                    if any( lop_cond_test.match(i) for i in f.type):
-                        skip_list = f.subnodes()
-                        # for historical resons, the current node is in the subnodes
-                        # yank it out or we'll be skipped!
-                        skip_list.remove( f )
-
-                    try:
-                        noexec = f['noexec']
-                    except:
-                        noexec = False
-
-                    try:
-                        cond_exec = f['cond'].value[0]
-                        tgt_lop = fdt_tree.pnode(cond_exec)
-                        cond_exec_value = lop_results[tgt_lop.name]
-                        if self.verbose > 1:
-                            print( "[INFO]: conditional %s has result %s" % (tgt_lop.name,cond_exec_value))
-                        if cond_exec_value:
-                            noexec = False
-                        else:
-                            noexec = True
-                    except Exception as e:
-                        pass
+                    f, noexec, cond_lop = stage[0]
+                    if cond_lop:
+                        try:
+                            cond_exec_value = lop_results[cond_lop]
+                            if self.verbose > 1:
+                                print( "[INFO]: conditional %s has result %s" % (cond_lop,cond_exec_value))
+                            if cond_exec_value:
+                                noexec = False
+                            else:
+                                noexec = True
+                        except KeyError:
+                            pass
 
-                    if noexec or f in skip_list:
-                        lopper.log._debug( f"noexec or skip set for:{f.abs_path}" )
+                    if noexec:
+                        lopper.log._debug( lambda: f"noexec or skip set for:{f.abs_path}" )
                         continue
 
                     lopper.log._info( f"------> processing lop: {f.abs_path}" )
@@ -2171,6 +2811,262 @@ class LopperSDT:
                         print( "[INFO]: ------> logged result %s for lop %s" % (result,f.name))
 
 
+    def batch( self, batch_jobs, force = False, config = None ):
+        """Execute a set of jobs against the loaded system device tree
+
+        The system device tree is loaded (and resolved) once, by setup(), and
+        each job is then executed against its own copy of the loaded tree.
+        The copy is a forked worker process, which shares the pages of the
+        loaded tree with lopper until they are modified. At most 'jobs'
+        workers are executed at a time, and their output is captured and
+        replayed in the order of the jobs.
+
+        If workers cannot be forked, the jobs are executed in order, each
+        against a copy of the tree that is restored from a snapshot (see
+        LopperTree.snapshot_write()).
+
+        The lops and assists that are already loaded are executed by every
+        job, along with the lops and assists of the job.
+
+        Args:
+            batch_jobs (list): the jobs. Each job is a dictionary with the
+                               (optional) keys: "target" (the starting domain),
+                               "lops" (list of lop files), "assists" (list of
+                               assists) and "output" (the output file)
+            force (bool,optional): flag indicating if files should be overwritten and compilation
+                                   forced. Default is False.
+            config (ConfigParser,optional): the lopper configuration
+
+        Returns:
+            list: the exit status of each job, 0 if the job was successful
+        """
+        # the lops of all jobs are loaded up front, so they are compiled by
+        # lopper and problems are reported before any job is executed
+        job_lops = []
+        for job in batch_jobs:
+            job_lops.append( self.lops_load( job.get( "lops", [] ), self.include_paths, force, config ) )
+
+        fork = hasattr( os, "fork" )
+        if fork:
+            # the output of the workers is captured via the file descriptors
+            try:
+                sys.stdout.fileno()
+                sys.stderr.fileno()
+            except Exception:
+                fork = False
+
+        if not fork:
+            return self.batch_serial( batch_jobs, job_lops )
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        job_status = [ None ] * len(batch_jobs)
+        job_output = [ None ] * len(batch_jobs)
+        running = {}
+        replayed = 0
+        for i, job in enumerate( batch_jobs ):
+            while len(running) >= max( self.jobs, 1 ):
+                replayed = self.batch_wait( batch_jobs, running, job_status, job_output, replayed )
+
+            out = tempfile.TemporaryFile()
+            err = tempfile.TemporaryFile()
+
+            pid = os.fork()
+            if pid == 0:
+                # worker: execute the job against the (copy on write) tree
+                # of lopper. The worker must never return to the caller (or
+                # run the exit handlers)
+                exit_status = 1
+                try:
+                    os.dup2( out.fileno(), sys.stdout.fileno() )
+                    os.dup2( err.fileno(), sys.stderr.fileno() )
+                    # the jobs are executed concurrently, not their lops
+                    self.jobs = 1
+                    exit_status = self.batch_exec( job, job_lops[i] )
+                finally:
+                    os._exit( exit_status )
+
+            running[pid] = i
+            job_output[i] = ( out, err )
+
+        while running:
+            replayed = self.batch_wait( batch_jobs, running, job_status, job_output, replayed )
+
+        return job_status
+
+    def batch_wait( self, batch_jobs, running, job_status, job_output, replayed ):
+        """Wait for a batch worker to complete
+
+        The status of the completed worker is recorded, and the output of
+        the completed jobs is replayed, in the order of the jobs.
+
+        Args:
+            batch_jobs (list): the jobs (see batch())
+            running (dict): the index of the job of each running worker,
+                            indexed by pid
+            job_status (list): the exit status of the completed jobs (None
+                               if not completed)
+            job_output (list): the (stdout,stderr) files capturing the
+                               output of the jobs
+            replayed (int): the number of jobs that have been replayed
+
+        Returns:
+            int: the number of jobs that have been replayed
+        """
+        pid, status = os.wait()
+        i = running.pop( pid, None )
+        if i != None:
+            if os.WIFEXITED( status ):
+                job_status[i] = os.WEXITSTATUS( status )
+            else:
+                job_status[i] = 1
+
+        while replayed < len(batch_jobs) and job_status[replayed] != None:
+            self.batch_report( replayed, batch_jobs[replayed] )
+
+            for stream, output in zip( [ sys.stdout, sys.stderr ], job_output[replayed] ):
+                output.seek( 0 )
+                captured = output.read()
+                output.close()
+                if captured:
+                    stream.flush()
+                    stream.buffer.write( captured )
+                    stream.flush()
+
+            self.batch_report( replayed, batch_jobs[replayed], job_status[replayed] )
+            replayed += 1
+
+        return replayed
+
+    def batch_serial( self, batch_jobs, job_lops ):
+        """Execute a set of jobs in order
+
+        Each job is executed against a copy of the loaded tree, that is
+        restored from a snapshot. See batch().
+
+        Args:
+            batch_jobs (list): the jobs (see batch())
+            job_lops (list): the loaded lops of each job
+
+        Returns:
+            list: the exit status of each job, 0 if the job was successful
+        """
+        job_status = []
+        snapshot_secret = os.urandom( 32 )
+        saved = ( self.tree, self.lops, self.lops_optional, self.assists,
+                  self.verbose, self.target_domain, self.output_file )
+        with tempfile.TemporaryDirectory() as snapshot_dir:
+            snapshot = os.path.join( snapshot_dir, "snapshot" )
+            if not self.tree.snapshot_write( snapshot, secret=snapshot_secret ):
+                lopper.log._error( f"unable to copy the system device tree, batch jobs not executed", False )
+                return [ 1 ] * len(batch_jobs)
+
+            try:
+                for i, job in enumerate( batch_jobs ):
+                    self.batch_report( i, job )
+
+                    self.tree = LopperTree.snapshot_read( snapshot, secret=snapshot_secret )
+                    if self.tree == None:
+                        lopper.log._error( f"unable to copy the system device tree", False )
+                        status = 1
+                    else:
+                        self.lops = list( saved[1] )
+                        self.lops_optional = list( saved[2] )
+                        self.assists = list( saved[3] )
+                        self.verbose = saved[4]
+                        status = self.batch_exec( job, job_lops[i] )
+
+                    self.batch_report( i, job, status )
+                    job_status.append( status )
+            finally:
+                self.tree, self.lops, self.lops_optional, self.assists, \
+                    self.verbose, self.target_domain, self.output_file = saved
+
+        return job_status
+
+    def batch_exec( self, job, lops ):
+        """Execute a batch job
+
+        The lops and assists of the job are queued, and the lops are
+        executed against the tree. The output file of the job is then
+        written.
+
+        Args:
+            job (dict): the job (see batch())
+            lops (list): the loaded lops of the job
+
+        Returns:
+            int: the exit status of the job, 0 if the job was successful
+        """
+        try:
+            self.target_domain = job.get( "target", "" )
+            self.output_file = job.get( "output", "" )
+            self.lops.extend( lops )
+            self.assists_setup( job.get( "assists", [] ) )
+
+            self.perform_lops()
+
+            # the output is written directly from the tree, the FDT is
+            # shared by the jobs and is not synced
+            if not self.dryrun:
+                self.write( enhanced = self.enhanced )
+            else:
+                print( "[INFO]: --dryrun was passed, output file %s not written" % self.output_file )
+
+            status = 0
+        except SystemExit as e:
+            if e.code == None:
+                status = 0
+            elif isinstance( e.code, int ):
+                status = e.code
+            else:
+                print( e.code, file=sys.stderr )
+                status = 1
+        except Exception as e:
+            traceback.print_exc()
+            status = 1
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        return status
+
+    def batch_report( self, index, job, status = None ):
+        """Log the start (or the result) of a batch job
+
+        Args:
+            index (int): the index of the job
+            job (dict): the job (see batch())
+            status (int,optional): the exit status of the job. If None, the
+                                   start of the job is logged
+
+        Returns:
+            Nothing
+        """
+        target = job.get( "target", "" )
+        output = job.get( "output", "" )
+        if status == None:
+            lopper.log._info( f"batch job {index}: target: '{target}' output: '{output}'" )
+        elif status:
+            lopper.log._error( f"batch job {index} (target: '{target}' output: '{output}') failed, exit status: {status}", False )
+
+
+# the built in lops, in the order that their compatible strings are matched
+LopperSDT.lop_register( "exec", LopperSDT.lop_exec, ".*,exec.*$" )
+LopperSDT.lop_register( "print", LopperSDT.lop_print, ".*,print.*$" )
+LopperSDT.lop_register( "select", LopperSDT.lop_select, ".*,select.*$" )
+LopperSDT.lop_register( "meta", LopperSDT.lop_meta, ".*,meta.*$" )
+LopperSDT.lop_register( "output", LopperSDT.lop_output, ".*,output$" )
+LopperSDT.lop_register( "tree", LopperSDT.lop_tree, ".*,tree$" )
+LopperSDT.lop_register( "assist", LopperSDT.lop_assist, ".*,assist-v1$" )
+LopperSDT.lop_register( "load", LopperSDT.lop_load, ".*,lop,load$" )
+LopperSDT.lop_register( "add", LopperSDT.lop_add, ".*,lop,add$" )
+LopperSDT.lop_register( "conditional", LopperSDT.lop_conditional, ".*,lop,conditional.*$" )
+LopperSDT.lop_register( "code", LopperSDT.lop_code, ".*,lop,code.*$" )
+LopperSDT.lop_register( "xlate", LopperSDT.lop_code, ".*,lop,xlate.*$" )
+LopperSDT.lop_register( "modify", LopperSDT.lop_modify, ".*,lop,modify$" )
+
 class LopperFile:
     """Internal class to contain the details of a lopper file
 
@@ -16,6 +16,7 @@ import configparser
 import re
 
 from lopper import LopperSDT
+from lopper.cache import LopperCache
 
 from lopper.log import _warning, _info, _error, _debug
 import logging
@@ -34,6 +35,54 @@ def at_exit_cleanup():
 with open(Path(__file__).parent / 'VERSION', 'r') as f:
     LOPPER_VERSION = f.read().strip()
 
+def batch_read( batch_file, force ):
+    """Read the jobs of a batch file
+
+    Each (non empty, non comment) line of the file is a job, in the format:
+
+        <target>:<output file>[:<lop file>,...[:<assist>,...]]
+
+    Args:
+        batch_file (string): the batch file
+        force (bool): flag indicating if existing output files can be overwritten
+
+    Returns:
+        list: the jobs (see LopperSDT.batch())
+    """
+    batch_jobs = []
+    try:
+        with open( batch_file ) as f:
+            lines = f.readlines()
+    except OSError as e:
+        print( "[ERROR]: unable to read batch file %s: %s" % (batch_file, e) )
+        sys.exit(1)
+
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith( "#" ):
+            continue
+
+        # the lops and assists are optional
+        fields = line.split( ":" )
+        fields += [ "" ] * ( 4 - len(fields) )
+        b_target, b_output = fields[0], fields[1]
+        b_lops = [ l for l in fields[2].split( "," ) if l ]
+        b_assists = [ a for a in fields[3].split( "," ) if a ]
+
+        for l in b_lops:
+            if not Path(l).exists():
+                print( "[ERROR]: input file %s does not exist" % l )
+                sys.exit(1)
+
+        if b_output and Path(b_output).exists() and not force:
+            print( "Error: output file %s exists, and -f was not passed" % b_output )
+            sys.exit(1)
+
+        batch_jobs.append( { "target": b_target, "output": b_output,
+                             "lops": b_lops, "assists": b_assists } )
+
+    return batch_jobs
+
 def usage():
     prog = "lopper"
     print('Usage: %s [OPTION] <system device tree> [<output file>]...' % prog)
@@ -51,9 +100,14 @@ def usage():
     print('    , --overlay       Allow input files (dts or yaml) to overlay system device tree nodes' )
     print('  -x. --xlate         run automatic translations on nodes for indicated input types (yaml,dts)' )
     print('    , --no-libfdt     don\'t use dtc/libfdt for parsing/compiling device trees' )
+    print('    , --cache         cache the outputs of preprocessing and compiling the inputs (see LOPPER_CACHE_DIR)' )
+    print('    , --warm-start    load the system device tree from a cached snapshot when its inputs are unchanged' )
     print('  -f, --force         force overwrite output file(s)')
     print('    , --werror        treat warnings as errors' )
     print('  -S, --save-temps    don\'t remove temporary files' )
+    print('  -j, --jobs          maximum number of independent lops (i.e. outputs), or batch jobs, to execute concurrently (default 1)' )
+    print('    , --batch         run the jobs listed in a file against the system device tree, which is loaded once. One job per line:' )
+    print('                      <target>:<output file>[:<lop file>,...[:<assist>,...]]' )
     print('    , --cfgfile       specify a lopper configuration file to use (configparser format) ' )
     print('    , --cfgval        specify a configuration value to use (in configparser section format). Can be specified multiple times' )
     print('  -h, --help          display this help and exit')
@@ -86,14 +140,19 @@ def main():
     overlay = False
     config_file = None
     config_vals = {}
+    warm_start = False
+    cache = False
+    jobs = 1
+    batch_file = None
 
     try:
-        opts, args = getopt.getopt(sys.argv[1:], "A:t:dfvdhi:o:a:SO:D:x:",
+        opts, args = getopt.getopt(sys.argv[1:], "A:t:dfvdhi:o:a:SO:D:x:j:",
                                    [ "debug=", "assist-paths=", "outdir", "enhanced",
                                      "save-temps", "version", "werror","target=", "dump",
                                      "force","verbose","help","input=","output=","dryrun",
                                      "assist=","server", "auto", "permissive", "xlate=",
-                                     "no-libfdt", "overlay", "cfgfile=", "cfgval="] )
+                                     "no-libfdt", "overlay", "cfgfile=", "cfgval=", "warm-start",
+                                     "cache", "jobs=", "batch="] )
     except getopt.GetoptError as err:
         print('%s' % str(err))
         usage()
@@ -137,6 +196,18 @@ def main():
             save_temps=True
         elif o in ('--no-libfdt' ):
             libfdt=False
+        elif o in ('--warm-start' ):
+            warm_start = True
+        elif o in ('--cache' ):
+            cache = True
+        elif o in ('-j', '--jobs' ):
+            try:
+                jobs = int(a)
+            except ValueError:
+                print( "[ERROR]: invalid number of jobs: %s" % a )
+                sys.exit(2)
+        elif o in ('--batch' ):
+            batch_file = a
         elif o in ('--enhanced' ):
             enhanced_print = True
         elif o in ('--auto' ):
@@ -308,6 +379,10 @@ def main():
 
             inputfiles.append( x )
 
+    batch_jobs = []
+    if batch_file:
+        batch_jobs = batch_read( batch_file, force )
+
     if dump_dtb:
         lopper.Lopper.dtb_dts_export( sdt, verbose )
         sys.exit(0)
@@ -336,6 +411,11 @@ def main():
     device_tree.merge = overlay
     device_tree.autorun = auto_run
     device_tree.config = config
+    device_tree.warm_start = warm_start
+    device_tree.jobs = jobs
+
+    if cache:
+        LopperCache.enabled = True
 
     device_tree.setup( sdt, inputfiles, "", force, libfdt, config )
     device_tree.assists_setup( cmdline_assists )
@@ -357,6 +437,13 @@ def main():
                 m_args = module_args[module_name]
                 device_tree.assist_autorun_setup( module_name, m_args )
 
+    if batch_file:
+        batch_status = device_tree.batch( batch_jobs, force, config )
+        device_tree.cleanup()
+        if [ s for s in batch_status if s ]:
+            sys.exit(1)
+        sys.exit(0)
+
     if debug:
         if debug == "profile":
             import cProfile
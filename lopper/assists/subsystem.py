@@ -594,7 +594,7 @@ def expand_cdo_flags(tgt_node):
     flags_names = []
     flags = []
     # find default flags
-    for n in tgt_node.subnodes():
+    for n in tgt_node.walk( max_depth = 2 ):
         if n.depth == tgt_node.depth + 2 \
                 and n.abs_path == tgt_node.abs_path + "/flags/default":
             default_flags = n
@@ -602,7 +602,7 @@ def expand_cdo_flags(tgt_node):
 
     # for each flag reference
     # update flags' bits along with using default
-    for n in tgt_node.subnodes():
+    for n in tgt_node.walk( max_depth = 2 ):
         if n.depth == tgt_node.depth + 2:
             #    set all bits according to what is provided
             flags.extend(expand_cdo_flags_bits(n, default_flags))
@@ -733,7 +733,7 @@ def flags_expand(tree, tgt_node, verbose = 0 ):
         [flags_names, flags, flags_cells]  = expand_cdo_flags(tgt_node)
     else:
         # default expansion of flags
-        for n in tgt_node.subnodes():
+        for n in tgt_node.walk( max_depth = 2 ):
             if n.depth == tgt_node.depth + 2:
                 flags_names.append(n.name)
                 flags.append(0x0)
@@ -752,7 +752,7 @@ def domain_to_domain_expand(tree, tgt_node, verbose = 0 ):
         return False
 
     # loop through subnodes that describe various relations between domains
-    for n in tgt_node.subnodes():
+    for n in tgt_node.walk( max_depth = 1 ):
         if n.depth == tgt_node.depth + 1:
             if verbose:
                 print("domain_to_domain_expand: ", tgt_node, n)
@@ -9,9 +9,16 @@
 
 import re
 import os
+import sys
 import shutil
 import subprocess
+import textwrap
+import struct
+import array
+from collections import OrderedDict
+from collections import deque
 from lopper.fmt import LopperFmt
+from lopper.cache import LopperCache
 from string import printable
 from pathlib import Path
 from pathlib import PurePath
@@ -32,6 +39,12 @@ class lopper_base:
        - phandle_safe_name
        - encode_byte_array
        - encode_byte_array_from_strings
+       - cell_array
+       - cell_fields
+       - property_encode
+       - encode_dtb
+       - dtb_export
+       - dtb_export_nodes
        - string_test
        - input_file_type
        - _comment_replacer
@@ -68,6 +81,11 @@ class lopper_base:
                        be used, or if cpp is not on the path
            LOPPER_PPFLAGS: flags to be used when calling cpp
 
+        The preprocessed output is cached (see LopperCache), cpp is not run
+        if the input, included files, include paths and flags are unchanged.
+        If line markers are disabled (i.e. -P in LOPPER_PPFLAGS), the included
+        files are unknown and the output is not cached.
+
         Args:
            dts_file (string): path to the dts file to be preprocessed
            includes (list): list of include directories (translated into -i <foo>
@@ -122,16 +140,41 @@ class lopper_base:
         ppargs += (os.environ.get('LOPPER_PPFLAGS') or "").split()
         for i in includes.split():
             ppargs.append("-I{0}".format(i))
+
+        cache = LopperCache.open()
+        if cache and not LopperCache.cpp_line_markers( ppargs ):
+            # the included files can't be found, so the output can't be
+            # validated against them
+            cache = None
+        if cache:
+            # the output name is not part of the key, the cached output is
+            # copied to wherever it is requested
+            cache_key = cache.key( "cpp", LopperCache.tool_id( ppargs[0] ), ppargs,
+                                   os.getcwd(), dts_file, LopperCache.file_digest( dts_file ) )
+            messages = cache.fetch( cache_key, preprocessed_name )
+            if messages is not None:
+                if verbose:
+                    print( "[INFO]: preprocessing dts_file: %s (cached)" % dts_file )
+                sys.stderr.write( messages )
+                return preprocessed_name
+
         ppargs += ["-o", preprocessed_name, dts_file]
         if verbose:
             print( "[INFO]: preprocessing dts_file: %s" % ppargs )
 
-        result = subprocess.run( ppargs, check = True )
+        result = subprocess.run( ppargs, check = False, stderr=subprocess.PIPE )
         if result.returncode != 0:
             print( "[ERROR]: unable to preprocess dts file: %s" % ppargs )
             print( "\n%s" % textwrap.indent(result.stderr.decode(), '         ') )
             sys.exit(result.returncode)
 
+        messages = result.stderr.decode( errors='replace' )
+        sys.stderr.write( messages )
+
+        if cache:
+            cache.store( cache_key, preprocessed_name,
+                         LopperCache.cpp_dependencies( preprocessed_name ), messages )
+
         return preprocessed_name
 
     @staticmethod
@@ -485,14 +528,98 @@ class lopper_base:
            byte array: the encoded byte array
 
         """
-        barray = b''
+        # fast paths: the whole list is packed in one operation
+        try:
+            if byte_count_hint == 4:
+                return lopper_base.cell_array( values ).tobytes_be()
+            if byte_count_hint == 1:
+                return bytes( values )
+        except (OverflowError, ValueError, TypeError):
+            # values that don't fit are dropped, which the loop below
+            # takes care of
+            pass
+
+        barray = []
         for i in values:
             byte_count = byte_count_hint
             try:
-                barray = barray + i.to_bytes(byte_count,byteorder='big')
+                barray.append( i.to_bytes(byte_count,byteorder='big') )
             except OverflowError:
                 byte_count += 1
-        return barray
+        return b''.join( barray )
+
+    @staticmethod
+    def cell_array( values ):
+        """utility to pack property cells into an array of 32 bit values
+
+        Property cells are packed into an (unsigned, 32 bit) array, which
+        takes a fraction of the memory of a list of ints, and can be sliced,
+        compared and converted back to big endian bytes without looping over
+        the cells in python.
+
+        Args:
+           values (list or bytes): integer cells, or the raw (big endian)
+                                   bytes of a property
+
+        Returns:
+           LopperCells: the packed cells. OverflowError, TypeError or
+                        ValueError is raised if the values are not 32 bit cells
+
+        """
+        cells = LopperCells()
+        if isinstance( values, (bytes, bytearray, memoryview) ):
+            # frombytes() raises a ValueError if the length isn't a multiple
+            # of the cell size
+            cells.frombytes( values )
+            if sys.byteorder == "little":
+                cells.byteswap()
+        else:
+            cells.extend( values )
+
+        return cells
+
+    @staticmethod
+    def cell_fields( cells, field_cells ):
+        """utility to decode the records of a cell property
+
+        Properties like reg and ranges are lists of records, where each
+        record is made of fields and each field is one or more cells (as
+        described by #address-cells and #size-cells). The cells of each field
+        are combined into a single value.
+
+        The fields are calculated a column at a time (with strided slices)
+        rather than a record at a time.
+
+        Args:
+           cells (LopperCells or list): the cells of the property
+           field_cells (list): the number of cells in each field of a record
+                               i.e. [ #address-cells, #size-cells ]
+
+        Returns:
+           list: of tuples, one per complete record, holding the field values
+
+        """
+        record_size = sum( field_cells )
+        if record_size <= 0:
+            return []
+
+        count = len(cells) // record_size
+        end = count * record_size
+
+        columns = []
+        offset = 0
+        for field_size in field_cells:
+            if field_size <= 0:
+                column = [ 0 ] * count
+            else:
+                column = cells[offset:end:record_size]
+                for i in range( 1, field_size ):
+                    column = [ (upper << 32) | lower for upper, lower in
+                               zip( column, cells[offset + i:end:record_size] ) ]
+            columns.append( column )
+            offset += field_size
+
+        return list( zip( *columns ) )
 
     @staticmethod
     def encode_byte_array_from_strings( values ):
@@ -514,6 +641,463 @@ class lopper_base:
 
         return barray
 
+    @staticmethod
+    def property_encode( prop_name, prop_val, typehint=None ):
+        """utility to encode a property value for a flattened device tree
+
+        Single item lists are encoded as their item, strings that are
+        numbers are encoded as numbers, numbers are encoded as 32 bit values
+        (64 bit if they are large) and lists as a multi-string or as 32 bit
+        values. If the type hint is UINT8, numbers are encoded as bytes.
+
+        Args:
+           prop_name (string): property name (for warnings)
+           prop_val: property value to encode
+           typehint (LopperFmt,optional): the type of the property
+
+        Returns:
+           bytes: the encoded value, or None if it could not be encoded
+        """
+        # if it's a list, we dig in a bit to see if it is a single item list.
+        # if so, we grab the value so it can be propery encoded. We also have
+        # a special case if the '' string is the only element .. we explicity
+        # set the empty list, so it will encode properly.
+        if type(prop_val) == list:
+            if len(prop_val) == 1 and prop_val[0] != '':
+                prop_val = prop_val[0]
+            elif len(prop_val) == 1 and prop_val[0] == '':
+                pass
+
+        try:
+            prop_val_converted = int(prop_val,0)
+            # if it works, that's our new prop_val. This covers the case where
+            # a string is passed in, but it is really just a single number.
+            # note: we may need to consult "ftype" in the future so the caller
+            # can override this automatical conversion
+            prop_val = prop_val_converted
+        except:
+            # do nothing. let propval go through as whatever it was
+            pass
+
+        # we have to re-encode based on the type of what we just decoded.
+        if type(prop_val) == int:
+            if typehint and typehint == LopperFmt.UINT8:
+                return lopper_base.encode_byte_array([prop_val], 1)
+
+            # this seems to break some operations, but a variant may be required
+            # to prevent overflow situations
+            # if sys.getsizeof(prop_val) >= 32:
+            try:
+                if sys.getsizeof(prop_val) > 32:
+                    return prop_val.to_bytes( 8, byteorder='big' )
+                else:
+                    return prop_val.to_bytes( 4, byteorder='big' )
+            except OverflowError:
+                # it doesn't fit, we could thrown an error
+                return None
+
+        elif type(prop_val) == str:
+            return prop_val.encode( 'utf-8' ) + b'\0'
+
+        elif type(prop_val) == list:
+            if len(prop_val) > 1:
+                val_to_sync = []
+                iseq = iter(prop_val)
+                first_type = type(next(iseq))
+                # check for a mixed type, we get "false" if it is not all the same, or
+                # the type otherwise
+                the_same = first_type if all( (type(x) is first_type) for x in iseq ) else False
+                if the_same == False:
+                    # convert everything to strings
+                    val_to_sync = []
+                    for v in prop_val:
+                        val_to_sync.append( str(v) )
+                else:
+                    val_to_sync = prop_val
+            else:
+                val_to_sync = prop_val
+
+            prop_val = val_to_sync
+
+            # list is a compound value, or an empty one!
+            if typehint and typehint == LopperFmt.UINT8:
+                bval = lopper_base.encode_byte_array(prop_val, 1)
+            else:
+                try:
+                    bval = lopper_base.encode_byte_array_from_strings(prop_val)
+                except Exception as e:
+                    bval = lopper_base.encode_byte_array(prop_val)
+
+            return bval
+        else:
+            print( "[WARNING]: %s: unknown type was used: %s" % (prop_name,type(prop_val)) )
+
+        return None
+
+    @staticmethod
+    def encode_dtb( dct ):
+        """Encode a tree dictionary as a flattened device tree (dtb)
+
+        This routine takes a tree dictionary (see LopperTree.export()) and
+        builds the header, memory reservation, structure and strings blocks
+        of a dtb directly, so libfdt isn't required. It is the equivalent of
+        syncing the dictionary into a new FDT (see LopperFDT.sync()): the
+        blocks are laid out as libfdt creates them (fdt_create() and
+        fdt_finish()), with the same node and property order and the same
+        strings block.
+
+        The only bytes that can differ are the padding of property values.
+        They are always zero here, libfdt leaves whatever bytes were moved
+        out of the way when the property was inserted.
+
+        Args:
+           dct (dictionary): tree dictionary
+
+        Returns:
+           bytearray: the dtb
+        """
+        FDT_MAGIC = 0xd00dfeed
+        FDT_BEGIN_NODE = struct.pack( '>I', 0x1 )
+        FDT_END_NODE = struct.pack( '>I', 0x2 )
+        FDT_PROP = 0x3
+        FDT_END = struct.pack( '>I', 0x9 )
+
+        # we have a list of: containing dict, value, parent
+        dwalk = [ [dct,dct,None]  ]
+        node_ordered_list = []
+        node_special_list = []
+        while dwalk:
+            firstitem = dwalk.pop()
+            if type(firstitem[1]) is OrderedDict:
+                node_ordered_list.append( firstitem[1] )
+                for item,value in reversed(firstitem[1].items()):
+                    dwalk.append([firstitem[1],value,firstitem[0]])
+            elif type(firstitem[1]) is dict:
+                # type 'dict' are special nodes, that aren't order dependent
+                node_special_list.append( firstitem[1] )
+
+        # The properties of each node, in the order that a FDT sync creates
+        # them. The phandle is set first, and then the properties are set in
+        # reverse. New properties are inserted at the start of a node, and
+        # existing ones are updated in place.
+        #
+        # Property names are added to the strings block as they are first
+        # created, and like libfdt, we re-use any matching string (including
+        # the tail of a longer one).
+        strings = bytearray()
+        string_offsets = {}
+        node_props = {}
+        for node_in in reversed(node_ordered_list):
+            props = deque()
+            props_by_name = {}
+
+            prop_list = []
+            try:
+                if node_in['__fdt_phandle__']:
+                    prop_list.append( [ "phandle", node_in['__fdt_phandle__'], None ] )
+            except:
+                pass
+
+            for prop, prop_val in reversed(node_in.items()):
+                if prop.startswith( "__" ) or prop.startswith( '/' ):
+                    continue
+                prop_list.append( [ prop, prop_val, node_in.get( "__{}_type__".format( prop ) ) ] )
+
+            for prop, prop_val, qtype in prop_list:
+                bval = lopper_base.property_encode( prop, prop_val, qtype )
+                if bval is None:
+                    continue
+
+                try:
+                    props_by_name[prop][1] = bval
+                    continue
+                except KeyError:
+                    pass
+
+                try:
+                    name_offset = string_offsets[prop]
+                except KeyError:
+                    name = prop.encode( 'utf-8' ) + b'\0'
+                    name_offset = strings.find( name )
+                    if name_offset == -1:
+                        name_offset = len(strings)
+                        strings += name
+                    string_offsets[prop] = name_offset
+
+                props_by_name[prop] = [ name_offset, bval ]
+                props.appendleft( props_by_name[prop] )
+
+            node_props[id(node_in)] = props
+
+        # the structure block, we walk the nodes (depth first) with a
+        # stack of their children
+        dt_struct = bytearray()
+        nwalk = [ iter( [dct] ) ]
+        while nwalk:
+            try:
+                node_in = next( nwalk[-1] )
+            except StopIteration:
+                nwalk.pop()
+                if nwalk:
+                    dt_struct += FDT_END_NODE
+                continue
+
+            if type(node_in) is not OrderedDict:
+                continue
+
+            name = node_in['__fdt_name__'].encode( 'utf-8' ) + b'\0'
+            dt_struct += FDT_BEGIN_NODE + name + bytes( -len(name) % 4 )
+            for name_offset, bval in node_props[id(node_in)]:
+                dt_struct += struct.pack( '>III', FDT_PROP, len(bval), name_offset )
+                dt_struct += bval + bytes( -len(bval) % 4 )
+
+            nwalk.append( iter( node_in.values() ) )
+
+        dt_struct += FDT_END
+
+        # memory reservations, and the terminating (empty) reservation
+        dt_rsvmap = bytearray()
+        for n in node_special_list:
+            if n['__path__'] == "/memreserve":
+                memreserve_vals = n['__memreserve__']
+                dt_rsvmap += struct.pack( '>QQ', memreserve_vals[0], memreserve_vals[1] )
+        dt_rsvmap += bytes( 16 )
+
+        # header: magic, totalsize, off_dt_struct, off_dt_strings, off_mem_rsvmap,
+        #         version, last_comp_version, boot_cpuid_phys, size_dt_strings,
+        #         size_dt_struct
+        #
+        # like fdt_create(), the reservation map follows the (40 byte) header
+        # at the next reservation entry (16 byte) boundary
+        off_mem_rsvmap = 48
+        off_dt_struct = off_mem_rsvmap + len(dt_rsvmap)
+        off_dt_strings = off_dt_struct + len(dt_struct)
+        totalsize = off_dt_strings + len(strings)
+
+        dtb = bytearray( struct.pack( '>10I', FDT_MAGIC, totalsize, off_dt_struct,
+                                      off_dt_strings, off_mem_rsvmap, 17, 16, 0,
+                                      len(strings), len(dt_struct) ) )
+        dtb += bytes( off_mem_rsvmap - len(dtb) )
+        dtb += dt_rsvmap
+        dtb += dt_struct
+        dtb += strings
+
+        return dtb
+
+    @staticmethod
+    def dtb_export( dtb, verbose = False, strict = False, lazy = False ):
+        """export a dtb to a description / nested dictionary
+
+        This routine reads a flattened device tree (dtb) directly, and produces
+        the same nested dictionary as LopperFDT.export(), without libfdt.
+
+        Args:
+            dtb (bytes): the dtb contents
+            verbose (bool,optional): verbosity level
+            strict (bool,optional): toggle validity checking
+            lazy (bool,optional): toggle lazy property decoding
+
+        Returns:
+            OrderedDict describing the tree
+        """
+        dct = OrderedDict()
+
+        for node_dct, parent_dct in lopper_base.dtb_export_nodes( dtb, verbose, strict, lazy ):
+            if node_dct is parent_dct:
+                dct = node_dct
+            else:
+                # Children are indexed by their path (/foo/bar), since properties
+                # cannot start with '/'
+                parent_dct[node_dct["__path__"]] = node_dct
+
+        return dct
+
+    @staticmethod
+    def dtb_export_nodes( dtb, verbose = False, strict = False, lazy = False ):
+        """export a dtb as a stream of node dictionaries
+
+        This is the generator form of dtb_export(), and produces the same
+        stream as LopperFDT.export_nodes(), without libfdt. The structure block
+        of the dtb is walked once, and property values are read through a
+        memoryview of the dtb. In lazy mode, the values are not copied until
+        they are decoded (see LopperLazyValue).
+
+        Args:
+            dtb (bytes): the dtb contents
+            verbose (bool,optional): verbosity level
+            strict (bool,optional): toggle validity checking
+            lazy (bool,optional): toggle lazy property decoding
+
+        Returns:
+            generator: of [ node dictionary, parent node dictionary ] pairs
+        """
+        FDT_MAGIC = 0xd00dfeed
+        FDT_BEGIN_NODE = 0x1
+        FDT_END_NODE = 0x2
+        FDT_PROP = 0x3
+        FDT_NOP = 0x4
+        FDT_END = 0x9
+
+        if type(dtb) != bytes:
+            dtb = bytes(dtb)
+        dtb_view = memoryview( dtb )
+
+        if len(dtb) < 40:
+            raise Exception( "lopper: dtb is truncated" )
+
+        magic, totalsize, off_dt_struct, off_dt_strings, off_mem_rsvmap, \
+            version, last_comp_version = struct.unpack_from( '>7I', dtb, 0 )
+
+        if magic != FDT_MAGIC:
+            raise Exception( "lopper: invalid dtb (bad magic: %s)" % hex(magic) )
+
+        if version >= 17:
+            size_dt_struct, = struct.unpack_from( '>I', dtb, 36 )
+            dt_struct_end = off_dt_struct + size_dt_struct
+        else:
+            dt_struct_end = min( off_dt_strings, totalsize )
+
+        # property names, indexed by their offset in the strings block
+        prop_names = {}
+
+        # the dictionaries of the nodes on the current branch, indexed by
+        # depth, and the paths of their children (for duplicate detection)
+        branch = []
+        branch_subnodes = []
+
+        # the node we are reading properties for
+        dct = None
+        branch_root = None
+        phandle = 0
+        linux_phandle = 0
+
+        offset = off_dt_struct
+        while offset < dt_struct_end:
+            tag, = struct.unpack_from( '>I', dtb, offset )
+            tag_offset = offset
+            offset += 4
+
+            if tag == FDT_PROP:
+                prop_len, name_offset = struct.unpack_from( '>II', dtb, offset )
+                offset += 8
+
+                try:
+                    prop_name = prop_names[name_offset]
+                except KeyError:
+                    name_start = off_dt_strings + name_offset
+                    prop_name = dtb[name_start:dtb.index( b'\0', name_start )].decode( 'utf-8' )
+                    prop_names[name_offset] = prop_name
+
+                prop_val = dtb_view[offset:offset + prop_len]
+                offset += prop_len + (-prop_len % 4)
+
+                if prop_len == 4:
+                    if prop_name == "phandle" and not phandle:
+                        phandle, = struct.unpack_from( '>I', prop_val )
+                    elif prop_name == "linux,phandle" and not linux_phandle:
+                        linux_phandle, = struct.unpack_from( '>I', prop_val )
+
+                if lazy:
+                    # the type hint is also calculated on decode
+                    dct[prop_name] = LopperLazyValue( prop_val )
+                    continue
+
+                prop_val = prop_val.tobytes()
+                try:
+                    property_val = lopper_base.property_value_decode( prop_val, 0, LopperFmt.COMPOUND, LopperFmt.DEC )
+                except Exception as e:
+                    property_val = ""
+
+                dct[prop_name] = property_val
+                dct['__{}_type__'.format(prop_name)] = lopper_base.property_type_guess( prop_val )
+
+                continue
+
+            if tag == FDT_NOP:
+                continue
+
+            # any other tag completes the node we were reading
+            if dct is not None:
+                dct["__fdt_number__"] = node_number
+                dct["__fdt_name__"] = node_name
+                dct["__fdt_phandle__"] = phandle if phandle else linux_phandle
+
+                if verbose:
+                    print( "[DBG]: lopper.base dtb export: " )
+                    print( "[DBG]:     [node: %s]" % dct["__path__"] )
+
+                if len(branch) == 1:
+                    yield [ dct, dct ]
+                else:
+                    yield [ dct, branch[-2] ]
+
+                dct = None
+
+            if tag == FDT_BEGIN_NODE:
+                name_end = dtb.index( b'\0', offset )
+                node_name = dtb[offset:name_end].decode( 'utf-8' )
+                offset = name_end + 1
+                offset += -offset % 4
+
+                if not branch:
+                    node_path = "/"
+                else:
+                    parent_path = branch[-1]["__path__"]
+                    if parent_path == "/":
+                        parent_path = ""
+                    node_path = parent_path + "/" + node_name
+
+                    if strict:
+                        if node_path in branch_subnodes[-1]:
+                            raise Exception( "lopper: duplicate node detected (%s)" % node_path )
+                        branch_subnodes[-1].add( node_path )
+
+                # like libfdt, the node number is its offset in the
+                # structure block
+                node_number = tag_offset - off_dt_struct
+                phandle = 0
+                linux_phandle = 0
+
+                dct = OrderedDict()
+                dct["__path__"] = node_path
+
+                if not branch:
+                    branch_root = dct
+
+                branch.append( dct )
+                branch_subnodes.append( set() )
+            elif tag == FDT_END_NODE:
+                branch.pop()
+                branch_subnodes.pop()
+            elif tag == FDT_END:
+                break
+            else:
+                raise Exception( "lopper: invalid dtb (unknown tag %s at %s)" % (tag, tag_offset) )
+
+        # memory reservations
+        memreserve = []
+        offset = off_mem_rsvmap
+        while True:
+            mr = list( struct.unpack_from( '>QQ', dtb, offset ) )
+            offset += 16
+            if mr == [ 0, 0 ]:
+                break
+            memreserve.append( mr )
+
+        if memreserve and branch_root:
+            mdct = {}
+            mdct["__fdt_number__"] = -1
+            mdct["__fdt_name__"] = "memreserve"
+            mdct["__fdt_phandle__"] = -1
+            mdct["__path__"] = "/memreserve"
+            # like LopperFDT.export(), the last reservation is kept
+            mdct["__memreserve__"] = memreserve[-1]
+
+            if verbose:
+                print( "[DBG]:     lopper.base dtb export: memreserve: %s" % memreserve )
+
+            yield [ mdct, branch_root ]
+
     @staticmethod
     def string_test( prop, allow_multiline = True, debug = False ):
         """ Check if a property (byte array) is a string
@@ -743,3 +1327,72 @@ class lopper_base:
         )
         return re.sub(pattern, lopper_base._label_replacer, text)
 
+
+
+# the array type code for a 32 bit (unsigned) cell
+cell_typecode = "I" if array.array( "I" ).itemsize == 4 else "L"
+
+class LopperCells( array.array ):
+    """Class representing the packed (32 bit) cells of a property
+
+    An array of unsigned 32 bit values, see lopper_base.cell_array()
+
+    """
+    def __new__( cls, values = () ):
+        return super().__new__( cls, cell_typecode, values )
+
+    def tobytes_be( self ):
+        """Get the cells as big endian (device tree) bytes
+
+        Args:
+           None
+
+        Returns:
+           bytes: the encoded cells
+        """
+        if sys.byteorder == "little":
+            swapped = array.array( cell_typecode, self )
+            swapped.byteswap()
+            return swapped.tobytes()
+
+        return self.tobytes()
+
+class LopperLazyValue:
+    """Class representing a property value that has not been decoded
+
+    Decoding every property of a large device tree is slow, and most of
+    them are never looked at. Backends that support it (see LopperFDT.export)
+    can return this object in place of a property value. It holds the raw
+    (encoded) property, and it is decoded (and its type guessed) when the
+    value is first used (see LopperProp).
+
+    Attributes:
+       - prop: the raw (libfdt or byte) property
+
+    """
+    def __init__( self, prop ):
+        self.prop = prop
+
+    def decode( self ):
+        """Decode the raw property
+
+        The value is decoded as a compound (list) value, exactly as a
+        non lazy export would have done.
+
+        Args:
+           None
+
+        Returns:
+           tuple: (list) the property value, (LopperFmt) the property type guess
+        """
+        prop = self.prop
+        if type(prop) == memoryview:
+            prop = prop.tobytes()
+
+        try:
+            val = lopper_base.property_value_decode( prop, 0, LopperFmt.COMPOUND,
+                                                     LopperFmt.DEC )
+        except Exception as e:
+            val = ""
+
+        return val, lopper_base.property_type_guess( prop )
@@ -0,0 +1,515 @@
+#/*
+# * Copyright (c) 2024 Advanced Micro Devices, Inc. All Rights Reserved.
+# *
+# * Author:
+# *       Bruce Ashfield <bruce.ashfield@amd.com>
+# *
+# * SPDX-License-Identifier: BSD-3-Clause
+# */
+
+import os
+import re
+import json
+import stat
+import shutil
+import hashlib
+import tempfile
+from pathlib import Path
+
+class LopperCache:
+    """On disk, content addressed cache of compiled inputs
+
+    Preprocessing (cpp) and compiling (dtc) device trees are external tool
+    calls that are repeated on every invocation of lopper, even when the
+    inputs have not changed. The cache stores the outputs of those steps,
+    indexed by a key calculated from everything that was passed to the tool
+    (file contents, include paths, flags, tool version).
+
+    Files that are pulled in indirectly (i.e. #include / /include/) are not
+    known until the tool has run, so they are recorded as dependencies of
+    the cache entry, with the digest of their contents. An entry is only
+    used if all of its dependencies are unchanged. Messages (warnings) from
+    the tool are stored with the entry, so they can be replayed.
+
+    The cache is bounded in size, the least recently used entries are
+    evicted when the size is exceeded. Failures to write the cache are not
+    errors, the entries are simply not stored.
+
+    The cache is disabled by default. It is enabled by setting
+    LopperCache.enabled (the --cache option), or through the environment.
+    Environment variables can be used to control the cache:
+
+       LOPPER_CACHE: set to 1 (or yes, true, on) to enable the cache
+       LOPPER_CACHE_DIR: the directory holding the cache. Default is
+                         $XDG_CACHE_HOME/lopper (~/.cache/lopper)
+       LOPPER_CACHE_SIZE: the maximum size of the cache in bytes. K, M and
+                          G suffixes are accepted. Default is 256M, 0
+                          disables the cache.
+
+    Entries that are unpickled (tree snapshots) are only used if the cache
+    can't be written by others (see trusted()), and are authenticated with
+    a secret that only the user can read (see secret()).
+
+    Attributes:
+       - enabled: class variable, True if the cache has been enabled
+       - path: the directory holding the cache
+       - max_size: the maximum size (in bytes) of the cache
+       - dependencies: class variable holding the dependencies of the
+                       entries that were found or stored (by any cache).
+                       Cleared by the caller, and used to build entries
+                       that depend on other entries (i.e. tree snapshots)
+
+    """
+    # bump if the format of the entries changes
+    version = 1
+    default_size = 256 * 1024 * 1024
+
+    enabled = False
+
+    dependencies = {}
+
+    def __init__( self, path, max_size = default_size ):
+        self.path = Path( path )
+        self.max_size = max_size
+
+    @staticmethod
+    def open( enable = False ):
+        """Get the cache, as configured by the environment
+
+        Args:
+           enable (bool,optional): use the cache, even if it has not been
+                                   enabled (i.e. for a warm start)
+
+        Returns:
+           LopperCache: the cache, or None if caching is disabled or the cache
+                        directory cannot be used
+        """
+        env_enabled = os.environ.get( 'LOPPER_CACHE', "" ).strip().lower() in [ "1", "y", "yes", "true", "on" ]
+        if not enable and not LopperCache.enabled and not env_enabled:
+            return None
+
+        max_size = LopperCache.size_parse( os.environ.get( 'LOPPER_CACHE_SIZE' ) )
+        if not max_size:
+            return None
+
+        cache_dir = os.environ.get( 'LOPPER_CACHE_DIR' )
+        if not cache_dir:
+            cache_home = os.environ.get( 'XDG_CACHE_HOME' )
+            if not cache_home:
+                home = os.path.expanduser( "~" )
+                if home == "~":
+                    # no home directory, and nowhere else to put the cache
+                    return None
+                cache_home = os.path.join( home, ".cache" )
+            cache_dir = os.path.join( cache_home, "lopper" )
+
+        try:
+            os.makedirs( cache_dir, exist_ok=True )
+        except OSError:
+            return None
+
+        if not os.access( cache_dir, os.W_OK ):
+            return None
+
+        return LopperCache( cache_dir, max_size )
+
+    @staticmethod
+    def size_parse( size ):
+        """Convert a size string (with optional K, M or G suffix) to bytes
+
+        Args:
+           size (string): the size. If empty or None, the default is returned
+
+        Returns:
+           int: the size in bytes
+        """
+        if size is None or not size.strip():
+            return LopperCache.default_size
+
+        m = re.match( r'^\s*(\d+)\s*([kKmMgG]?)\s*$', size )
+        if not m:
+            return LopperCache.default_size
+
+        multiplier = { "": 1, "k": 1024, "m": 1024 * 1024, "g": 1024 * 1024 * 1024 }
+
+        return int(m.group(1)) * multiplier[m.group(2).lower()]
+
+    @staticmethod
+    def file_digest( filename ):
+        """Calculate the digest of the contents of a file
+
+        Args:
+           filename (string): the file
+
+        Returns:
+           string: the hex digest of the file, or None if it cannot be read
+        """
+        try:
+            with open( filename, 'rb' ) as f:
+                return hashlib.blake2b( f.read(), digest_size=20 ).hexdigest()
+        except OSError:
+            return None
+
+    @staticmethod
+    def tool_id( tool ):
+        """Identify the version of an external tool
+
+        The tool is identified by its resolved path, size and modification
+        time, so an update of the tool invalidates the cache entries that it
+        created.
+
+        Args:
+           tool (string): the tool (name or path)
+
+        Returns:
+           list: the identification of the tool
+        """
+        tool_path = shutil.which( tool ) or tool
+        try:
+            tool_path = os.path.realpath( tool_path )
+            st = os.stat( tool_path )
+            return [ tool_path, st.st_size, st.st_mtime_ns ]
+        except OSError:
+            return [ tool_path ]
+
+    def trusted( self, filename = None ):
+        """Check that the cache (or a file in it) can only be written by the user
+
+        Entries that are unpickled (i.e. tree snapshots) must not be used
+        from a cache that others can modify. The cache directory (and the
+        file, if passed) must be owned by the current user, and not be
+        writable by the group or others.
+
+        Args:
+           filename (string,optional): a file in the cache
+
+        Returns:
+           bool: True if the cache (and the file) can be trusted, False otherwise
+        """
+        if not hasattr( os, "getuid" ):
+            # no ownership to check, entries must be authenticated instead
+            # (see secret())
+            return True
+
+        paths = [ self.path ]
+        if filename:
+            paths.append( filename )
+
+        for p in paths:
+            try:
+                st = os.stat( p )
+            except OSError:
+                return False
+
+            if st.st_uid != os.getuid() or st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+                return False
+
+        return True
+
+    def secret( self ):
+        """Get the secret key of the cache
+
+        The key is used to authenticate entries that must not be tampered
+        with (i.e. tree snapshots). It is created on first use, and can only
+        be read by the user.
+
+        Args:
+           None
+
+        Returns:
+           bytes: the key, or None if it cannot be created or read, or can be
+                  read by others
+        """
+        secret_file = str( self.path / ".secret" )
+        try:
+            fd = os.open( secret_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600 )
+            with os.fdopen( fd, 'wb' ) as f:
+                f.write( os.urandom( 32 ) )
+        except FileExistsError:
+            pass
+        except OSError:
+            return None
+
+        try:
+            st = os.lstat( secret_file )
+            if not stat.S_ISREG( st.st_mode ) or st.st_mode & (stat.S_IRWXG | stat.S_IRWXO):
+                return None
+            if hasattr( os, "getuid" ) and st.st_uid != os.getuid():
+                return None
+
+            with open( secret_file, 'rb' ) as f:
+                secret = f.read()
+        except OSError:
+            return None
+
+        # a concurrent lopper may still be writing it
+        if len(secret) < 32:
+            return None
+
+        return secret
+
+    def key( self, *args ):
+        """Calculate a cache key
+
+        Args:
+           args: the values (strings, lists, numbers) that identify the
+                 cache entry
+
+        Returns:
+           string: the cache key
+        """
+        h = hashlib.blake2b( digest_size=20 )
+        h.update( json.dumps( [ LopperCache.version ] + list(args), default=str ).encode() )
+
+        return h.hexdigest()
+
+    def lookup( self, key ):
+        """Find a cache entry
+
+        The entry is only returned if all of its recorded dependencies are
+        unchanged.
+
+        Args:
+           key (string): the cache key (see key())
+
+        Returns:
+           tuple: (Path) the cached file, (string) the messages of the tool.
+                  (None, None) if there is no (valid) entry
+        """
+        entry = self.path / key
+        try:
+            with open( str(entry) + ".deps", 'r' ) as f:
+                manifest = json.load( f )
+            deps = manifest["deps"]
+            messages = manifest["messages"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None, None
+
+        for dep, digest in deps.items():
+            if LopperCache.file_digest( dep ) != digest:
+                return None, None
+
+        if not entry.exists():
+            return None, None
+
+        # mark the entry as recently used
+        try:
+            os.utime( entry )
+            os.utime( str(entry) + ".deps" )
+        except OSError:
+            return None, None
+
+        LopperCache.dependencies.update( deps )
+
+        return entry, messages
+
+    def fetch( self, key, output ):
+        """Copy a cache entry to an output file
+
+        Args:
+           key (string): the cache key (see key())
+           output (string): the file to write
+
+        Returns:
+           string: the messages of the tool, or None if the entry was not
+                   found
+        """
+        entry, messages = self.lookup( key )
+        if not entry:
+            return None
+
+        try:
+            shutil.copyfile( entry, output )
+        except OSError:
+            return None
+
+        return messages
+
+    def store( self, key, filename, deps = [], messages = "" ):
+        """Add a file to the cache
+
+        Args:
+           key (string): the cache key (see key())
+           filename (string): the file to store
+           deps (list,optional): the files the contents of the entry depend on
+           messages (string,optional): the messages of the tool
+
+        Returns:
+           bool: True if the entry was stored, False otherwise
+        """
+        manifest = { "deps": {}, "messages": messages }
+        for dep in deps:
+            manifest["deps"][dep] = LopperCache.file_digest( dep )
+
+        LopperCache.dependencies.update( manifest["deps"] )
+
+        entry = self.path / key
+        tmp_files = []
+        try:
+            # write to temporary files and rename, so concurrent lookups
+            # never see a partial entry
+            fd, tmp_entry = tempfile.mkstemp( dir=self.path, prefix=".tmp-" )
+            tmp_files.append( tmp_entry )
+            os.close( fd )
+            shutil.copyfile( filename, tmp_entry )
+            os.replace( tmp_entry, entry )
+
+            fd, tmp_deps = tempfile.mkstemp( dir=self.path, prefix=".tmp-" )
+            tmp_files.append( tmp_deps )
+            with os.fdopen( fd, 'w' ) as f:
+                json.dump( manifest, f )
+            os.replace( tmp_deps, str(entry) + ".deps" )
+        except OSError:
+            # i.e. the disk is full, or the cache was removed. Drop what was
+            # written, the entry (without its .deps) is never used.
+            for t in tmp_files:
+                try:
+                    os.remove( t )
+                except OSError:
+                    pass
+            return False
+
+        self.evict()
+
+        return True
+
+    def evict( self ):
+        """Evict the least recently used entries, until the cache fits its size
+
+        Args:
+           None
+
+        Returns:
+           int: the number of evicted entries
+        """
+        # entries (the file and its .deps) are evicted together, and are
+        # as old as their most recently used file
+        entries = {}
+        total = 0
+        try:
+            with os.scandir( self.path ) as it:
+                for e in it:
+                    # temporary files and the secret (see secret())
+                    if e.name.startswith( "." ):
+                        continue
+                    try:
+                        st = e.stat()
+                    except OSError:
+                        continue
+                    key = e.name[:-len(".deps")] if e.name.endswith( ".deps" ) else e.name
+                    mtime, size, files = entries.get( key, (0, 0, []) )
+                    entries[key] = (max( mtime, st.st_mtime_ns ), size + st.st_size, files + [ e.path ])
+                    total += st.st_size
+        except OSError:
+            return 0
+
+        if total <= self.max_size:
+            return 0
+
+        # evict down to 3/4 of the maximum, so we aren't doing this on
+        # every store
+        target = self.max_size * 3 // 4
+        count = 0
+        for mtime, size, files in sorted( entries.values() ):
+            if total <= target:
+                break
+            for fpath in files:
+                try:
+                    os.remove( fpath )
+                except OSError:
+                    pass
+            total -= size
+            count += 1
+
+        return count
+
+    @staticmethod
+    def cpp_dependencies( preprocessed_file ):
+        """Find the files used to create a cpp output
+
+        The line markers (# <line> "<file>" or #line <line> "<file>") in the
+        output are used to find the included files.
+
+        Args:
+           preprocessed_file (string): the cpp output
+
+        Returns:
+           list: the (absolute) paths of the files
+        """
+        deps = []
+        line_marker = re.compile( r'^#(?:line)?\s+\d+\s+"(.*?)"', re.MULTILINE )
+        with open( preprocessed_file, 'r', errors='replace' ) as f:
+            for m in line_marker.finditer( f.read() ):
+                fname = m.group(1)
+                if fname.startswith( "<" ):
+                    # <built-in>, <command-line>
+                    continue
+                fname = os.path.abspath( fname )
+                if fname not in deps and os.path.isfile( fname ):
+                    deps.append( fname )
+
+        return deps
+
+    @staticmethod
+    def cpp_line_markers( ppargs ):
+        """Check if a cpp (or pcpp) call outputs line markers
+
+        cpp_dependencies() finds the included files via the line markers, so
+        if they are disabled (cpp -P, or pcpp --line-directive without a
+        form) the dependencies of the output are unknown.
+
+        Args:
+           ppargs (list): the cpp command and arguments
+
+        Returns:
+           bool: True if line markers are output, False otherwise
+        """
+        for i, arg in enumerate( ppargs ):
+            if arg == "-P" or arg == "--line-directive=":
+                return False
+            if arg == "--line-directive":
+                if i + 1 >= len(ppargs) or ppargs[i + 1].startswith( "-" ):
+                    return False
+
+        return True
+
+    @staticmethod
+    def dtc_dependencies( dts_file, includes ):
+        """Find the files a dts pulls in via the /include/ and /incbin/ directives
+
+        The files are searched for as dtc does, relative to the including
+        file and then in the include directories. Included files are scanned
+        for more directives, incbin'd files are binary and are not.
+
+        Args:
+           dts_file (string): the dts file
+           includes (list): the include directories
+
+        Returns:
+           list: the (absolute) paths of the files
+        """
+        deps = []
+        # (directive, scan the found file)
+        directives = [ ( re.compile( r'/include/\s*"(.*?)"' ), True ),
+                       ( re.compile( r'/incbin/\s*\(\s*"(.*?)"' ), False ) ]
+        to_scan = [ os.path.abspath( dts_file ) ]
+        while to_scan:
+            fname = to_scan.pop()
+            try:
+                with open( fname, 'r', errors='replace' ) as f:
+                    data = f.read()
+            except OSError:
+                continue
+
+            for directive_re, scan in directives:
+                for m in directive_re.finditer( data ):
+                    for d in [ os.path.dirname( fname ) ] + list(includes):
+                        candidate = os.path.abspath( os.path.join( d, m.group(1) ) )
+                        if os.path.isfile( candidate ):
+                            if candidate not in deps:
+                                deps.append( candidate )
+                                if scan:
+                                    to_scan.append( candidate )
+                            break
+
+        return deps
@@ -174,7 +174,7 @@ class LopperDT(lopper.base.lopper_base):
         return matching_node, matching_nodes
 
     @staticmethod
-    def export( dt, start_node_path = "/", verbose = False, strict = False ):
+    def export( dt, start_node_path = "/", verbose = False, strict = False, lazy = False ):
         """export a FDT to a description / nested dictionary
 
         This routine takes a FDT, a start node, and produces a nested dictionary
@@ -206,6 +206,8 @@ class LopperDT(lopper.base.lopper_base):
             start_node (string,optional): the starting node
             verbose (bool,optional): verbosity level
             strict (bool,optional): toggle validity checking
+            lazy (bool,optional): unused. The properties of a DT are decoded
+                                  when it is parsed.
 
         Returns:
             OrderedDict describing the tree
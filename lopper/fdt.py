@@ -23,6 +23,8 @@ import contextlib
 import importlib
 from importlib.machinery import SourceFileLoader
 import tempfile
+import hashlib
+import weakref
 # from enum import Enum
 import atexit
 import textwrap
@@ -31,6 +33,7 @@ from collections import OrderedDict
 
 from lopper.fmt import LopperFmt
 import lopper.base
+from lopper.cache import LopperCache
 from lopper.tree import LopperTreePrinter
 
 from string import printable
@@ -55,8 +58,16 @@ class LopperFDT(lopper.base.lopper_base):
     Use the lopper methods when manipulating device trees (in particular
     libfdt FDT objects) or SystemDeviceTree classes.
 
+    Attributes:
+       - sync_state: the state of FDTs as of their last sync(), indexed by
+                     FDT. Used to only write changed nodes and properties on
+                     the next sync()
+
     """
 
+    ### --- class variables
+    sync_state = weakref.WeakKeyDictionary()
+
     @staticmethod
     def fdt_copy( fdt ):
         """Copy a fdt
@@ -547,10 +558,23 @@ class LopperFDT(lopper.base.lopper_base):
         if node == -1:
             return node_list
 
+        # the paths of the nodes on the current branch, indexed by depth. We
+        # build the paths as we walk, since looking up the absolute path of
+        # every node (node_abspath) is a walk from the start of the tree.
+        branch = []
         depth = 0
         while depth >= 0:
             if abs_paths:
-                node_list.append( LopperFDT.node_abspath( fdt, node ) )
+                del branch[depth:]
+                if depth == 0:
+                    path = LopperFDT.node_abspath( fdt, node )
+                else:
+                    parent_path = branch[depth - 1]
+                    if parent_path == "/":
+                        parent_path = ""
+                    path = parent_path + "/" + fdt.get_name( node )
+                branch.append( path )
+                node_list.append( path )
             else:
                 node_list.append( LopperFDT.node_getname( fdt, node ) )
 
@@ -609,7 +633,7 @@ class LopperFDT(lopper.base.lopper_base):
         return parent
 
     @staticmethod
-    def node_sync( fdt, node_in, parent = None, verbose = False ):
+    def node_sync( fdt, node_in, parent = None, verbose = False, synced = None ):
         """Write a node description to a FDT
 
         This routine takes an input dictionary, and writes the details to
@@ -633,11 +657,16 @@ class LopperFDT(lopper.base.lopper_base):
         the existing properties are read, and any that are no present in the
         passed dictionary are deleted.
 
+        If synced is passed, it is the node_digest() of the node as it was
+        last written to the FDT, and only the name, phandle and properties
+        that have changed since then are written.
+
         Args:
             fdt (fdt): flattened device tree object
             node_in: (dictionary): Node description dictionary
             parent (string,optional): path to the parent node
             verbose (bool,optional): verbosity level
+            synced (dictionary,optional): node digest of the last write
 
         Returns:
             Nothing
@@ -656,21 +685,29 @@ class LopperFDT(lopper.base.lopper_base):
                 print( "[ERROR]:    lopper.fdt: node could not be added, exiting" )
                 sys.exit(1)
 
+        if synced:
+            digest = LopperFDT.node_digest( node_in )
+        else:
+            synced = {}
+            digest = {}
+
         nname = node_in['__fdt_name__']
-        nflag = LopperFDT.node_setname( fdt, nn, nname )
-        if not nflag:
-            print( "[ERROR]: unable to set node %s name to: %s" % (nn,nname) )
-            sys.exit(1)
+        if not synced or synced.get( '__fdt_name__' ) != digest['__fdt_name__']:
+            nflag = LopperFDT.node_setname( fdt, nn, nname )
+            if not nflag:
+                print( "[ERROR]: unable to set node %s name to: %s" % (nn,nname) )
+                sys.exit(1)
 
         try:
             ph = node_in['__fdt_phandle__']
-            if ph:
+            if ph and (not synced or synced.get( '__fdt_phandle__' ) != digest['__fdt_phandle__']):
                 LopperFDT.property_set( fdt, nn, "phandle", ph )
         except:
             pass
 
         props = LopperFDT.node_properties( fdt, nn )
-        props_to_delete = []
+        # a dictionary, for ordered and fast removal
+        props_to_delete = OrderedDict()
         for p in props:
             if verbose:
                 print( "              node sync, considering property: %s %s" % (p.name,p) )
@@ -679,7 +716,7 @@ class LopperFDT(lopper.base.lopper_base):
                 # the name name
                 pass
             else:
-                props_to_delete.append( p.name )
+                props_to_delete[p.name] = True
 
         if verbose:
             print( "              node sync: props to delete: %s" % props_to_delete )
@@ -692,6 +729,13 @@ class LopperFDT(lopper.base.lopper_base):
                 if verbose:
                     print( "          lopper.fdt: node sync: prop: %s val: %s" % (prop,prop_val) )
 
+                # if a node was added at the top of this routine, it
+                # won't have anything in the props_to_delete
+                existing_prop = props_to_delete.pop( prop, False )
+                if existing_prop and synced and synced.get( prop ) == digest[prop]:
+                    # unchanged since the last sync
+                    continue
+
                 try:
                     qtype = node_in["__{}_type__".format( prop ) ]
                 except:
@@ -699,15 +743,6 @@ class LopperFDT(lopper.base.lopper_base):
 
                 # We could supply a type hint via the __{}_type__ attribute
                 LopperFDT.property_set( fdt, nn, prop, prop_val, LopperFmt.COMPOUND, verbose, qtype )
-                if props_to_delete:
-                    try:
-                        props_to_delete.remove( prop )
-                    except:
-                        # if a node was added at the top of this routine, it
-                        # won't have anything in the props_to_delete, and this
-                        # would throw an exception. Since that's ok, we just
-                        # catch it and move on.
-                        pass
 
         for p in props_to_delete:
             if verbose:
@@ -780,17 +815,30 @@ class LopperFDT(lopper.base.lopper_base):
             else:
                 pass
 
-        # this gets us a list of absolute paths. If we walk through the
-        # dictionary passed in, and delete them from the list, we have the list
-        # of nodes to delete with whatever is left over, and the nodes to add if
-        # they aren't in the list.
-        nodes_to_remove = LopperFDT.nodes( fdt, "/" )
-        nodes_to_add = []
+        # if the FDT hasn't been changed since our last sync, we know what
+        # is in it, and only need to write the changes.
+        try:
+            state = LopperFDT.sync_state[fdt]
+            if state["digest"] != LopperFDT.fdt_digest( fdt ):
+                state = None
+        except:
+            state = None
+
+        # this gets us a list of absolute paths. Whatever isn't in the
+        # dictionary passed in is a node to delete, and whatever isn't in
+        # the FDT is a node to add.
+        fdt_nodes = LopperFDT.nodes( fdt, "/" )
+        dct_nodes = set()
         for n_item in node_ordered_list:
-            try:
-                nodes_to_remove.remove( n_item[0]['__path__'] )
-            except:
-                nodes_to_add.append( n_item )
+            dct_nodes.add( n_item[0]['__path__'] )
+
+        nodes_to_remove = [ n for n in fdt_nodes if n not in dct_nodes ]
+        nodes_existing = dct_nodes.intersection( fdt_nodes )
+
+        # grow the FDT once, rather than on each failed write
+        size = LopperFDT.size_estimate( node_ordered_list )
+        if fdt.totalsize() < size:
+            fdt.resize( size )
 
         for node in nodes_to_remove:
             nn = LopperFDT.node_find( fdt, node )
@@ -832,6 +880,7 @@ class LopperFDT(lopper.base.lopper_base):
         # temporary to work around libfdt prefix issues
 
         # sync the properties
+        synced_nodes = {}
         for n_item in reversed(node_ordered_list):
             node_in = n_item[0]
             node_in_parent = n_item[1]
@@ -839,10 +888,116 @@ class LopperFDT(lopper.base.lopper_base):
             abs_path = node_path
             nn =  node_in['__fdt_number__']
 
-            LopperFDT.node_sync( fdt, node_in, node_in_parent, verbose )
+            digest = LopperFDT.node_digest( node_in )
+            synced_nodes[abs_path] = digest
+
+            synced = None
+            if state and abs_path in nodes_existing:
+                try:
+                    synced = state["nodes"][abs_path]
+                except:
+                    synced = None
+
+            if synced == digest:
+                if verbose:
+                    print( "[DBG]:    lopper.fdt: sync: node %s is unchanged" % abs_path )
+                continue
+
+            LopperFDT.node_sync( fdt, node_in, node_in_parent, verbose, synced )
+
+        # drop the free space we didn't use. pack() would also move the
+        # memory reservation map, the blocks are left where libfdt created
+        # them (see lopper_base.encode_dtb()). The free space follows the
+        # strings block (libfdt keeps the blocks in order when writing), so
+        # the tree is cut at the end of the strings. No swig wrapper for the
+        # total size, so we do this the hard way
+        data_size = fdt.off_dt_strings() + fdt.size_dt_strings()
+        libfdt.fdt_set_totalsize( fdt._fdt, data_size )
+        fdt.resize( data_size )
+
+        LopperFDT.sync_state[fdt] = { "digest": LopperFDT.fdt_digest( fdt ),
+                                      "nodes": synced_nodes }
+
+    @staticmethod
+    def node_digest( node_in ):
+        """Calculate the content digest of a node description
+
+        The digest has an entry for the name and phandle of the node, and for
+        each of its properties (value and type hint). Two descriptions with
+        the same digest entries write the same thing to a FDT.
+
+        Args:
+            node_in: (dictionary): Node description dictionary
+
+        Returns:
+            dict: the hash of each field of the node, indexed by field name
+        """
+        digest = {}
+        for prop, prop_val in node_in.items():
+            if prop.startswith( '/' ):
+                continue
+            if prop.startswith( "__" ):
+                if prop == '__fdt_name__' or prop == '__fdt_phandle__':
+                    digest[prop] = hash( repr( prop_val ) )
+                continue
+
+            digest[prop] = hash( (repr( prop_val ),
+                                  repr( node_in.get( "__{}_type__".format( prop ) ) )) )
+
+        return digest
+
+    @staticmethod
+    def fdt_digest( fdt ):
+        """Calculate the digest of the contents of a FDT
+
+        Args:
+            fdt (fdt): flattened device tree object
+
+        Returns:
+            bytes: the digest of the FDT
+        """
+        return hashlib.blake2b( fdt.as_bytearray(), digest_size=16 ).digest()
 
     @staticmethod
-    def export( fdt, start_node = "/", verbose = False, strict = False ):
+    def size_estimate( node_ordered_list ):
+        """Estimate the size of a FDT that holds the passed nodes
+
+        The estimate errs on the large side (no string de-duplication, and
+        all numbers are assumed to be 64 bit).
+
+        Args:
+            node_ordered_list (list): [ node dictionary, parent dictionary ] pairs
+
+        Returns:
+            int: the estimated size in bytes
+        """
+        # header, and the memreserve terminator
+        size = 40 + 16
+        for n_item in node_ordered_list:
+            node_in = n_item[0]
+            # begin and end node tags, and the name
+            size += 8 + len( node_in.get( '__fdt_name__', "" ) ) + 4
+            for prop, prop_val in node_in.items():
+                if prop.startswith( "__" ) or prop.startswith( '/' ):
+                    if prop == "__memreserve__":
+                        size += 16
+                    continue
+
+                # tag, length, name offset and the name in the strings block
+                size += 12 + len( prop ) + 1 + 4
+                if type(prop_val) != list:
+                    prop_val = [ prop_val ]
+                for v in prop_val:
+                    if type(v) == str:
+                        size += len( v.encode( 'utf-8' ) ) + 1
+                    else:
+                        size += 8
+
+        # the phandle properties, and some room for the unexpected
+        return size + (len( node_ordered_list ) * 16) + 1024
+
+    @staticmethod
+    def export( fdt, start_node = "/", verbose = False, strict = False, lazy = False ):
         """export a FDT to a description / nested dictionary
 
         This routine takes a FDT, a start node, and produces a nested dictionary
@@ -869,11 +1024,16 @@ class LopperFDT(lopper.base.lopper_base):
         flagged and an error triggered. Currently, this is duplicate nodes, but
         may be extended in the future
 
+        if lazy is enabled, property values are not decoded. They are exported
+        as LopperLazyValue objects (holding the raw property), which are decoded
+        (and their type guessed) when a LopperProp value is first accessed.
+
         Args:
             fdt (fdt): flattened device tree object
             start_node (string,optional): the starting node
             verbose (bool,optional): verbosity level
             strict (bool,optional): toggle validity checking
+            lazy (bool,optional): toggle lazy property decoding
 
         Returns:
             OrderedDict describing the tree
@@ -881,37 +1041,108 @@ class LopperFDT(lopper.base.lopper_base):
         # export a FDT as a dictionary
         dct = OrderedDict()
 
-        nodes = LopperFDT.node_subnodes( fdt, start_node )
+        # the nodes are streamed (depth first) with their parent dictionary,
+        # so we just have to link them in.
+        for node_dct, parent_dct in LopperFDT.export_nodes( fdt, start_node, verbose, strict, lazy ):
+            if node_dct is parent_dct:
+                dct = node_dct
+            else:
+                # Children are indexed by their path (/foo/bar), since properties
+                # cannot start with '/'
+                parent_dct[node_dct["__path__"]] = node_dct
 
-        if strict:
-            if len(nodes) != len(set(nodes)):
-                raise Exception( "lopper.fdt: duplicate node detected (%s)" % nodes )
+        return dct
 
-        dct["__path__"] = start_node
+    @staticmethod
+    def export_nodes( fdt, start_node = "/", verbose = False, strict = False, lazy = False ):
+        """export a FDT as a stream of node dictionaries
 
-        np = LopperFDT.node_properties_as_dict( fdt, start_node )
-        if np:
-            dct.update(np)
+        This is the generator form of export(). The FDT is walked once (depth
+        first, via its node offsets) from the start node, and a dictionary is
+        produced for each node as it is found. The dictionaries have the same
+        format as export(), but do not contain the child nodes.
 
-        nn = LopperFDT.node_number( fdt, start_node )
-        dct["__fdt_number__"] = nn
-        dct["__fdt_name__"] = LopperFDT.node_getname( fdt, start_node )
-        dct["__fdt_phandle__"] = LopperFDT.node_getphandle( fdt, nn )
+        Each node is yielded along with the dictionary of its parent (the
+        start node is its own parent), which is the format expected by
+        LopperTree.load(), so a tree can be loaded while the FDT is walked.
 
-        if verbose:
-            print( "[DBG]: lopper.fdt export: " )
-            print( "[DBG]:     [startnode: %s]: subnodes: %s" % (start_node,nodes ))
-            print( "[DBG]:          props: %s" % np )
+        Args:
+            fdt (fdt): flattened device tree object
+            start_node (string,optional): the starting node
+            verbose (bool,optional): verbosity level
+            strict (bool,optional): toggle validity checking
+            lazy (bool,optional): toggle lazy property decoding
+
+        Returns:
+            generator: of [ node dictionary, parent node dictionary ] pairs
+        """
+        start_offset = LopperFDT.node_number( fdt, start_node )
+        if start_offset == -1:
+            return
+
+        # the dictionaries of the nodes on the current branch, indexed
+        # by depth
+        branch = []
+        # the paths of the children of the nodes on the current branch,
+        # indexed by depth. Used for duplicate detection.
+        branch_subnodes = []
 
-        for i,n in enumerate(nodes):
-            # Children are indexed by their path (/foo/bar), since properties
-            # cannot start with '/'
-            dct[n] = LopperFDT.export( fdt, n, verbose, strict )
+        offset = start_offset
+        depth = 0
+        while offset >= 0 and depth >= 0:
+            del branch[depth:]
+            del branch_subnodes[depth:]
+
+            if depth == 0:
+                node_path = start_node
+                parent_dct = None
+            else:
+                parent_dct = branch[depth - 1]
+                parent_path = parent_dct["__path__"]
+                if parent_path == "/":
+                    parent_path = ""
+                node_path = parent_path + "/" + fdt.get_name( offset )
+
+                if strict:
+                    if node_path in branch_subnodes[depth - 1]:
+                        raise Exception( "lopper.fdt: duplicate node detected (%s)" % node_path )
+                    branch_subnodes[depth - 1].add( node_path )
+
+            dct = OrderedDict()
+            dct["__path__"] = node_path
+
+            np = LopperFDT.node_properties_as_dict( fdt, offset, lazy=lazy )
+            if np:
+                dct.update(np)
+
+            dct["__fdt_number__"] = offset
+            try:
+                dct["__fdt_name__"] = fdt.get_name( offset )
+            except:
+                dct["__fdt_name__"] = ""
+            dct["__fdt_phandle__"] = LopperFDT.node_getphandle( fdt, offset )
+
+            if verbose:
+                print( "[DBG]: lopper.fdt export: " )
+                print( "[DBG]:     [node: %s]: props: %s" % (node_path,np) )
+
+            branch.append( dct )
+            branch_subnodes.append( set() )
+
+            if parent_dct is None:
+                yield [ dct, dct ]
+            else:
+                yield [ dct, parent_dct ]
+
+            offset, depth = fdt.next_node( offset, depth, QUIET_NOTFOUND )
+            if depth <= 0:
+                # we've walked back out of the start node
+                break
 
         # only when processing the root node, we look to see if there
         # was a peer /memreserve node. if found, we add it to the exported
-        # dictionary
-        if start_node == "/":
+        # nodes
+        if start_node == "/" and branch:
             memreserve = fdt.num_mem_rsv()
             mdct = {}
             if memreserve:
@@ -934,13 +1165,10 @@ class LopperFDT(lopper.base.lopper_base):
 
                     mdct["__memreserve__"] = mr
 
-                dct["/memreserve"] = mdct
-
-
-        return dct
+                yield [ mdct, branch[0] ]
 
     @staticmethod
-    def node_properties_as_dict( fdt, node, type_hints=True, verbose=0 ):
+    def node_properties_as_dict( fdt, node, type_hints=True, verbose=0, lazy=False ):
         """Create a dictionary populated with the nodes properties.
 
         Builds a dictionary that is propulated with a node's properties as
@@ -953,6 +1181,8 @@ class LopperFDT(lopper.base.lopper_base):
             node (int or string): either a node number or node path
             type_hints  (bool,optional): flag indicating if type hints should be returned
             verbose (int,optional): verbosity level. default is 0.
+            lazy (bool,optional): flag indicating if values should be returned as
+                                  (undecoded) LopperLazyValue objects. default is False.
 
         Returns:
             dict: dictionary of the properties, if successfull, otherwise and empty dict
@@ -962,21 +1192,30 @@ class LopperFDT(lopper.base.lopper_base):
 
         # is the node a number ? or do we need to look it up ?
         node_number = -1
-        node_path = ""
         try:
             node_number = int(node)
-            node_path = LopperFDT.node_abspath( fdt, node )
         except ValueError:
-            node_number = LopperFDT.node_find( fdt, node )
-            node_path = node
+            # this warns if the node isn't found
+            node_number = LopperFDT.node_number( fdt, node )
 
         if node_number == -1:
-            print( "[WARNING]: could not find node %s" % node_path )
             return prop_dict
 
-        prop_list = LopperFDT.node_properties( fdt, node_path )
-        for p in prop_list:
-            property_val = LopperFDT.property_get( fdt, node_number, p.name, LopperFmt.COMPOUND )
+        poffset = fdt.first_property_offset( node_number, QUIET_NOTFOUND )
+        while poffset > 0:
+            p = fdt.get_property_by_offset( poffset )
+            poffset = fdt.next_property_offset( poffset, QUIET_NOTFOUND )
+
+            if lazy:
+                # the type hint is also calculated on decode
+                prop_dict[p.name] = lopper.base.LopperLazyValue( p )
+                continue
+
+            try:
+                property_val = LopperFDT.property_value_decode( p, 0, LopperFmt.COMPOUND, LopperFmt.DEC )
+            except Exception as e:
+                property_val = ""
+
             prop_dict[p.name] = property_val
             if type_hints:
                 prop_dict['__{}_type__'.format(p.name)] = LopperFDT.property_type_guess( p )
@@ -1445,111 +1684,24 @@ class LopperFDT(lopper.base.lopper_base):
 
         """
 
-        # if it's a list, we dig in a bit to see if it is a single item list.
-        # if so, we grab the value so it can be propery encoded. We also have
-        # a special case if the '' string is the only element .. we explicity
-        # set the empty list, so it will encode properly.
-        if type(prop_val) == list:
-            if len(prop_val) == 1 and prop_val[0] != '':
-                prop_val = prop_val[0]
-            elif len(prop_val) == 1 and prop_val[0] == '':
-                pass
-
-        try:
-            prop_val_converted = int(prop_val,0)
-            # if it works, that's our new prop_val. This covers the case where
-            # a string is passed in, but it is really just a single number.
-            # note: we may need to consult "ftype" in the future so the caller
-            # can override this automatical conversion
-            prop_val = prop_val_converted
-        except:
-            # do nothing. let propval go through as whatever it was
-            pass
-
-        # we have to re-encode based on the type of what we just decoded.
-        if type(prop_val) == int:
-            # this seems to break some operations, but a variant may be required
-            # to prevent overflow situations
-            # if sys.getsizeof(prop_val) >= 32:
-            for _ in range(MAX_RETRIES):
-                try:
-                    if typehint and typehint == LopperFmt.UINT8:
-                        bval = LopperFDT.encode_byte_array([prop_val], 1)
-                        fdt.setprop( node_number, prop_name, bval)
-                    elif sys.getsizeof(prop_val) > 32:
-                        fdt.setprop_u64( node_number, prop_name, prop_val )
-                    else:
-                        fdt.setprop_u32( node_number, prop_name, prop_val )
-
-                    break
-                except Exception as e:
-                    fdt.resize( fdt.totalsize() + 1024 )
-                    continue
-                else:
-                    break
-            else:
-                # it wasn't set all all, we could thrown an error
-                pass
-        elif type(prop_val) == str:
-            for _ in range(MAX_RETRIES):
-                try:
-                    fdt.setprop_str( node_number, prop_name, prop_val )
-                    break
-                except Exception as e:
-                    if verbose:
-                        print( "[WARNING]: property set exception: %s" % e)
-                    fdt.resize( fdt.totalsize() + 1024 )
-                    continue
-                else:
-                    break
-            else:
-                # we totally failed!
-                pass
+        bval = LopperFDT.property_encode( prop_name, prop_val, typehint )
+        if bval is None:
+            # it can't be encoded, we could throw an error
+            return
 
-        elif type(prop_val) == list:
-
-            if len(prop_val) > 1:
-                val_to_sync = []
-                iseq = iter(prop_val)
-                first_type = type(next(iseq))
-                # check for a mixed type, we get "false" if it is not all the same, or
-                # the type otherwise
-                the_same = first_type if all( (type(x) is first_type) for x in iseq ) else False
-                if the_same == False:
-                    # convert everything to strings
-                    val_to_sync = []
-                    for v in prop_val:
-                        val_to_sync.append( str(v) )
-                else:
-                    val_to_sync = prop_val
+        for _ in range(MAX_RETRIES):
+            try:
+                fdt.setprop( node_number, prop_name, bval)
+            except Exception as e:
+                if verbose:
+                    print( "[WARNING]: property set exception: %s" % e)
+                fdt.resize( fdt.totalsize() + 1024 )
+                continue
             else:
-                val_to_sync = prop_val
-
-            prop_val = val_to_sync
-
-            # list is a compound value, or an empty one!
-            if len(prop_val) >= 0:
-                if typehint and typehint == LopperFmt.UINT8:
-                    bval = LopperFDT.encode_byte_array(prop_val, 1)
-                else:
-                    try:
-                        bval = LopperFDT.encode_byte_array_from_strings(prop_val)
-                    except Exception as e:
-                        bval = LopperFDT.encode_byte_array(prop_val)
-
-                for _ in range(MAX_RETRIES):
-                    try:
-                        fdt.setprop( node_number, prop_name, bval)
-                    except Exception as e:
-                        fdt.resize( fdt.totalsize() + 1024 )
-                        continue
-                    else:
-                        break
-                else:
-                    # fail!
-                    print( "[WARNING]: lopper_fdt: unable to write property '%s' to fdt" % prop_name )
+                break
         else:
-            print( "[WARNING]: %s: unknown type was used: %s" % (prop_name,type(prop_val)) )
+            # fail!
+            print( "[WARNING]: lopper_fdt: unable to write property '%s' to fdt" % prop_name )
 
     @staticmethod
     def property_remove( fdt, node_name, prop_name, verbose=0 ):
@@ -1620,6 +1772,10 @@ class LopperFDT(lopper.base.lopper_base):
            LOPPER_DTC_OFLAGS: extra dtc flags if an overlay is being compiled
            LOPPER_DTC_BFLAGS: extra dtc args/flags
 
+        The compiled dtb is cached (see LopperCache), dtc is not run if the
+        preprocessed input, included files, include paths and flags are
+        unchanged.
+
         Args:
            dts_file (string): path to the dts file to be compiled
            i_files (list): files to be included
@@ -1657,7 +1813,28 @@ class LopperFDT(lopper.base.lopper_base):
 
         preprocessed_name = LopperFDT.dt_preprocess( dts_file, includes, outdir, verbose )
 
-        if enhanced:
+        isoverlay = False
+        dtcargs = (os.environ.get('LOPPER_DTC') or shutil.which("dtc")).split()
+        dtcargs += (os.environ.get( 'LOPPER_DTC_FLAGS') or "").split()
+        if isoverlay:
+            dtcargs += (os.environ.get("LOPPER_DTC_OFLAGS") or "").split()
+        else:
+            dtcargs += (os.environ.get("LOPPER_DTC_BFLAGS") or "").split()
+        for i in includes.split():
+            dtcargs += ["-i", i]
+
+        cached_dtb = None
+        cache = LopperCache.open()
+        if cache:
+            # the enhanced processing is part of this file, so it is also
+            # part of the key
+            cache_key = cache.key( "dtc", LopperCache.tool_id( dtcargs[0] ), dtcargs,
+                                   enhanced, permissive, os.environ.get('LOPPER_COMMENT_DROPLIST'),
+                                   LopperCache.file_digest( __file__ ), os.path.abspath( preprocessed_name ),
+                                   LopperCache.file_digest( preprocessed_name ) )
+            cached_dtb, messages = cache.lookup( cache_key )
+
+        if enhanced and not cached_dtb:
             fp = preprocessed_name
 
             # we need to ensure comments are maintained by converting them
@@ -1855,7 +2032,6 @@ class LopperFDT(lopper.base.lopper_base):
 
         # step 2: compile the dtb
         #         dtc -O dtb -o test_tree1.dtb test_tree1.dts
-        isoverlay = False
         output_dtb = "{0}.{1}".format(dts_filename, "dtbo" if isoverlay else "dtb")
 
         # make sure the dtb is not on disk, since it won't be overwritten by
@@ -1866,35 +2042,36 @@ class LopperFDT(lopper.base.lopper_base):
                 sys.exit(1)
             os.remove( output_dtb )
 
-        dtcargs = (os.environ.get('LOPPER_DTC') or shutil.which("dtc")).split()
-        dtcargs += (os.environ.get( 'LOPPER_DTC_FLAGS') or "").split()
-        if isoverlay:
-            dtcargs += (os.environ.get("LOPPER_DTC_OFLAGS") or "").split()
+        if cached_dtb:
+            if verbose:
+                print( "[INFO]: compiling dtb: %s (cached)" % dts_file )
+            shutil.copyfile( cached_dtb, "{0}/{1}".format(outdir,output_dtb) )
         else:
-            dtcargs += (os.environ.get("LOPPER_DTC_BFLAGS") or "").split()
-        for i in includes.split():
-            dtcargs += ["-i", i]
-
-        dtcargs += ["-o", "{0}/{1}".format(outdir,output_dtb)]
-        dtcargs += ["-I", "dts", "-O", "dtb", preprocessed_name ]
-        if verbose:
-            print( "[INFO]: compiling dtb: %s" % dtcargs )
-
-        result = subprocess.run(dtcargs, check = False, stderr=subprocess.PIPE )
-        if result.returncode != 0:
-            # force the dtb, we need to do processing
-            dtcargs += [ "-f" ]
+            dtcargs += ["-o", "{0}/{1}".format(outdir,output_dtb)]
+            dtcargs += ["-I", "dts", "-O", "dtb", preprocessed_name ]
             if verbose:
-                print( "[INFO]: forcing dtb generation: %s" % dtcargs )
+                print( "[INFO]: compiling dtb: %s" % dtcargs )
 
             result = subprocess.run(dtcargs, check = False, stderr=subprocess.PIPE )
             if result.returncode != 0:
-                print( "[ERROR]: unable to (force) compile %s" % dtcargs )
-                print( "\n%s" % textwrap.indent(result.stderr.decode(), '         ') )
-                sys.exit(1)
+                # force the dtb, we need to do processing
+                dtcargs += [ "-f" ]
+                if verbose:
+                    print( "[INFO]: forcing dtb generation: %s" % dtcargs )
+
+                result = subprocess.run(dtcargs, check = False, stderr=subprocess.PIPE )
+                if result.returncode != 0:
+                    print( "[ERROR]: unable to (force) compile %s" % dtcargs )
+                    print( "\n%s" % textwrap.indent(result.stderr.decode(), '         ') )
+                    sys.exit(1)
+
+            if cache:
+                cache.store( cache_key, "{0}/{1}".format(outdir,output_dtb),
+                             LopperCache.dtc_dependencies( preprocessed_name, includes.split() ) )
 
-        # cleanup: remove the .pp file
-        if not save_temps:
+        # cleanup: remove the .pp file (the enhanced file isn't created
+        # when the dtb is cached)
+        if not save_temps and not (cached_dtb and enhanced):
             os.remove( preprocessed_name )
 
         # if we got here, and for some reason the output_dtb does not exist, we should
@@ -14,6 +14,9 @@ import sys
 logging.basicConfig( format='[%(levelname)s]: %(message)s' )
 root_logger = logging.getLogger()
 
+# loggers, indexed by the file of the calling code. See __logger__()
+__loggers__ = {}
+
 def init( verbose ):
     # iterate registered loggers and set their default level to a
     # consistent value.
@@ -73,6 +76,9 @@ def _init( name ):
         l.addHandler( ch )
         l.propagate = False
 
+        # a module may now have its own logger
+        __loggers__.clear()
+
 def _level( level, name = None ):
     """
     Set the logging level of a named logger
@@ -91,6 +97,7 @@ def _level( level, name = None ):
     """
     if name:
         logger = logging.getLogger(name)
+        __loggers__.clear()
     else:
         logger = root_logger
 
@@ -123,8 +130,11 @@ def _info( message, output_if_true = True, logger = None ):
     If no specific named logger has been initialized, the default
     root logger is used.
 
+    The message can be a callable (i.e. a lambda returning an f-string),
+    which is only called if the message is going to be output.
+
     Args:
-        message (string): the string to output
+        message (string or callable): the string to output
         output_if_true (bool,optonal): flag indicating if the message should be output
         logger (Logger,optional): the logger to use, otherwise, look it up
 
@@ -134,7 +144,9 @@ def _info( message, output_if_true = True, logger = None ):
     if not logger:
         logger = __logger__()
 
-    if output_if_true:
+    if output_if_true and logger.isEnabledFor( logging.INFO ):
+        if callable( message ):
+            message = message()
         logger.info( message )
 
 def _error( message, also_exit = True, logger = None ):
@@ -169,8 +181,15 @@ def _debug( message, object_to_print = None, logger = None ):
     If no specific named logger has been initialized, the default
     root logger is used.
 
+    Debug messages are called from hot paths, and are usually not output.
+    So the level is checked first, and the message can be a callable
+    (i.e. a lambda returning an f-string), so that it is only formatted
+    if it is going to be output:
+
+        _debug( lambda: f"node: {node.abs_path}" )
+
     Args:
-        message (string): the string to output
+        message (string or callable): the string to output
         object_to_pring (object,optonal): if not None, print() is called on the passed object
         logger (Logger,optional): the logger to use, otherwise, look it up
 
@@ -180,11 +199,16 @@ def _debug( message, object_to_print = None, logger = None ):
     if not logger:
         logger = __logger__()
 
+    if not logger.isEnabledFor( logging.DEBUG ):
+        return
+
+    if callable( message ):
+        message = message()
+
     logger.debug( message )
 
     if object_to_print:
-        if logger.isEnabledFor( logging.DEBUG ):
-            object_to_print.print()
+        object_to_print.print()
 
 
 ## internal calls only, since this pokes at the call stack and is
@@ -204,6 +228,9 @@ def __logger__():
     if _init() has been called, we return the logger, otherwise, we return
     the root logger and use the defaults.
 
+    The result of the lookup is cached per calling file (until another
+    logger is initialized), since this is called for every message.
+
     Args:
         None
 
@@ -211,13 +238,25 @@ def __logger__():
         Logger
     """
     try:
-        # look two levels back for the calling module, and see if it
-        # has a logger
-        x = os.path.basename(sys._getframe().f_back.f_back.f_code.co_filename)
+        # look two levels back for the calling module
+        code_file = sys._getframe(2).f_code.co_filename
+    except Exception as e:
+        return root_logger
+
+    try:
+        return __loggers__[code_file]
+    except KeyError:
+        pass
+
+    try:
+        # and see if it has a logger
+        x = os.path.basename(code_file)
         # print( "available loggers %s" % logging.root.manager.loggerDict )
         logger = logging.root.manager.loggerDict[x]
         logger = logging.getLogger(x)
     except Exception as e:
         logger = root_logger
 
+    __loggers__[code_file] = logger
+
     return logger
@@ -23,6 +23,12 @@ from collections import OrderedDict
 from collections import Counter
 import copy
 import json
+import bisect
+import functools
+import pickle
+import mmap
+import hmac
+import hashlib
 
 import lopper.base
 from lopper.fmt import LopperFmt
@@ -47,6 +53,73 @@ def chunks(l, n):
         # Create an index range for l of n items:
         yield l[i:i+n]
 
+# properties that change the translated address of a node (or its
+# subnodes). Changes to these invalidate a tree's address index.
+address_properties = [ "reg", "ranges", "#address-cells", "#size-cells" ]
+
+# the number of prepared code blocks a tree keeps (see exec_cmd())
+exec_cache_size = 32
+
+# node and label lookups are regex based, and the same handful of
+# expressions are used over and over by lops. Keep them compiled.
+@functools.lru_cache( maxsize=512 )
+def regex_compile( regex ):
+    return re.compile( regex )
+
+regex_special_chars = set( ".^$*+?{}[]\\|()" )
+
+def regex_literal_prefix( regex ):
+    # return the literal string that every match of a "^" anchored
+    # regex must start with, or None if the regex isn't anchored.
+    if not regex.startswith( "^" ) or "|" in regex:
+        return None
+
+    prefix = ""
+    for i, c in enumerate( regex[1:] ):
+        if c in regex_special_chars:
+            # a quantifier applies to the last literal character,
+            # so it can't be part of the prefix
+            if c in "*?{" and prefix:
+                prefix = prefix[:-1]
+            return prefix
+        prefix += c
+
+    return prefix
+
+# phandle descriptions (see Lopper.phandle_possible_properties()) are
+# parsed once into a tuple of fields: (kind, property, expression), where
+# kind is "phandle" (with an optional cell count property and expression),
+# "#" (a cell count property in the node) or "" (a plain cell)
+@functools.lru_cache( maxsize=None )
+def phandle_fields( description ):
+    fields = []
+    for desc in description.split():
+        if desc.startswith( "phandle" ):
+            derefs = desc.split( ':' )
+            fields.append( ( "phandle",
+                             derefs[1] if len(derefs) >= 2 else None,
+                             derefs[2] if len(derefs) == 3 else None ) )
+        elif desc.startswith( "#" ):
+            fields.append( ( "#", desc, None ) )
+        else:
+            fields.append( ( "", None, None ) )
+
+    return tuple( fields )
+
+# restore pickled state to an object with slots, without going through
+# its __setattr__. The state is a dictionary, or a (dictionary, slots)
+# tuple.
+def lopper_setstate( obj, state ):
+    if isinstance( state, tuple ):
+        state, slots = state
+    else:
+        slots = None
+
+    for s in ( state, slots ):
+        if s:
+            for a, v in s.items():
+                object.__setattr__( obj, a, v )
+
 # used in node_filter
 class LopperAction(Enum):
     """Enum class to define the actions available in Lopper's node_filter function
@@ -80,7 +153,16 @@ class LopperProp():
        - type: The type of a property, "comment", "preamble" or "list"
        - abs_path: The absolute device tree path to this property
 
+    Trees can have hundreds of thousands of properties, so the attributes
+    are stored in slots. A __dict__ is only created for a property if
+    an attribute that isn't listed in the slots is assigned to it.
+
     """
+    __slots__ = ( "__modified__", "__pstate__", "__dbg__", "name", "node", "number",
+                  "string_val", "pclass", "ptype", "binary", "phandle_resolution",
+                  "abs_path", "value", "__lazy__", "__lazy_strict__", "__phandle_map__",
+                  "__resolved__", "__dict__" )
+
     def __init__(self, name, number = -1, node = None, value = None, debug_lvl = 0 ):
         self.__modified__ = True
         self.__pstate__ = "init"
@@ -90,20 +172,114 @@ class LopperProp():
         self.node = node
         self.number = number
 
+        self.phandle_resolution = True
+
+        if isinstance( value, lopper.base.LopperLazyValue ):
+            # the value, and everything calculated from it, is filled in
+            # on first access. See __getattr__ and decode()
+            object.__setattr__( self, "__lazy__", value )
+            return
+
         self.string_val = "**unresolved**"
         self.pclass = ""
         self.ptype = ""
         self.binary = False
 
-        self.phandle_resolution = True
-
         self.abs_path = ""
 
         if value == None:
             self.value = []
         else:
             # we want to avoid the overriden __setattr__ below
-            self.__dict__["value"] = value
+            object.__setattr__( self, "value", value )
+
+    def __setstate__(self, state):
+        """magic method to restore a pickled (i.e. snapshot) property
+
+        Defined so that restoring a property doesn't go through __setattr__,
+        which modifies and resolves the property.
+
+        Args:
+           state: the attributes of the property, (dict, slots) tuple
+
+        Returns:
+           Nothing
+        """
+        lopper_setstate( self, state )
+
+    def __getattr__(self, name):
+        """magic method to decode a lazily loaded property
+
+        Only called when an attribute is not found. A property that was
+        loaded with a LopperLazyValue has no value (or attributes calculated
+        from the value) until it is decoded, so we decode it and try again.
+
+        Args:
+           name: attribute name
+
+        Returns:
+           The attribute value, or AttributeError exception
+        """
+        try:
+            object.__getattribute__( self, "__lazy__" )
+        except AttributeError:
+            pass
+        else:
+            self.decode()
+            return getattr( self, name )
+
+        raise AttributeError( f"'{type(self).__name__}' object has no attribute '{name}'" )
+
+    def decode( self ):
+        """decode and resolve a lazily loaded property
+
+        Decodes the raw value of a property loaded with a LopperLazyValue,
+        guesses its type (unless it is already set) and resolves it. Properties
+        that are not lazy are not modified.
+
+        Args:
+           None
+
+        Returns:
+           Nothing
+        """
+        try:
+            lazy_value = object.__getattribute__( self, "__lazy__" )
+        except AttributeError:
+            return
+
+        object.__delattr__( self, "__lazy__" )
+
+        value, ptype = lazy_value.decode()
+
+        def slot_default( name, default ):
+            try:
+                object.__getattribute__( self, name )
+            except AttributeError:
+                object.__setattr__( self, name, default )
+
+        object.__setattr__( self, "value", value )
+        slot_default( "string_val", "**unresolved**" )
+        slot_default( "pclass", "" )
+        slot_default( "abs_path", "" )
+        try:
+            object.__getattribute__( self, "ptype" )
+        except AttributeError:
+            object.__setattr__( self, "ptype", ptype )
+            if ptype == LopperFmt.UINT8:
+                slot_default( "binary", True )
+        slot_default( "binary", False )
+
+        try:
+            strict = object.__getattribute__( self, "__lazy_strict__" )
+            object.__delattr__( self, "__lazy_strict__" )
+        except AttributeError:
+            strict = True
+
+        # decoding isn't a modification
+        modified = self.__modified__
+        self.resolve( strict )
+        self.__modified__ = modified
 
 
     def __deepcopy__(self, memodict={}):
@@ -114,8 +290,8 @@ class LopperProp():
 
         """
         if self.__dbg__ > 1:
-            lopper.log._debug( f"property '{self.name}' deepcopy start: {[self]}" )
-            lopper.log._debug( f"         value type: {type(self.value)} value len: {len(self.value)} value: {self.value}" )
+            lopper.log._debug( lambda: f"property '{self.name}' deepcopy start: {[self]}" )
+            lopper.log._debug( lambda: f"         value type: {type(self.value)} value len: {len(self.value)} value: {self.value}" )
 
         new_instance = LopperProp(self.name)
 
@@ -124,16 +300,16 @@ class LopperProp():
         # copying and undoing.
         #      new_instance.__dict__.update(self.__dict__)
         new_instance.__dbg__ = copy.deepcopy( self.number, memodict )
-        # we use __dict__ for the value assignemnt to avoid any object level
-        # wrapping of the assignement (i.e. making a list, etc)
-        new_instance.__dict__["value"] = copy.deepcopy( self.value, memodict )
+        # we use object.__setattr__ for the value assignemnt to avoid any object
+        # level wrapping of the assignement (i.e. making a list, etc)
+        object.__setattr__( new_instance, "value", copy.deepcopy( self.value, memodict ) )
 
         try:
-            new_instance.__dict__["struct_value"] = copy.deepcopy( self.struct_value, memodict )
+            new_instance.struct_value = copy.deepcopy( self.struct_value, memodict )
         except:
             pass
         try:
-            new_instance.__dict__["list_value"] = copy.deepcopy( self.list_value, memodict )
+            new_instance.list_value = copy.deepcopy( self.list_value, memodict )
         except:
             pass
 
@@ -145,7 +321,7 @@ class LopperProp():
         new_instance.binary = self.binary
 
         if self.__dbg__ > 1:
-            lopper.log._debug( f"property deep copy done: {[self]} ({type(new_instance.value)})({new_instance.value})" )
+            lopper.log._debug( lambda: f"property deep copy done: {[self]} ({type(new_instance.value)})({new_instance.value})" )
 
         return new_instance
 
@@ -292,13 +468,43 @@ class LopperProp():
 
         return ret_val
 
+    def cells(self):
+        """Get the property value as packed 32 bit cells
+
+        If the property has not been decoded yet (see LopperLazyValue) and
+        it is known to hold cells (address and phandle properties), the
+        cells are unpacked directly from the raw property, without
+        decoding it.
+
+        Args:
+           None
+
+        Returns:
+           LopperCells: the cells of the property. ValueError, OverflowError
+                        or TypeError if the value is not a list of 32 bit cells
+        """
+        try:
+            lazy_value = object.__getattribute__( self, "__lazy__" )
+        except AttributeError:
+            lazy_value = None
+
+        if lazy_value and ( self.name in address_properties or
+                            self.name in Lopper.phandle_possible_properties() ):
+            return lopper.base.lopper_base.cell_array( lazy_value.prop )
+
+        value = self.value
+        if type(value) != list:
+            value = [ value ]
+
+        return lopper.base.lopper_base.cell_array( value )
+
     def __setattr__(self, name, value):
         """magic method to check the setting of a LopperProp attribute
 
         If the attribute being set is "value" (i.e. LopperProp.value), this
-        method makes sure that it is stored as a list, that the property is
-        marked as modified (for future write backs) and triggers a resolve()
-        of the property value.
+        method makes sure that it is stored as a list, that the property (and
+        its node) is marked as modified (for future write backs) and triggers a
+        resolve() of the property value.
 
         Args:
            name: attribute name
@@ -309,25 +515,40 @@ class LopperProp():
         """
         # a little helper to make sure that we keep up our list-ness!
         if name == "value":
+            # we need the old value to check for modifications
+            self.decode()
             try:
-                old_value = self.__dict__[name]
-            except:
+                old_value = object.__getattribute__( self, name )
+            except AttributeError:
                 old_value = []
 
             if type(value) != list:
-                self.__dict__[name] = [ value ]
-            else:
-                self.__dict__[name] = value
+                value = [ value ]
+            object.__setattr__( self, name, value )
 
             try:
-                if Counter(old_value) != Counter(self.__dict__[name]):
+                if Counter(old_value) != Counter(value):
                     self.__modified__ = True
             except:
                 self.__modified__ = True
 
+            # the containing node needs a reload on the next tree sync
+            if self.node and old_value != value:
+                self.node.__modified__ = True
+                if self.name in address_properties and self.node.tree:
+                    self.node.tree.__addr_index__ = None
+                if self.name.startswith( "#" ) and self.node.tree:
+                    self.node.tree.__phandle_generation__ += 1
+                if self.name == "compatible" and self.node.tree:
+                    self.node.tree.compatible_index_remove( self.node, old_value )
+                    self.node.tree.compatible_index_add( self.node )
+                if self.node.tree:
+                    self.node.tree.reference_index_remove( self, old_value )
+                    self.node.tree.reference_index_add( self )
+
             self.resolve()
         else:
-            self.__dict__[name] = value
+            object.__setattr__( self, name, value )
 
     def compare( self, other_prop ):
         """Compare one property to another
@@ -359,7 +580,7 @@ class LopperProp():
            boolean: True there is a match, false otherwise
         """
         if self.__dbg__ > 1:
-            lopper.log._debug( f"property compare ({self}) vs ({other_prop})" )
+            lopper.log._debug( lambda: f"property compare ({self}) vs ({other_prop})" )
 
         ret_val = False
         invert_check  = ""
@@ -413,7 +634,7 @@ class LopperProp():
                     constructed_condition = "{0} {1} == {2}".format(invert_check,lop_compare_value,tgt_node_compare_value)
 
                 if self.__dbg__ > 2:
-                    lopper.log._debug( f"    single:single. Condition: {constructed_condition}" )
+                    lopper.log._debug( lambda: f"    single:single. Condition: {constructed_condition}" )
 
                 constructed_check = eval(constructed_condition)
                 if constructed_check:
@@ -438,7 +659,7 @@ class LopperProp():
                         constructed_condition = "{0} {1} == {2}".format(invert_check,lop_compare_value,tgt_node_compare_value)
 
                     if self.__dbg__ > 2:
-                        lopper.log._debug( f"    single:list. Condition: {constructed_condition}" )
+                        lopper.log._debug( lambda: f"    single:list. Condition: {constructed_condition}" )
 
                     constructed_check = eval(constructed_condition)
                     if constructed_check:
@@ -465,7 +686,7 @@ class LopperProp():
                         constructed_condition = "{0} {1} == {2}".format(invert_check,lop_compare_value,tgt_node_compare_value)
 
                     if self.__dbg__ > 2:
-                        lopper.log._debug( f"    list:single. Condition: {constructed_condition}" )
+                        lopper.log._debug( lambda: f"    list:single. Condition: {constructed_condition}" )
 
                     constructed_check = eval(constructed_condition)
                     if constructed_check:
@@ -480,7 +701,7 @@ class LopperProp():
                 # regex are not supported (since we'd have to index iterate and run
                 # different compares. So instead, we just compare the lists directly
                 if self.__dbg__ > 2:
-                    lopper.log._debug( f"    list:list. Condition: {lop_compare_value} == {tgt_node_compare_value}" )
+                    lopper.log._debug( lambda: f"    list:list. Condition: {lop_compare_value} == {tgt_node_compare_value}" )
 
                 if lop_compare_value == tgt_node_compare_value:
                     ret_val = True
@@ -488,7 +709,7 @@ class LopperProp():
                     ret_val = False
 
         if self.__dbg__ > 2:
-            lopper.log._debug( f"        prop compare: {ret_val}" )
+            lopper.log._debug( lambda: f"        prop compare: {ret_val}" )
 
         return ret_val
 
@@ -501,6 +722,10 @@ class LopperProp():
         Args:
             tag_invalid (bool): default True. Whether or not invalid phandles should be indicated with "invald"
 
+        The map is cached, and is only recalculated when the property
+        value changes, or the tree's phandles, labels, paths or #cells
+        properties change (see LopperTree __phandle_generation__).
+
         Returns:
             A list / map of values. Where 0 in the list means no phandle, and
             a LopperNode in the list means phandle. If there are no phandles, an empty list
@@ -513,7 +738,7 @@ class LopperProp():
             # This property can have phandles!
             property_description = phandle_props[self.name]
             # index 0 is always the description, other elements are flags, etc.
-            property_fields = property_description[0].split()
+            property_fields = phandle_fields( property_description[0] )
 
             # we need the values in hex. This could be a utility routine in the
             # future .. convert to hex.
@@ -523,6 +748,17 @@ class LopperProp():
             if self.pclass == "json":
                 return phandle_map
 
+            tree = self.node.tree if self.node else None
+            if tree:
+                map_key = ( tree.__phandle_generation__, id(tree), id(self.node), tag_invalid,
+                            property_description[0], tuple(self.value) )
+                try:
+                    cached_key, cached_map = self.__phandle_map__
+                    if cached_key == map_key:
+                        return cached_map
+                except (AttributeError, TypeError):
+                    pass
+
             ## not required, remove
             prop_val = []
             for f in self.value:
@@ -544,7 +780,7 @@ class LopperProp():
             # specify a variable size
             field_val = 0
             for idx,val in enumerate(prop_val):
-                phandle_desc = ""
+                phandle_kind = ""
                 if idx == phandle_idx:
                     field_val = 0
                     if latch_sub_list:
@@ -552,7 +788,7 @@ class LopperProp():
                         latch_sub_list = False
                         phandle_sub_list = []
 
-                    phandle_desc = property_fields[property_desc_idx]
+                    phandle_kind, phandle_cells, phandle_expr = property_fields[property_desc_idx]
                     property_desc_idx = property_desc_idx + 1
                     if property_desc_idx >= len( property_fields ):
                         latch_sub_list = True
@@ -560,9 +796,8 @@ class LopperProp():
                 else:
                     pass
 
-                if re.search( '^phandle', phandle_desc ):
-                    derefs = phandle_desc.split(':')
-                    if len(derefs) >= 2:
+                if phandle_kind == "phandle":
+                    if phandle_cells:
                         # We've been instructed to look up a property in the phandle.
                         # that tells us how many elements to jump before we look for
                         # the next phandle.
@@ -574,16 +809,15 @@ class LopperProp():
                             # step 2) look for the property in the deferneced node. If the
                             #         node wasn't found, we'll trigger an exception, and just
                             #         set a default value of 1.
-                            cell_count = node_deref[derefs[1]].value[0]
+                            cell_count = node_deref[phandle_cells].value[0]
                         except:
                             cell_count = 1
 
                         # step 3)
-                        # if the length is 3, that means there was an expression added
-                        # to the definition to adjust the value we found. We pull it out
-                        # and evaluate it to get the answer.
-                        if len(derefs) == 3:
-                            expression = str(cell_count) + derefs[2]
+                        # if there is an expression in the definition, it adjusts the
+                        # value we found. We evaluate it to get the answer.
+                        if phandle_expr:
+                            expression = str(cell_count) + phandle_expr
                             expression = eval( expression )
                             cell_count = expression
 
@@ -602,9 +836,9 @@ class LopperProp():
                             node_deref = "#invalid"
 
                     phandle_sub_list.append( node_deref )
-                elif re.search( '^#.*', phandle_desc ):
+                elif phandle_kind == "#":
                     try:
-                        field_val = self.node.__props__[phandle_desc].value[0]
+                        field_val = self.node.__props__[phandle_cells].value[0]
                     except Exception as e:
                         field_val = 0
 
@@ -626,6 +860,9 @@ class LopperProp():
             # append the last collected set of phandle or not indications
             phandle_map.append( phandle_sub_list )
 
+            if tree:
+                self.__phandle_map__ = ( map_key, phandle_map )
+
         return phandle_map
 
 
@@ -681,7 +918,7 @@ class LopperProp():
         """
         # we could do a read-and-set-if-different
 
-        lopper.log._debug( f"property sync: node: {[self.node]} [{self.node.number}], name: {self.name} value: {self.value}" )
+        lopper.log._debug( lambda: f"property sync: node: {[self.node]} [{self.node.number}], name: {self.name} value: {self.value}" )
 
         # TODO (possibly). This should just return the value as a dictionary entry,
         #                  which is actually sync'd by some controller caller OR
@@ -925,6 +1162,25 @@ class LopperProp():
         Returns:
            Nothing
         """
+        # properties are resolved many times (load, value changes, tree
+        # resolves, printing), so skip the work if nothing the result
+        # depends on has changed since the last resolve. The tree's phandle
+        # generation covers the labels, paths and #cells of other nodes.
+        tree = self.node.tree if self.node else None
+        if tree:
+            value = self.value
+            resolve_inputs = ( id(tree), self.node.abs_path, self.name, strict,
+                               self.binary, self.pclass == "json", self.phandle_resolution,
+                               tuple(value) if type(value) == list else value )
+            try:
+                cached_generation, cached_inputs = self.__resolved__
+                if cached_generation == tree.__phandle_generation__ and \
+                   cached_inputs == resolve_inputs and self.ptype:
+                    self.__pstate__ = "resolved"
+                    return
+            except (AttributeError, TypeError, ValueError):
+                pass
+
         outstring = "{0} = {1};".format( self.name, self.value )
 
         prop_val = self.value
@@ -952,7 +1208,7 @@ class LopperProp():
             else:
                 prop_type = type(prop_val)
 
-        lopper.log._debug( f"strict: {strict}s property [{prop_type}] resolve: {self.name} val: {self.value}" )
+        lopper.log._debug( lambda: f"strict: {strict}s property [{prop_type}] resolve: {self.name} val: {self.value}" )
 
         self.pclass = prop_type
 
@@ -1193,11 +1449,16 @@ class LopperProp():
         if not self.ptype:
             self.ptype = self.property_type_guess()
 
-            lopper.log._debug( f"guessing type for: {self.name}s [{self.ptype}]" )
+            lopper.log._debug( lambda: f"guessing type for: {self.name}s [{self.ptype}]" )
 
         self.string_val = outstring
         self.__pstate__ = "resolved"
 
+        if tree:
+            # labels may have been assigned above, so the generation is
+            # read after the resolve
+            self.__resolved__ = ( tree.__phandle_generation__, resolve_inputs )
+
 
 
 class LopperNode(object):
@@ -1231,7 +1492,15 @@ class LopperNode(object):
        - __nstate__: the state of the node ("init", "resolved" )
        - __modified__: flag indicating if the node has been modified
 
+    As with LopperProp, the attributes are stored in slots, and a __dict__
+    is only created if other attributes are assigned to a node.
+
     """
+    __slots__ = ( "number", "name", "parent", "tree", "depth", "child_nodes", "phandle",
+                  "label", "type", "abs_path", "_ref", "_source", "__props__",
+                  "__current_property__", "__props_pending_delete__", "__dbg__",
+                  "indent_char", "__nstate__", "__modified__", "__dict__" )
+
     def __init__(self, number = -1, abspath="", tree = None, phandle = -1, name = "", debug=0 ):
         self.number = number
         self.name = name
@@ -1283,7 +1552,7 @@ class LopperNode(object):
         be filled in.
         """
 
-        lopper.log._debug( f"node deepcopy start: {self.abs_path}" )
+        lopper.log._debug( lambda: f"node deepcopy start: {self.abs_path}" )
 
         new_instance = LopperNode()
 
@@ -1322,7 +1591,7 @@ class LopperNode(object):
             new_instance.child_nodes[c.abs_path].number = -1
             new_instance.child_nodes[c.abs_path].parent = new_instance
 
-        lopper.log._debug( f"deep copy done: {[self]}" )
+        lopper.log._debug( lambda: f"deep copy done: {[self]}" )
 
         return new_instance
 
@@ -1369,6 +1638,13 @@ class LopperNode(object):
             # we are updating ourself
             nn = copy.deepcopy( othernode )
             # copy everything
+            for a in LopperNode.__slots__:
+                if a == "__dict__":
+                    continue
+                try:
+                    object.__setattr__( self, a, object.__getattribute__( nn, a ) )
+                except AttributeError:
+                    pass
             self.__dict__.update(nn.__dict__)
 
             for p in self.__props__.values():
@@ -1387,7 +1663,12 @@ class LopperNode(object):
         chains the setting to any LopperProps of the node.
 
         If the attribute is any other, we set the value and tag the node as
-        modified, so it can be sync'd later.
+        modified, so it can be sync'd later. Bookkeeping attributes (iteration
+        state, refcounts, node numbers, etc) do not change the contents of the
+        node and do not tag it as modified.
+
+        When a node is tagged as modified, it is registered with its tree, so
+        that the next tree sync() only needs to reload the modified nodes.
 
         Args:
            name: attribute name
@@ -1397,13 +1678,28 @@ class LopperNode(object):
            Nothing
         """
         if name == "__dbg__":
-            self.__dict__[name] = value
+            object.__setattr__( self, name, value )
             for p in self.__props__.values():
                 p.__dbg__ = value
+        elif name == "__modified__":
+            object.__setattr__( self, name, value )
+            if value:
+                tree = getattr( self, "tree", None )
+                if tree:
+                    tree.__modified_nodes__[id(self)] = self
+        elif name in ( "__nstate__", "__current_property__", "_ref", "ref",
+                       "number", "depth", "indent_char", "tree" ):
+            super().__setattr__(name, value)
         else:
             # we do it this way, otherwise the property "ref" breaks
             super().__setattr__(name, value)
 
+            if name == "name":
+                # the unit address may have changed
+                tree = getattr( self, "tree", None )
+                if tree:
+                    tree.__addr_index__ = None
+
             if name == "phandle":
                 # someone is assigning a phandle, the tree's pnodes need to
                 # be updated
@@ -1420,19 +1716,37 @@ class LopperNode(object):
                         #
                         self.tree.__pnodes__[value] = self
 
-            # we could restrict this to only some attributes in the future
-            self.__dict__["__modified__"] = True
+            if name in ( "name", "abs_path", "phandle", "label" ):
+                # property phandle maps may reference this node
+                tree = getattr( self, "tree", None )
+                if tree:
+                    tree.__phandle_generation__ += 1
 
+            self.__modified__ = True
 
 
-    def __getattribute__(self, name):
+
+    def __setstate__(self, state):
+        """magic method to restore a pickled (i.e. snapshot) node
+
+        Defined so that restoring a node doesn't go through __setattr__,
+        which tracks modifications in the (not yet restored) tree.
+
+        Args:
+           state: the attributes of the node, (dict, slots) tuple
+
+        Returns:
+           Nothing
+        """
+        lopper_setstate( self, state )
+
+    def __getattr__(self, name):
         """magic method around object attribute access
 
-        This method first attempts to access the objects inherent attributes and
-        returns the value if one exists matching the passed name.
+        Only called when the objects inherent attributes do not contain
+        the passed name.
 
-        If one is not found, then the properties dictionary is checked, and that
-        value returned.
+        The properties dictionary is checked, and that value returned.
 
         This allows access like:
 
@@ -1450,12 +1764,9 @@ class LopperNode(object):
            The attribute value, or AttributeError if it doesn't exist.
         """
         try:
-            return object.__getattribute__(self, name)
+            return object.__getattribute__( self, "__props__" )[name].value
         except:
-            try:
-                return self.__props__[name].value
-            except:
-                raise AttributeError(name)
+            raise AttributeError(name)
 
 
     def __int__(self):
@@ -1669,6 +1980,11 @@ class LopperNode(object):
         Returns:
            Nothing
         """
+        if key == "compatible" and self.tree:
+            self.tree.compatible_index_remove( self, self.propval( key ) )
+        if key in self.__props__ and self.tree:
+            self.tree.reference_index_remove( self.__props__[key] )
+
         if isinstance(val, LopperProp ):
             # we can try to assign
             self.__props__[key] = val
@@ -1681,6 +1997,14 @@ class LopperNode(object):
             # thing to assign.
             # raise TypeError( "LopperProp was not passed as value" )
 
+        self.__modified__ = True
+        if key in address_properties and self.tree:
+            self.tree.__addr_index__ = None
+        if key == "compatible" and self.tree:
+            self.tree.compatible_index_add( self )
+        if self.tree:
+            self.tree.reference_index_add( self.__props__[key] )
+
     @property
     def ref(self):
         """Node reference count getter
@@ -1825,20 +2149,95 @@ class LopperNode(object):
            A list of child LopperNodes
 
         """
+        if max_depth == None and self.tree:
+            all_kids = self.tree.preorder_subnodes( self )
+            if all_kids is not None:
+                if children_only:
+                    return all_kids[1:]
+                return all_kids
+
         if children_only:
             all_kids = []
         else:
             all_kids = [ self ]
 
-
         if depth and max_depth == depth:
             return all_kids
 
-        for child_node in self.child_nodes.values():
-            all_kids = all_kids + child_node.subnodes( depth + 1, max_depth  )
+        # depth first walk, the nodes are visited in the order of the
+        # child dictionaries
+        walk = [ (c, depth + 1) for c in reversed( self.child_nodes.values() ) ]
+        while walk:
+            n, n_depth = walk.pop()
+            all_kids.append( n )
+            if max_depth == n_depth:
+                continue
+            walk.extend( (c, n_depth + 1) for c in reversed( n.child_nodes.values() ) )
 
         return all_kids
 
+    def walk( self, max_depth=None, path_regex=None, compatible=None,
+              predicate=None, prune=None, children_only=False ):
+        """Lazily walk this node and its subnodes
+
+        A generator that walks the subnodes of the current node depth first
+        (in the same order as subnodes()), and yields the nodes that pass the
+        filters. The filters are applied during the walk, so a caller that
+        has found what it is looking for can stop the walk early, and pruned
+        subtrees are never visited.
+
+        Args:
+           max_depth (int,optional): depth (relative to this node) to stop the
+                                     walk at. Nodes at the depth are yielded,
+                                     but their subnodes are not walked.
+           path_regex (string or Pattern,optional): only yield nodes whose
+                                                    path matches the regex
+           compatible (string or list,optional): only yield nodes that have
+                                                 (one of) the compatible
+                                                 string(s)
+           predicate (function,optional): only yield nodes for which
+                                          predicate( node ) is True
+           prune (function,optional): do not walk the subnodes of nodes for
+                                      which prune( node ) is True
+           children_only (bool,optional): do not yield this node
+
+        Returns:
+           generator: the matching LopperNodes
+        """
+        if type(path_regex) == str:
+            path_regex = regex_compile( path_regex )
+        if type(compatible) == str:
+            compatible = [ compatible ]
+
+        walk = [ (self, 0) ]
+        while walk:
+            n, n_depth = walk.pop()
+
+            if n_depth or not children_only:
+                match = True
+                if path_regex and not path_regex.search( n.abs_path ):
+                    match = False
+                if match and compatible:
+                    try:
+                        compat_values = n.__props__["compatible"].value
+                    except:
+                        compat_values = []
+                    if type(compat_values) != list:
+                        compat_values = [ compat_values ]
+                    match = any( c in compat_values for c in compatible )
+                if match and predicate and not predicate( n ):
+                    match = False
+
+                if match:
+                    yield n
+
+            if max_depth != None and n_depth >= max_depth:
+                continue
+            if prune and prune( n ):
+                continue
+
+            walk.extend( (c, n_depth + 1) for c in reversed( n.child_nodes.values() ) )
+
     def is_child( self, potential_child_node ):
         """test if a node is a child
 
@@ -2019,17 +2418,19 @@ class LopperNode(object):
 
             last_chunk_of_path = os.path.basename( self.abs_path )
             if last_chunk_of_path != self.name:
-                lopper.log._debug( f"node export: name change detected, adjusting path" )
+                lopper.log._debug( "node export: name change detected, adjusting path" )
                 self.abs_path = os.path.dirname( self.abs_path ) + "/" + self.name
 
             if self.parent:
                 parent_chunk_of_path = os.path.dirname( self.abs_path )
                 if parent_chunk_of_path != self.parent.abs_path:
-                    lopper.log._debug( f"node export: path component change detected, adjusting path" )
+                    lopper.log._debug( "node export: path component change detected, adjusting path" )
                     self.abs_path = self.parent.abs_path + "/" + self.name
 
-            self.abs_path = self.abs_path.replace( "//", "/" )
-            lopper.log._debug( f"node export: start: [{self.number}][{self.abs_path}]" )
+            # only assign a changed path, assignments tag the node as modified
+            if "//" in self.abs_path:
+                self.abs_path = self.abs_path.replace( "//", "/" )
+            lopper.log._debug( lambda: f"node export: start: [{self.number}][{self.abs_path}]" )
 
             dct['__path__'] = self.abs_path
             dct['__nodesrc__'] = self._source
@@ -2044,7 +2445,7 @@ class LopperNode(object):
 
                 dct['__{}_pclass__'.format(p.name)] = p.pclass
 
-                lopper.log._debug( f"       node export: [{p.ptype}] property: {p.name} (state:{p.__pstate__})(type:{dct['__{}_type__'.format(p.name)]})" )
+                lopper.log._debug( lambda: f"       node export: [{p.ptype}] property: {p.name} (state:{p.__pstate__})(type:{dct['__{}_type__'.format(p.name)]})" )
 
             if self.label:
                 # there can only be one label per-node. The node may already have
@@ -2110,7 +2511,7 @@ class LopperNode(object):
         if self.__nstate__ != "resolved":
             lopper.log._warning( f"node sync: unresolved node, not syncing" )
         else:
-            lopper.log._debug( f"node sync start: [{self.number}][{self.abs_path}]" )
+            lopper.log._debug( lambda: f"node sync start: [{self.number}][{self.abs_path}]" )
 
             self.__modified__ = False
 
@@ -2134,7 +2535,7 @@ class LopperNode(object):
 
         """
         if isinstance( prop, LopperProp ) or type(prop) == str:
-            lopper.log._debug( f"deleting property {prop} from node {self}" )
+            lopper.log._debug( lambda: f"deleting property {prop} from node {self}" )
 
             prop_to_delete = prop
             if type(prop) == str:
@@ -2147,6 +2548,14 @@ class LopperNode(object):
                 lopper.log._warning( f"invalid property passed to delete: {prop}" )
 
             self.__modified__ = True
+            if prop_to_delete.name in address_properties and self.tree:
+                self.tree.__addr_index__ = None
+            if prop_to_delete.name.startswith( "#" ) and self.tree:
+                self.tree.__phandle_generation__ += 1
+            if prop_to_delete.name == "compatible" and self.tree:
+                self.tree.compatible_index_remove( self, prop_to_delete.value )
+            if self.tree:
+                self.tree.reference_index_remove( prop_to_delete )
             try:
                 prop_to_delete.__pstate__ = "deleted"
                 self.__props_pending_delete__[prop_to_delete.name] = prop_to_delete
@@ -2157,8 +2566,11 @@ class LopperNode(object):
             try:
                 del self.child_nodes[prop.abs_path]
                 self.__modified__ = True
+                if self.tree:
+                    self.tree.__topology_modified__ = True
+                    self.tree.__preorder__ = None
             except:
-                lopper.log._debug( f"node {prop.abs_path} not found, and could not be deleted" )
+                lopper.log._debug( lambda: f"node {prop.abs_path} not found, and could not be deleted" )
 
     def props( self, name ):
         """Access a property or list of properties described by a name/regex
@@ -2309,13 +2721,21 @@ class LopperNode(object):
 
         """
         if isinstance( prop, LopperProp ):
-            lopper.log._debug( f"node {self.abs_path} adding property: {prop.name}" )
+            lopper.log._debug( lambda: f"node {self.abs_path} adding property: {prop.name}" )
 
             self.__props__[prop.name] = prop
             prop.node = self
 
             # indicates that we should be sync'd
             self.__modified__ = True
+            if prop.name in address_properties and self.tree:
+                self.tree.__addr_index__ = None
+            if prop.name.startswith( "#" ) and self.tree:
+                self.tree.__phandle_generation__ += 1
+            if prop.name == "compatible" and self.tree:
+                self.tree.compatible_index_add( self )
+            if self.tree:
+                self.tree.reference_index_add( prop )
         elif isinstance( prop, LopperNode):
             node = prop
             # this isn't ideal. We don't have a path, but are getting
@@ -2329,12 +2749,14 @@ class LopperNode(object):
             node.tree = self.tree
 
             self.child_nodes[node.abs_path] = node
+            if self.tree:
+                self.tree.__preorder__ = None
 
             # this gets the node fully into the tree's tracking dictionaries
             if self.tree:
                 self.tree.add( node )
 
-            lopper.log._debug( f"node {self.abs_path} added Node: {node.name}" )
+            lopper.log._debug( lambda: f"node {self.abs_path} added Node: {node.name}" )
 
         return self
 
@@ -2403,8 +2825,6 @@ class LopperNode(object):
         # resolve the rest of the references based on the passed device tree
         # self.number must be set before calling this routine.
 
-        self.dct = dct
-
         #
         # tree add currently takes care of this, but it might be better if
         # done here, since that way it is properly recursive and self contained.
@@ -2424,17 +2844,16 @@ class LopperNode(object):
         if dct:
             strict = self.tree.strict
 
-            # we may not need to save this, temp.
-            self.dct = dct
-
             self.abs_path = dct['__path__']
 
             if clear_children:
                 # children will find their way back during the load process, so clear
                 # the existing ones
                 self.child_nodes = OrderedDict()
+                if self.tree:
+                    self.tree.__preorder__ = None
 
-            lopper.log._debug( f"node load start [{self}][{self.number}]: {self.abs_path}" )
+            lopper.log._debug( lambda: f"node load start [{self}][{self.number}]: {self.abs_path}" )
 
             saved_props = self.__props__
             self.__props__ = OrderedDict()
@@ -2465,6 +2884,7 @@ class LopperNode(object):
                             pass
 
                         self.parent.child_nodes[self.abs_path] = self
+                        self.tree.__preorder__ = None
 
                 depth = len(re.findall( '/', self.abs_path ))
             else:
@@ -2491,7 +2911,19 @@ class LopperNode(object):
                 except Exception as e:
                     pass
 
-                lopper.log._debug( f"node [{self}] load: [{dtype}] prop: {prop} val: {prop_val}" )
+                lopper.log._debug( lambda: f"node [{self}] load: [{dtype}] prop: {prop} val: {prop_val}" )
+
+                lazy_val = None
+                if isinstance( prop_val, lopper.base.LopperLazyValue ):
+                    # properties that are used during the load, or that can
+                    # label other nodes when resolved (phandles) are decoded
+                    # now. Everything else is decoded on first use.
+                    if prop == "compatible" or prop.startswith( "lopper-" ) or \
+                       prop in Lopper.phandle_possible_properties() or \
+                       (update_props and prop in saved_props):
+                        prop_val, dtype = prop_val.decode()
+                    else:
+                        lazy_val = prop_val
 
                 try:
                     # see if we got a property class as part of the input dictionary
@@ -2528,10 +2960,26 @@ class LopperNode(object):
                     self.__props__[prop] = existing_prop
                     if update_props:
                         if self.__props__[prop].value != prop_val:
-                            lopper.log._debug( f"existing prop detected ({self.__props__[prop].name}), updating value: {self.__props__[prop].value} -> {prop_val}" )
+                            lopper.log._debug( lambda: f"existing prop detected ({self.__props__[prop].name}), updating value: {self.__props__[prop].value} -> {prop_val}" )
                             self.__props__[prop].value = prop_val
 
+                elif lazy_val:
+                    if prop in address_properties and self.tree:
+                        self.tree.__addr_index__ = None
+
+                    # type, class and the resolve are done on decode
+                    self.__props__[prop] = LopperProp( prop, -1, self,
+                                                       lazy_val, self.__dbg__ )
+                    self.__props__[prop].__lazy_strict__ = strict
+                    self.__props__[prop].__modified__ = False
+
+                    if node_source:
+                        self._source = node_source
+
                 else:
+                    if prop in address_properties and self.tree:
+                        self.tree.__addr_index__ = None
+
                     self.__props__[prop] = LopperProp( prop, -1, self,
                                                        prop_val, self.__dbg__ )
                     if dtype == LopperFmt.UINT8:
@@ -2571,10 +3019,20 @@ class LopperNode(object):
             if not self.type:
                 self.type = [ "" ]
 
+            if self.tree:
+                self.tree.compatible_index_add( self )
+                for p in self.__props__.values():
+                    self.tree.reference_index_add( p )
+                # properties that were dropped by the load no longer reference
+                # anything
+                for p in saved_props.values():
+                    if self.__props__.get( p.name ) is not p:
+                        self.tree.reference_index_remove( p )
+
             self.__nstate__ = "resolved"
             self.__modified__ = False
 
-        lopper.log._debug( f"node resolution end: {self}" )
+        lopper.log._debug( lambda: f"node resolution end: {self}" )
 
     def resolve( self, fdt = None ):
         """resolve (calculate) node details against a FDT
@@ -2610,7 +3068,7 @@ class LopperNode(object):
         """
         # resolve the rest of the references based on the passed device tree
         # self.number must be set before calling this routine.
-        lopper.log._debug( f"node resolution start [{self}][{self.number}]: {self.abs_path}" )
+        lopper.log._debug( lambda: f"node resolution start [{self}][{self.number}]: {self.abs_path}" )
 
         ## This may be converted to a dictionary export -> call to lopper fdt
         ## to do a partial sync. But for now, it is just changing the state as
@@ -2624,12 +3082,12 @@ class LopperNode(object):
         else:
             self.depth = len(re.findall( '/', self.abs_path ))
 
-        lopper.log._debug( f"node resolve: calculating depth {self.abs_path} for: {self.depth}" )
+        lopper.log._debug( lambda: f"node resolve: calculating depth {self.abs_path} for: {self.depth}" )
 
         self.__nstate__ = "resolved"
         self.__modified__ = False
 
-        lopper.log._debug( f"node resolution end: {self}" )
+        lopper.log._debug( lambda: f"node resolution end: {self}" )
 
     def address(self, child_addr=None, nest_count=1):
         """Get the translated Address of the node.
@@ -2637,6 +3095,11 @@ class LopperNode(object):
         Returns the unit address of the node as translated by the ranges
         of the device tree.
 
+        Translated addresses (and the decoded ranges used to translate them)
+        are cached in the node's tree, until a property that impacts memory
+        mapping is changed, a node is renamed, or nodes are added or removed
+        (see LopperTree.addr_index()).
+
         Args:
            child_addr (int): current translated address
            nest_count (int,optional): recursion count
@@ -2645,14 +3108,41 @@ class LopperNode(object):
             translated node address (int): translated address, or None
             if no translation is possible
         """
+        cache = None
+        if self.tree:
+            cache = self.tree.__addr_cache__
+            try:
+                return cache[(id(self), child_addr)]
+            except KeyError:
+                pass
+
+        translated_address = self.address_translate( child_addr, nest_count, cache )
 
-        lopper.log._debug( f"{chr(0x20)*nest_count}address translation for: {self.abs_path} ({self.name})" )
+        # failed translations are not cached, so they are reported each time
+        if cache is not None and translated_address != None:
+            cache[(id(self), child_addr)] = translated_address
+
+        return translated_address
+
+    def address_translate(self, child_addr, nest_count, cache ):
+        """Translate the address of a node (see address())
+
+        Args:
+           child_addr (int): current translated address
+           nest_count (int): recursion count
+           cache (dict): the tree's address cache, or None
+
+        Returns:
+            translated node address (int): translated address, or None
+            if no translation is possible
+        """
+        lopper.log._debug( lambda: f"{chr(0x20)*nest_count}address translation for: {self.abs_path} ({self.name})" )
 
         unit_address = child_addr
         if not child_addr:
             try:
                 unit_address = int(self.name.split('@')[1],16)
-                lopper.log._debug( f"{chr(0x20)*nest_count}unit address: {hex(unit_address)}" )
+                lopper.log._debug( lambda: f"{chr(0x20)*nest_count}unit address: {hex(unit_address)}" )
             except Exception as e:
                 lopper.log._warning( f"node {self.name} has no unit address: {unit_address}" )
                 # No @ or it isn't a hex, so we have nothing to translate
@@ -2665,18 +3155,18 @@ class LopperNode(object):
         if self.parent:
             pranges = self.parent.props("ranges")
             if not pranges:
-                lopper.log._debug( f"{chr(0x20)*nest_count}no parent ranges, "
+                lopper.log._debug( lambda: f"{chr(0x20)*nest_count}no parent ranges, "
                                    f"returning address: {hex(unit_address)}" )
                 return unit_address
 
-            lopper.log._debug( f"{chr(0x20)*nest_count}parent ranges: {pranges[0]}" )
+            lopper.log._debug( lambda: f"{chr(0x20)*nest_count}parent ranges: {pranges[0]}" )
 
             pranges_values = pranges[0].value
 
             # if the node had just "ranges;", we continue up to the parent
             # since this means the child and parent are 1:1 mapping
             if len(pranges[0]) == 1:
-                lopper.log._debug( f"{chr(0x20)*nest_count}'ranges;' found, "
+                lopper.log._debug( lambda: f"{chr(0x20)*nest_count}'ranges;' found, "
                                    f"recursing to parent: {self.parent.abs_path}" )
                 return self.parent.address( unit_address, nest_count + 4 )
         else:
@@ -2697,7 +3187,7 @@ class LopperNode(object):
         if not size_cells:
             size_cells = 1
 
-        lopper.log._debug( f"{chr(0x20)*nest_count}address cells in: {self.abs_path} and {self.parent.abs_path}"
+        lopper.log._debug( lambda: f"{chr(0x20)*nest_count}address cells in: {self.abs_path} and {self.parent.abs_path}"
                            f"       {chr(0x20)*nest_count}child address cells: {address_cells}"
                            f"       {chr(0x20)*nest_count}parent address cells: {parent_address_cells}"
                            f"       {chr(0x20)*nest_count}child size cells: {size_cells}" )
@@ -2712,30 +3202,31 @@ class LopperNode(object):
         # The size of each field is determined by taking the child's #address-cells value,
         # the parent's #address-cells value, and the child's #size-cells value
 
-        item_size = int(size_cells) + int(address_cells) + int(parent_address_cells)
-        address_chunks = chunks(pranges_values,item_size)
-
-        for address_entry in address_chunks:
-            lopper.log._debug( f"{chr(0x20)*nest_count}address entry: {address_entry}" )
-
-            child_address = address_entry[0:address_cells]
-            child_address = lopper.base.lopper_base.encode_byte_array( child_address )
-            child_address = int.from_bytes(child_address,"big")
+        ranges_key = ( "ranges", id(self.parent), address_cells, parent_address_cells, size_cells )
+        try:
+            address_entries = cache[ranges_key]
+        except (KeyError, TypeError):
+            try:
+                ranges_cells = pranges[0].cells()
+            except (ValueError, OverflowError, TypeError):
+                ranges_cells = pranges_values
 
-            parent_address = address_entry[address_cells:address_cells + parent_address_cells]
-            parent_address = lopper.base.lopper_base.encode_byte_array( parent_address )
-            parent_address = int.from_bytes(parent_address,"big")
+            address_entries = lopper.base.lopper_base.cell_fields( ranges_cells,
+                                                                   [ int(address_cells),
+                                                                     int(parent_address_cells),
+                                                                     int(size_cells) ] )
+            if cache is not None:
+                cache[ranges_key] = address_entries
 
-            region_size = address_entry[-size_cells:]
-            region_size = lopper.base.lopper_base.encode_byte_array( region_size )
-            region_size = int.from_bytes(region_size,"big")
+        for child_address, parent_address, region_size in address_entries:
+            lopper.log._debug( lambda: f"{chr(0x20)*nest_count}address entry: {child_address} {parent_address} {region_size}" )
 
-            lopper.log._debug( f"       {chr(0x20)*nest_count}child address: {child_address}"
+            lopper.log._debug( lambda: f"       {chr(0x20)*nest_count}child address: {child_address}"
                                f"       {chr(0x20)*nest_count}parent_address: {hex(parent_address)}"
                                f"       {chr(0x20)*nest_count}region_size: {hex(region_size)}" )
 
             if child_address <= unit_address <= child_address + region_size:
-                lopper.log._debug( f"{chr(0x20)*nest_count}unit address {unit_address} is "
+                lopper.log._debug( lambda: f"{chr(0x20)*nest_count}unit address {unit_address} is "
                                    "within a translation range, recursively translating" )
                 return self.parent.address( parent_address + unit_address - child_address, nest_count + 4 )
 
@@ -2780,12 +3271,29 @@ class LopperTree:
        - __nodes__: The nodes of the tree, ordered by absolute path indexing
        - __nnodes__: The nodes of the tree, ordered by node number
        - __pnodes__: The nodes of the tree, ordered by phandle
+       - __cnodes__: The nodes of the tree, indexed by compatible string
+       - __addr_index__: The nodes of the tree, indexed by translated address
+       - __addr_cache__: Translated node addresses, valid as long as __addr_index__
+       - __path_trie__: The node paths of the tree, indexed by path component
+       - __preorder__: The nodes of the tree, in pre-order (see preorder()). Valid
+                       as long as __path_trie__
+       - __phandle_generation__: bumped when phandles, labels, paths or #cells
+                                 properties change (validates cached phandle maps)
+       - __deref_table__: cached results of deref(), valid for one phandle generation
+       - __rnodes__: The properties of the tree, indexed by the phandles they may
+                     reference (see referrers())
+       - __exec_cache__: prepared code block namespaces, indexed by code block,
+                         least recently used first (see exec_cmd())
        - __dbg__: treewide debug level
        - __must_sync__: flag, true when the tree must be syncd to the FDT
+       - __modified_nodes__: nodes that have been modified since they were loaded
+       - __topology_modified__: flag, true when nodes were added or deleted since
+                                the last sync
        - __current_node__: The current node in an iteration
        - __start_node__: The starting node for an iteration
        - __new_iteration__: Flag set to start a new iteration
-       - __node_iter__: The current iterator
+       - __node_iter__: The current iterator (of next())
+       - __iterations__: The number of active (nested) iterations
        - start_tree_cb, start_node_cb, end_node_cb, property_cb, end_tree_cb: callbacks
        - depth_first: not currently implemented
        - strict: Flag indicating if strict property resolution should be enforced
@@ -2806,6 +3314,32 @@ class LopperTree:
         self.__aliases__ = OrderedDict()
         # nodes. selected. default/fallback for some operations
         self.__selected__ = []
+        # nodes, indexed by compatible string
+        self.__cnodes__ = OrderedDict()
+        # nodes, indexed by translated address. Built on demand by
+        # addr_index() and invalidated when addresses may have changed
+        self.__addr_index__ = None
+        # translated node addresses (see LopperNode.address()). Cleared
+        # whenever the address index is invalidated
+        self.__addr_cache__ = {}
+        # node paths, indexed by path component. Built on demand by
+        # path_trie() and invalidated when nodes are added or removed
+        self.__path_trie__ = None
+        # nodes, in pre-order. Built on demand by preorder() and invalidated
+        # with the path trie
+        self.__preorder__ = None
+        # bumped when phandles, labels, paths or #cells properties change.
+        # Used to validate cached property phandle maps
+        self.__phandle_generation__ = 0
+        # phandle and label dereferences, (generation, { reference: node })
+        # see deref()
+        self.__deref_table__ = ( -1, {} )
+        # properties, indexed by the phandles (and labels/paths) they may
+        # reference. Built on demand by reference_index()
+        self.__rnodes__ = None
+        # compiled code blocks and their namespaces, indexed by the code
+        # block, modules and environment. see exec_cmd()
+        self.__exec_cache__ = OrderedDict()
 
         # memreserve section
         self.__memreserve__ = []
@@ -2822,10 +3356,17 @@ class LopperTree:
         # state
         self.__dbg__ = 0
         self.__must_sync__ = False
+        # nodes tagged as modified since they were last loaded, indexed
+        # by object id. These are reloaded by sync()
+        self.__modified_nodes__ = OrderedDict()
+        # flag, true when nodes have been added or removed since the last
+        # sync, and the index dictionaries need to be rebuilt in tree order
+        self.__topology_modified__ = False
         self.__current_node__ = "/"
         self.__start_node__ = "/"
         self.__new_iteration__ = True
         self.__node_iter__ = None
+        self.__iterations__ = 0
 
         self.dct = None
 
@@ -2846,16 +3387,41 @@ class LopperTree:
     def __iter__(self):
         """magic method to support iteration
 
-        For iterating the nodes of a LopperTree, we are the iterator.
-        This is required by the iterator protocol.
+        Each iteration of the nodes of a LopperTree gets its own iterator
+        over the pre-order node array (see preorder()), so iterations can be
+        nested. The nodes of the iteration are selected by the __current_node__
+        and __start_node__ attributes, see iteration_nodes().
+
+        When the outermost iteration completes, the tree is reset().
 
         Args:
             None
 
         Returns:
-           LopperTree object: self
+           generator: the LopperNodes of the iteration
         """
-        return self
+        return self.__iterate()
+
+    def __iterate(self):
+        """generator of the nodes of an iteration (see __iter__)
+
+        Args:
+            None
+
+        Returns:
+           generator: the LopperNodes of the iteration
+        """
+        nodes = self.iteration_nodes()
+
+        self.__iterations__ += 1
+        try:
+            yield from nodes
+        finally:
+            self.__iterations__ -= 1
+
+        # only reached when the iteration completes
+        if not self.__iterations__:
+            self.reset()
 
     def __next__(self):
         """magic method for iteration on a tree
@@ -2920,9 +3486,33 @@ class LopperTree:
             self.__dict__[name] = value
             for n in self.__nodes__.values():
                 n.__dbg__ = value
+        elif name == "__addr_index__":
+            self.__dict__[name] = value
+            # the cached translations are invalidated with the index
+            if value == None:
+                self.__dict__["__addr_cache__"] = {}
+        elif name == "__path_trie__":
+            self.__dict__[name] = value
+            # the node order may have changed with the paths
+            if value == None:
+                self.__dict__["__preorder__"] = None
         else:
             self.__dict__[name] = value
 
+    def __setstate__(self, state):
+        """magic method to restore a pickled (i.e. snapshot) tree
+
+        Defined so that restoring a tree doesn't look it up through
+        __getattribute__, which falls back to the (not yet restored) nodes.
+
+        Args:
+           state: the attributes of the tree
+
+        Returns:
+           Nothing
+        """
+        self.__dict__.update( state )
+
     # tree
     def __getattribute__(self, name):
         """magic method around object attribute access
@@ -3015,7 +3605,9 @@ class LopperTree:
                 # avoid looking for "^/$" accross all nodes. It's a common
                 # search and can't match anything but the root node
                 regex = "^" + key + "$"
-                if not regex == "^/$":
+                # a key with no regex characters can only match itself,
+                # which we already know isn't there.
+                if not regex == "^/$" and regex_special_chars.intersection( key ):
                     m = self.nodes( regex )
                     if m:
                         # we get the first match, if you want multiple matches
@@ -3048,6 +3640,8 @@ class LopperTree:
         """
 
         if isinstance(val, LopperNode ):
+            self.__path_trie__ = None
+            self.__phandle_generation__ += 1
             # we can try to assign
             if type(key) == int:
                 self.__nnodes__[key] = val
@@ -3227,7 +3821,7 @@ class LopperTree:
         Returns:
              dictionary
         """
-        lopper.log._debug( f"tree export start: {start_path}" )
+        lopper.log._debug( lambda: f"tree export start: {start_path}" )
 
         try:
             # tree export to a nested dictionary!
@@ -3253,7 +3847,7 @@ class LopperTree:
 
         if start_path == "/":
             if self.__memreserve__:
-                lopper.log._debug( f"tree export: memreserve for tree: {self}" )
+                lopper.log._debug( lambda: f"tree export: memreserve for tree: {self}" )
                 dct["/memreserve"] = { '__fdt_number__' : -1,
                                        '__fdt_name__' : "memreserve",
                                        '__fdt_phandle__' : -1,
@@ -3291,6 +3885,11 @@ class LopperTree:
         Iterates all the nodes in a tree, and then the properties, making
         sure that everyting is fully resolved.
 
+        This is a single pass over the nodes, it does not use (or disturb)
+        the tree iterator. Phandle and label references are dereferenced
+        once per pass (see deref()), and properties that have not changed
+        since they were last resolved are skipped.
+
         Args:
            None
 
@@ -3298,9 +3897,9 @@ class LopperTree:
            Nothing
         """
         # walk each node, and individually resolve
-        for n in self:
+        for n in self.subnodes( self.__nodes__["/"] ):
             n.resolve()
-            for p in n:
+            for p in list( n.__props__.values() ):
                 p.resolve()
 
     def sync( self, fdt = None, only_if_required = False ):
@@ -3309,6 +3908,11 @@ class LopperTree:
         This routine walks the FDT, and sync's changes from any LopperTree nodes
         into the backing store.
 
+        Only the nodes that have been modified since they were last loaded
+        (and their subnodes) are exported and re-loaded. If nodes were added
+        or removed, the tree dictionaries are rebuilt to reflect the new
+        tree order. When nothing has been modified, a sync does no work.
+
         Once complete, all nodes are resolved() to ensure their attributes reflect
         the FDT status.
 
@@ -3325,24 +3929,119 @@ class LopperTree:
 
         if only_if_required:
             if not self.__must_sync__:
-                lopper.log._debug( f"not syncing, since __must_sync__ is not set" )
+                lopper.log._debug( "not syncing, since __must_sync__ is not set" )
                 return
 
 
-        lopper.log._debug( f"[{fdt}]: tree sync start: {self}" )
+        lopper.log._debug( lambda: f"[{fdt}]: tree sync start: {self}" )
 
         #
-        # This triggers the "load" operation on the entire tree. That block
-        # of code is responsible for fixing up paths, looking for renames,
-        # etc.
+        # This triggers the "load" operation on the modified parts of the
+        # tree. That block of code is responsible for fixing up paths, looking
+        # for renames, etc.
         #
         # Note: this no longer writes to the FDT, that should be done by the
         #       Lopper.sync() call.
         #
-        new_dct = self.export()
-        self.load( new_dct )
+        modified_nodes = self.__modified_nodes__
+        self.__modified_nodes__ = OrderedDict()
+
+        full_load = False
+        sync_roots = []
+        for n in modified_nodes.values():
+            if n.tree is not self or n.__nstate__ in [ "deleted", "*invalid*" ]:
+                continue
 
-        lopper.log._debug( f"[{fdt}]: tree sync end: {self}" )
+            try:
+                indexed = self.__nodes__[n.abs_path] is n
+            except:
+                indexed = False
+
+            if n.__nstate__ != "resolved" or not indexed or n.abs_path == "/":
+                # we can't reload this node on its own, reload everything
+                full_load = True
+                break
+
+            # only the topmost modified nodes are reloaded, since their
+            # subnodes are reloaded with them
+            topmost = True
+            p = n.parent
+            while p:
+                if id(p) in modified_nodes and p.tree is self:
+                    topmost = False
+                    break
+                p = p.parent
+
+            if topmost:
+                sync_roots.append( n )
+
+        if full_load:
+            lopper.log._debug( "tree sync: full load" )
+            new_dct = self.export()
+            self.load( new_dct )
+        else:
+            reindex = self.__topology_modified__
+            reload_aliases = False
+            for n in sync_roots:
+                lopper.log._debug( lambda: f"tree sync: reloading subtree: {n.abs_path}" )
+
+                old_nodes = n.subnodes()
+                old_keys = [ (o.abs_path, o.phandle, o.label) for o in old_nodes ]
+                nodes_saved = dict( zip( [ k[0] for k in old_keys ], old_nodes ) )
+
+                parent = n.parent
+                if parent:
+                    siblings = list(parent.child_nodes.values())
+
+                # a full load resolves each node against the nodes loaded
+                # before it, so the subtree is loaded against the same view:
+                # the nodes that follow it (in tree order) are hidden from
+                # phandle, label and path lookups until it is loaded.
+                new_dct = self.export( n.abs_path )
+
+                tree_order = self.__nodes__["/"].subnodes()
+                start = next( i for i, o in enumerate( tree_order ) if o is n )
+                nodes_before = tree_order[:start]
+                nodes_after = tree_order[start + len(old_nodes):]
+                self.index_nodes( nodes_before )
+
+                loaded_nodes = self.load_nodes( self.unroll( new_dct ), nodes_saved,
+                                                parent.abs_path if parent else None )
+
+                self.index_nodes( nodes_before + loaded_nodes + nodes_after )
+
+                # node load moves the node to the end of the parent's children,
+                # put it back in its original position. This is done in place,
+                # assigning child_nodes would tag the parent as modified.
+                if parent and loaded_nodes:
+                    parent.child_nodes.clear()
+                    for s in siblings:
+                        if s is n:
+                            s = loaded_nodes[0]
+                        parent.child_nodes[s.abs_path] = s
+                    self.__preorder__ = None
+
+                # if a path, phandle or label has changed, or nodes appeared or
+                # disappeared, the dictionaries must be rebuilt.
+                new_keys = [ (o.abs_path, o.phandle, o.label) for o in loaded_nodes ]
+                if new_keys != old_keys or \
+                   [ id(o) for o in loaded_nodes ] != [ id(o) for o in old_nodes ]:
+                    reindex = True
+
+                for o in old_nodes + loaded_nodes:
+                    if o.abs_path == "/aliases":
+                        reload_aliases = True
+                    # these are now up to date
+                    self.__modified_nodes__.pop( id(o), None )
+
+            if reindex:
+                self.reindex()
+            elif reload_aliases:
+                self.alias_setup()
+
+            self.__topology_modified__ = False
+
+        lopper.log._debug( lambda: f"[{fdt}]: tree sync end: {self}" )
 
         # resolve and details that may have changed from the sync
         self.__must_sync__ = False
@@ -3393,7 +4092,26 @@ class LopperTree:
             n = self.__nnodes__[node]
 
         if n.__nstate__ == "resolved" and self.__must_sync__ == False:
-            lopper.log._debug( f"{self} deleting [{[n]}] node {n.abs_path}" )
+            lopper.log._debug( lambda: f"{self} deleting [{[n]}] node {n.abs_path}" )
+
+            # references from the rest of the tree to the node (or its
+            # subnodes) are left dangling by the delete. They must be found
+            # before the nodes are dropped from the phandle index, and
+            # references from within the deleted subtree are not reported.
+            dangling = []
+            if delete_from_parent:
+                subtree = []
+                dnodes = [ n ]
+                while dnodes:
+                    dn = dnodes.pop()
+                    subtree.append( dn )
+                    dnodes.extend( dn.child_nodes.values() )
+
+                subtree_ids = set( id(dn) for dn in subtree )
+                for dn in subtree:
+                    for p in self.referrers( dn ):
+                        if id(p.node) not in subtree_ids:
+                            dangling.append( ( dn, p ) )
 
             if n.child_nodes:
                 for cn_path,cn in list(n.child_nodes.items()):
@@ -3419,6 +4137,14 @@ class LopperTree:
             except Exception as e:
                 pass
 
+            self.compatible_index_remove( n )
+
+            # the node's properties no longer reference anything
+            for p in n.__props__.values():
+                self.reference_index_remove( p )
+            for dn, p in dangling:
+                lopper.log._warning( f"deleting {dn.abs_path}, which is referenced by: {p.abs_path}" )
+
             # snip the link if we are the first call, otherwise, the
             # recursive call above, will clear the delete flag. Otherwise, we
             # can't snip a node + subnodes and maintain them for another
@@ -3436,6 +4162,10 @@ class LopperTree:
 
             n.__nstate__ = "deleted"
             n.__modified__ = True
+            self.__topology_modified__ = True
+            self.__addr_index__ = None
+            self.__path_trie__ = None
+            self.__phandle_generation__ += 1
 
         return False
 
@@ -3480,7 +4210,7 @@ class LopperTree:
 
         """
 
-        lopper.log._debug( f" tree: node add: [{node.name}] {[ node ]} ({node.abs_path})({node.number})" 
+        lopper.log._debug( lambda: f" tree: node add: [{node.name}] {[ node ]} ({node.abs_path})({node.number})" 
                            f"          phandle: {node.phandle}" )
 
         node_full_path = node.abs_path
@@ -3509,15 +4239,19 @@ class LopperTree:
 
         if existing_node:
             if not merge:
-                lopper.log._debug( f"add: node: {node.abs_path} already exists" )
+                lopper.log._debug( lambda: f"add: node: {node.abs_path} already exists" )
                 return self
             else:
-                lopper.log._debug( f"add: node: {node.abs_path} exists, merging properties" )
+                lopper.log._debug( lambda: f"add: node: {node.abs_path} exists, merging properties" )
                 existing_node.merge( node )
                 return self
 
         node.tree = self
         node.__dbg__ = self.__dbg__
+        self.__topology_modified__ = True
+        self.__addr_index__ = None
+        self.__path_trie__ = None
+        self.__phandle_generation__ += 1
 
         if node_full_path == "/":
             node.number = 0
@@ -3543,7 +4277,7 @@ class LopperTree:
                      '__fdt_phandle__' : node.phandle },
                    parent_path )
 
-        lopper.log._debug( f"node add: {node.abs_path}, after load. depth is : {node.depth}"
+        lopper.log._debug( lambda: f"node add: {node.abs_path}, after load. depth is : {node.depth}"
                            f"         phandle: {node.phandle}" )
 
         self.__nodes__[node.abs_path] = node
@@ -3565,6 +4299,7 @@ class LopperTree:
         # they'll be re-added to the dictionary with adjusted paths, etc.
         # saved_child_nodes = list(node.child_nodes.values())
         node.child_nodes = OrderedDict()
+        self.__preorder__ = None
         for child in saved_child_nodes:
             try:
                 existing_node = self.__nodes__[node.abs_path + child.name]
@@ -3600,19 +4335,19 @@ class LopperTree:
             p.__pstate__ = "init"
             p.__modified__ = True
 
-        lopper.log._debug( f"node added: [{[node]}] {node.abs_path}" )
+        lopper.log._debug( lambda: f"node added: [{[node]}] {node.abs_path}" )
         if self.__dbg__ > 2:
             for p in node:
-                lopper.log._debug( f"      property: {p.name} {p.value} (state:{p.__pstate__})" )
+                lopper.log._debug( lambda: f"      property: {p.name} {p.value} (state:{p.__pstate__})" )
 
         # we can probably drop this by making the individual node sync's smarter and
         # more efficient when something doesn't need to be written
         #self.__must_sync__ = True
         self.__must_sync__ = False
         if dont_sync:
-            lopper.log._debug( f"\n\n{self}: {sys._getframe(0).f_lineno}/{sys._getframe(0).f_code.co_name}: treewide sync inhibited" )
+            lopper.log._debug( lambda: f"\n\n{self}: {sys._getframe(0).f_lineno}/{sys._getframe(0).f_code.co_name}: treewide sync inhibited" )
         else:
-            lopper.log._debug( f"\n\n {self}: {sys._getframe(0).f_lineno}/{sys._getframe(0).f_code.co_name}: treewide sync started" )
+            lopper.log._debug( lambda: f"\n\n {self}: {sys._getframe(0).f_lineno}/{sys._getframe(0).f_code.co_name}: treewide sync started" )
 
             # Note: doesn't actually do anything except fixup states.
             self.sync()
@@ -3639,114 +4374,320 @@ class LopperTree:
         # function and implementation.
 
         # gets you a list of all looper nodes under starting node
-        all_kids = [ start_node ]
-        for n in start_node.child_nodes.values():
-            all_kids = all_kids + self.subnodes( n )
+        all_kids = self.preorder_subnodes( start_node )
+        if all_kids is None:
+            all_kids = start_node.subnodes()
 
         all_matching_kids = []
         if node_regex:
             # we are filtering on a regex, drop nodes that don't match
+            node_regex = regex_compile( node_regex )
             for n in all_kids:
-                if re.search( node_regex, n.abs_path ):
+                if node_regex.search( n.abs_path ):
                     all_matching_kids.append( n )
         else:
             all_matching_kids = all_kids
 
-        kids_as_strings = ""
-        for i in all_matching_kids:
-            kids_as_strings += " " + i.abs_path
-
         return all_matching_kids
 
+    def walk( self, start_node = "/", **filters ):
+        """Lazily walk the subnodes of a node
 
-    def nodes( self, nodename ):
-        """Get nodes that match a given name or regex
-
-        Looks for a node at a name/path, or nodes that match a regex.
+        See LopperNode.walk() for the available filters.
 
         Args:
-           nodename (string): node name or regex
+           start_node (LopperNode or string,optional): the starting node (or
+                                                       its path). Default "/"
+           filters: LopperNode.walk() filters (max_depth, path_regex,
+                    compatible, predicate, prune, children_only)
 
         Returns:
-           list: a list all nodes that match the name or regex
-
+           generator: the matching LopperNodes
         """
-        matches = []
-        try:
-            matches = [self.__nodes__[nodename]]
-        except:
-            # maybe it was a regex ?
-            try:
-                for n in self.__nodes__.keys():
-                    if re.search( nodename, n ):
-                        matches.append( self.__nodes__[n] )
-            except:
-                pass
+        if type(start_node) == str:
+            start_node = self[start_node]
 
-        return matches
+        return start_node.walk( **filters )
 
+    def preorder( self ):
+        """Get the nodes of the tree, in pre-order
 
-    def deref( self, phandle_or_label ):
-        """Find a node by a phandle or label
+        The nodes are ordered as a depth first walk of the tree (from the
+        root node) visits them, with the subnodes of any node immediately
+        following it. The array is built on demand, and is cached until the
+        topology of the tree changes.
 
-        dereferences a phandle or label to find the target node.
+        The returned values must not be modified.
 
         Args:
-           phandle_or_label (int or string)
+           None
 
         Returns:
-           LopperNode: the matching node if found, None otherwise
-
+           tuple: (list) the LopperNodes in pre-order, (dict) the position of
+                  each node in the list (indexed by node id), (list) the
+                  position after the last subnode of the node at each
+                  position
         """
-        try:
-            tgn = self.pnode( phandle_or_label )
-            if tgn == None:
-                # if we couldn't find the target, maybe it is in
-                # as a string. So let's check that way.
-                tgn2 = self.nodes( phandle_or_label )
-                if not tgn2:
-                    tgn2 = self.lnodes( re.escape(phandle_or_label) )
+        if self.__preorder__ is None:
+            nodes = []
+            positions = {}
+            ends = []
 
-                if tgn2:
-                    tgn = tgn2[0]
-        except:
-            tgn = None
+            try:
+                walk = [ (self.__nodes__["/"], False) ]
+            except KeyError:
+                walk = []
+
+            while walk:
+                n, closing = walk.pop()
+                if closing:
+                    ends[positions[id(n)]] = len(nodes)
+                    continue
 
-        return tgn
+                positions[id(n)] = len(nodes)
+                nodes.append( n )
+                ends.append( len(nodes) )
 
-    def pnode( self, phandle ):
-        """Find a node in a tree by phandle
+                walk.append( (n, True) )
+                walk.extend( (c, False) for c in reversed( n.child_nodes.values() ) )
 
-        Safely (no exception raised) returns the node that can be found
-        at a given phandle value.
+            self.__preorder__ = ( nodes, positions, ends )
+
+        return self.__preorder__
+
+    def preorder_subnodes( self, node ):
+        """Get a node and its subnodes, from the pre-order node array
 
         Args:
-           phandle (int): node phandle to check
+           node (LopperNode): the starting node
 
         Returns:
-           LopperNode: the matching node if found, None otherwise
-
+           list: the node and its subnodes (in pre-order), or None if the
+                 node is not reachable from the root of the tree
         """
+        nodes, positions, ends = self.preorder()
         try:
-            return self.__pnodes__[phandle]
-        except:
+            i = positions[id(node)]
+        except KeyError:
             return None
 
+        if nodes[i] is not node:
+            return None
 
-    def alias_node( self, alias ):
-        """Find a node via an alias
+        return nodes[i:ends[i]]
 
-        Safely (no exception raised) returns the node that can be found
-        at a given alias.
+    def iteration_nodes( self ):
+        """Get the nodes of a new tree iteration
 
-        Args:
-           alias (string): node alias to check
+        Three types of iterations are common:
 
-        Returns:
-           node (LopperNode): the alias nodes if found, None otherwise
-        """
-        try:
-            node = self.__aliases__[alias]
+          - full iteration: a depth first walk of every node in the tree
+          - subnode iteration: a depth first walk of all nodes under a given
+                               starting point (__current_node__)
+          - startnode iteration: A depth first walk starting at a given node
+                                 (__start_node__) and continuing to the end
+                                 of the tree
+
+        A subnode iteration applies to only the next iteration, the current
+        node is reset when it starts.
+
+        Args:
+           None
+
+        Returns:
+           list: the LopperNodes of the iteration
+        """
+        current_node = self.__current_node__
+        start_node = self.__start_node__
+
+        self.__dict__["__current_node__"] = "/"
+
+        nodes, positions, ends = self.preorder()
+
+        if current_node == "/" and start_node == "/":
+            return nodes
+        elif start_node != "/":
+            # this is a starting node, we start there and walk to the end
+            # of the tree
+            for i, n in enumerate( nodes ):
+                if n.abs_path == start_node:
+                    return nodes[i:]
+            return []
+        else:
+            # a custom iteration of only the nodes that are underneath of the
+            # set current_node
+            node = self.__nodes__[current_node]
+            subnodes = self.preorder_subnodes( node )
+            if subnodes is None:
+                subnodes = node.subnodes()
+            return subnodes
+
+
+    def nodes( self, nodename ):
+        """Get nodes that match a given name or regex
+
+        Looks for a node at a name/path, or nodes that match a regex.
+
+        Args:
+           nodename (string): node name or regex
+
+        Returns:
+           list: a list all nodes that match the name or regex
+
+        """
+        matches = []
+        try:
+            matches = [self.__nodes__[nodename]]
+        except:
+            # maybe it was a regex ?
+            try:
+                node_regex = regex_compile( nodename )
+                for n in self.path_candidates( nodename ):
+                    if node_regex.search( n ):
+                        matches.append( self.__nodes__[n] )
+            except:
+                pass
+
+        return matches
+
+    def path_trie( self ):
+        """Returns the path trie of a tree
+
+        The trie is keyed by node path component, and every entry holds
+        the paths of the nodes in its subtree (in tree order). It is built
+        on first use and invalidated when nodes are added or removed.
+
+        Args:
+           None
+
+        Returns:
+           dict: the root entry of the trie
+        """
+        if self.__path_trie__ is None:
+            trie = { "children": {}, "paths": [] }
+            for path in self.__nodes__.keys():
+                entry = trie
+                entry["paths"].append( path )
+                for component in path.split( "/" ):
+                    if component:
+                        entry = entry["children"].setdefault( component,
+                                                              { "children": {}, "paths": [] } )
+                        entry["paths"].append( path )
+
+            self.__path_trie__ = trie
+
+        return self.__path_trie__
+
+    def path_candidates( self, node_regex ):
+        """Returns the node paths that could match a regex
+
+        If the regex is anchored (starts with "^") and has a literal path
+        prefix, only the paths of the subtree under that prefix can match.
+        They are found via the path trie. Otherwise all node paths are
+        returned.
+
+        Args:
+           node_regex (string): regex that will be used to match node paths
+
+        Returns:
+           list (string): node paths to check against the regex
+        """
+        prefix = regex_literal_prefix( node_regex )
+        if not prefix or not prefix.startswith( "/" ):
+            return list(self.__nodes__.keys())
+
+        # the last component of the prefix may be partial, so we stop
+        # at its parent
+        entry = self.path_trie()
+        for component in prefix.split( "/" )[1:-1]:
+            try:
+                entry = entry["children"][component]
+            except:
+                return []
+
+        return entry["paths"]
+
+
+    def deref( self, phandle_or_label ):
+        """Find a node by a phandle or label
+
+        dereferences a phandle or label to find the target node.
+
+        Args:
+           phandle_or_label (int or string)
+
+        Returns:
+           LopperNode: the matching node if found, None otherwise
+
+        """
+        # string references are searched for by path and label, which are
+        # full tree walks. The results are kept in a table that is valid
+        # until the phandles, labels or paths of the tree change.
+        table_generation, table = self.__deref_table__
+        if table_generation != self.__phandle_generation__:
+            table = {}
+            self.__deref_table__ = ( self.__phandle_generation__, table )
+
+        try:
+            return table[phandle_or_label]
+        except KeyError:
+            pass
+        except TypeError:
+            # unhashable, it can't be in the table
+            table = None
+
+        try:
+            tgn = self.pnode( phandle_or_label )
+            if tgn == None:
+                # if we couldn't find the target, maybe it is in
+                # as a string. So let's check that way.
+                tgn2 = self.nodes( phandle_or_label )
+                if not tgn2:
+                    tgn2 = self.lnodes( re.escape(phandle_or_label) )
+
+                if tgn2:
+                    tgn = tgn2[0]
+        except:
+            tgn = None
+
+        if table is not None:
+            table[phandle_or_label] = tgn
+
+        return tgn
+
+    def pnode( self, phandle ):
+        """Find a node in a tree by phandle
+
+        Safely (no exception raised) returns the node that can be found
+        at a given phandle value.
+
+        Args:
+           phandle (int): node phandle to check
+
+        Returns:
+           LopperNode: the matching node if found, None otherwise
+
+        """
+        try:
+            return self.__pnodes__[phandle]
+        except:
+            return None
+
+
+    def alias_node( self, alias ):
+        """Find a node via an alias
+
+        Safely (no exception raised) returns the node that can be found
+        at a given alias.
+
+        Args:
+           alias (string): node alias to check
+
+        Returns:
+           node (LopperNode): the alias nodes if found, None otherwise
+        """
+        try:
+            node = self.__aliases__[alias]
         except:
             node = None
 
@@ -3770,40 +4711,414 @@ class LopperTree:
         """
         nodes = []
         try:
+            if exact:
+                if not regex_special_chars.intersection( label ):
+                    # a plain label, no need to search
+                    try:
+                        return [ self.__lnodes__[label] ]
+                    except:
+                        return nodes
+
+                label_regex = regex_compile( "^" + label + "$" )
+            else:
+                label_regex = regex_compile( label )
+
             for l in self.__lnodes__.keys():
-                if exact:
-                    if re.search( "^" + label + "$", l ):
-                        nodes.append( self.__lnodes__[l] )
-                else:
-                    if re.search( label, l ):
-                        nodes.append( self.__lnodes__[l] )
+                if label_regex.search( l ):
+                    nodes.append( self.__lnodes__[l] )
         except:
             return nodes
 
         return nodes
 
-    def cnodes( self, compatible_string ):
+    def cnodes( self, compatible_string, exact = True ):
         """Returns the nodes in a tree that are compatible with the passed type
 
         Utility function to search a tree for nodes of a given "type"
 
+        The tree maintains an index of compatible strings to nodes, so an
+        exact search is a dictionary lookup. A non-exact search treats the
+        passed string as a regex (i.e. "^xlnx,zynqmp-" for a prefix match),
+        which is matched against the indexed compatible strings, not every
+        node in the tree. The matching nodes are returned in tree order.
+
         Args:
            compatible_string (string): compatibility string to match
+           exact (boolean,optional): flag indicating if exact or regex matching
+                                     should be used. Default is True.
 
         Returns:
            list (LopperNode): the matching nodes if found, [] otherwise
 
         """
-        matching_nodes = []
-        for n in self:
+        matching_nodes = {}
+        if exact:
+            try:
+                matching_nodes = self.__cnodes__[compatible_string]
+            except:
+                return []
+        else:
             try:
-                compat_prop = n["compatible"]
-                if compat_prop and compatible_string in compat_prop.value:
-                    matching_nodes.append( n )
+                for compat, nodes in self.__cnodes__.items():
+                    if re.search( compatible_string, compat ):
+                        matching_nodes.update( nodes )
             except:
                 pass
 
-        return matching_nodes
+        # the index is in the order the nodes were indexed, which changes
+        # as compatible properties are modified. Return them in tree order.
+        positions = self.preorder()[1]
+        return sorted( matching_nodes.values(), key = lambda n: positions.get( id(n), len(positions) ) )
+
+    def compatible_index_add( self, node ):
+        """Add a node to the compatible string index of a tree
+
+        Indexes the node under each of the values of its 'compatible' property.
+        Adding a node that is already indexed is harmless.
+
+        Args:
+           node (LopperNode): node to index
+
+        Returns:
+           Nothing
+
+        """
+        try:
+            compat_values = node.__props__["compatible"].value
+        except:
+            return
+
+        if type(compat_values) != list:
+            compat_values = [ compat_values ]
+
+        for c in compat_values:
+            try:
+                self.__cnodes__.setdefault( c, OrderedDict() )[id(node)] = node
+            except:
+                # unhashable value, it can't be a compatible string
+                pass
+
+    def compatible_index_remove( self, node, compat_values = None ):
+        """Remove a node from the compatible string index of a tree
+
+        Args:
+           node (LopperNode): node to remove from the index
+           compat_values (list,optional): the compatible strings the node is
+                                          indexed under. If not passed, the
+                                          node's 'compatible' property is used
+
+        Returns:
+           Nothing
+
+        """
+        if compat_values == None:
+            try:
+                compat_values = node.__props__["compatible"].value
+            except:
+                return
+
+        if type(compat_values) != list:
+            compat_values = [ compat_values ]
+
+        for c in compat_values:
+            try:
+                nodes = self.__cnodes__[c]
+                nodes.pop( id(node), None )
+                if not nodes:
+                    del self.__cnodes__[c]
+            except:
+                pass
+
+    def reference_index( self ):
+        """Get the reference index of the tree
+
+        The reference index maps the values of the properties that can hold
+        phandles (see Lopper.phandle_possible_properties()) to the properties
+        that contain them. It is built the first time it is requested, and
+        then kept up to date as properties are added, modified and deleted.
+
+        Entries are candidates, since a value may be a cell count or flag
+        and not a phandle. Use referrers() to find the properties that
+        really reference a node.
+
+        Args:
+           None
+
+        Returns:
+           dict: { value: OrderedDict( { id(prop): LopperProp } ) }
+
+        """
+        # the index is rebuilt if the phandle properties have been changed
+        phandle_props = frozenset( Lopper.phandle_possible_properties() )
+        if self.__rnodes__ is None or self.__rnodes__[0] != phandle_props:
+            self.__rnodes__ = ( phandle_props, {} )
+            for n in self.__nodes__.values():
+                for p in n.__props__.values():
+                    self.reference_index_add( p )
+
+        return self.__rnodes__[1]
+
+    def reference_index_add( self, prop ):
+        """Add a property to the reference index of a tree
+
+        If the index has not been built yet, this does nothing (it is
+        populated when it is built). Adding a property that is already
+        indexed is harmless.
+
+        Args:
+           prop (LopperProp): property to index
+
+        Returns:
+           Nothing
+
+        """
+        if self.__rnodes__ is None:
+            return
+
+        phandle_props, index = self.__rnodes__
+        if prop.name not in phandle_props:
+            return
+
+        values = prop.value
+        if type(values) != list:
+            values = [ values ]
+
+        for v in values:
+            # phandles are never zero (or negative), and those values are
+            # common flags and cell values.
+            if type(v) == int and v <= 0:
+                continue
+            try:
+                index.setdefault( v, OrderedDict() )[id(prop)] = prop
+            except TypeError:
+                # unhashable, it can't be a reference
+                pass
+
+    def reference_index_remove( self, prop, values = None ):
+        """Remove a property from the reference index of a tree
+
+        Args:
+           prop (LopperProp): property to remove from the index
+           values (list,optional): the values the property is indexed under.
+                                   If not passed, the property's value is used
+
+        Returns:
+           Nothing
+
+        """
+        if self.__rnodes__ is None:
+            return
+
+        phandle_props, index = self.__rnodes__
+        if prop.name not in phandle_props:
+            return
+
+        if values == None:
+            values = prop.value
+        if type(values) != list:
+            values = [ values ]
+
+        for v in values:
+            try:
+                props = index[v]
+                props.pop( id(prop), None )
+                if not props:
+                    del index[v]
+            except (KeyError, TypeError):
+                pass
+
+    def referrers( self, node ):
+        """Find the properties that reference a node
+
+        Uses the reference index (see reference_index()) to find the
+        properties that may contain the node's phandle (or label/path),
+        and then checks their phandle maps. The cost is proportional to
+        the number of candidate properties, not to the size of the tree.
+
+        Args:
+           node (LopperNode): the referenced node
+
+        Returns:
+           list: the LopperProps that reference the node, [] if there
+                 are none
+
+        """
+        index = self.reference_index()
+
+        keys = []
+        if node.phandle > 0:
+            keys.append( node.phandle )
+        if node.label:
+            keys.append( node.label )
+        if node.abs_path:
+            keys.append( node.abs_path )
+
+        refs = OrderedDict()
+        for k in keys:
+            try:
+                candidates = index[k]
+            except (KeyError, TypeError):
+                continue
+
+            for prop_id, p in list( candidates.items() ):
+                pn = p.node
+                if not pn or pn.tree is not self or \
+                   self.__nodes__.get( pn.abs_path ) is not pn or \
+                   pn.__props__.get( p.name ) is not p:
+                    # the property (or its node) is no longer in the tree
+                    del candidates[prop_id]
+                    continue
+
+                if prop_id in refs:
+                    continue
+
+                for record in p.phandle_map():
+                    if any( r is node for r in record ):
+                        refs[prop_id] = p
+                        break
+
+            if not candidates:
+                del index[k]
+
+        return list( refs.values() )
+
+    def addr_index( self ):
+        """Get the address index of the tree
+
+        Returns the index of translated node addresses, building it if it
+        isn't currently valid. Only nodes with @ in their name are indexed,
+        since by the device tree spec, these are the required unit address.
+
+        The index is built once and re-used until a property that impacts
+        memory mapping (reg, ranges, #address-cells, #size-cells) is changed,
+        a node is renamed, or nodes are added or removed.
+
+        The index is a dictionary with:
+
+           - 'addresses': the nodes indexed by translated unit address
+           - 'regions': sorted list of (start, end, node) for each reg entry
+                        of a node, with translated start addresses
+           - 'starts': the start addresses of 'regions' (for bisection)
+           - 'max_end': the largest end address of 'regions' up to, and
+                        including each entry
+
+        Args:
+           None
+
+        Returns:
+           dictionary: the address index
+
+        """
+        if self.__addr_index__ != None:
+            return self.__addr_index__
+
+        lopper.log._debug( lambda: f"addr_index: building address index for tree: {self}" )
+
+        addresses = {}
+        regions = []
+        for n, (node_address, reg_regions) in self.translate_all().items():
+            if node_address:
+                addresses[node_address] = n
+
+            if not reg_regions:
+                # no usable reg, the node only covers its unit address
+                regions.append( (node_address, node_address + 1, n) )
+            else:
+                regions.extend( [ (reg_start, reg_start + reg_size, n)
+                                  for reg_start, reg_size in reg_regions ] )
+
+        regions.sort( key=lambda r: (r[0], r[1]) )
+
+        max_end = []
+        current_max = None
+        for r in regions:
+            if current_max == None or r[1] > current_max:
+                current_max = r[1]
+            max_end.append( current_max )
+
+        self.__addr_index__ = { 'addresses': addresses,
+                                'regions': regions,
+                                'starts': [ r[0] for r in regions ],
+                                'max_end': max_end }
+
+        return self.__addr_index__
+
+    def translate_all( self ):
+        """Translate the addresses and reg entries of all nodes
+
+        Translates the unit address and every reg entry of every node with
+        a unit address (@ in their name) in a single pass over the tree.
+
+        Nodes are visited top down, and translations are cached (see
+        LopperNode.address()), so the ranges of a bus are decoded once and
+        the translations of its parents are re-used for all of its
+        children. The result is cached until the address index is
+        invalidated.
+
+        Args:
+           None
+
+        Returns:
+           OrderedDict: { LopperNode: ( translated unit address, [ ( translated start, size ), ... ] ) }
+                        the list of regions is empty if the node has no usable reg
+
+        """
+        try:
+            return self.__addr_cache__["translate_all"]
+        except KeyError:
+            pass
+
+        translated = OrderedDict()
+        for n in self.__nodes__.values():
+            if not "@" in n.name:
+                continue
+
+            node_address = n.address()
+            if node_address == None:
+                continue
+
+            lopper.log._debug( lambda: f"node %s has address: {n.abs_path,hex(node_address)}" )
+
+            # the regions are calculated from the reg property, which is
+            # described by the parent cell sizes
+            reg = n.propval( "reg" )
+            address_cells = 2
+            size_cells = 1
+            if n.parent:
+                pac = n.parent.propval( "#address-cells" )[0]
+                if pac != "":
+                    address_cells = pac
+                psc = n.parent.propval( "#size-cells" )[0]
+                if psc != "":
+                    size_cells = psc
+
+            reg_regions = []
+            if reg != [""] and address_cells and size_cells and \
+               len(reg) % (address_cells + size_cells) == 0:
+                try:
+                    try:
+                        reg_cells = n.__props__["reg"].cells()
+                    except (ValueError, OverflowError, TypeError):
+                        reg_cells = reg
+
+                    for reg_address, reg_size in \
+                        lopper.base.lopper_base.cell_fields( reg_cells, [ address_cells, size_cells ] ):
+                        if reg_address:
+                            reg_start = n.address( reg_address )
+                        else:
+                            reg_start = node_address
+
+                        if reg_start != None:
+                            reg_regions.append( (reg_start, reg_size) )
+                except Exception as e:
+                    lopper.log._debug( lambda: f"translate_all: could not decode reg of {n.abs_path}: {e}" )
+                    reg_regions = []
+
+            translated[n] = ( node_address, reg_regions )
+
+        self.__addr_cache__["translate_all"] = translated
+
+        return translated
 
     def addr_node(self, address):
         """Find a node in the tree based on an address
@@ -3818,44 +5133,79 @@ class LopperTree:
         the address() function). It is those translated addresses
         which are used to locate a target node (if one exists).
 
+        The translated addresses are kept in an index (see addr_index())
+        so repeated lookups do not re-translate the tree.
+
         Args:
-          address (int): target translated address to match
+          address (int or string): target translated address to match. Strings
+                                   are converted to an integer (i.e. "0xff0d0000")
 
         Returns:
           target node (LopperNode): the matching node, None otherwise
         """
 
-        lopper.log._debug( f"addr_node {address}" )
+        lopper.log._debug( lambda: f"addr_node {address}" )
 
-        target_node = None
-
-        # TODO: this may be better to calculate once, and then cache
-        #       in a dictionary indexed by address, or add an
-        #       "address" field to each node and consult it. But we
-        #       would have to recalculate it on tree operations that
-        #       modify properties that impact memory mapping.
-
-        # gather the nodes with @ in their name
-        address_nodes = []
-        for n in self.__nodes__.values():
-            if "@"  in n.name:
-                address_nodes.append( n )
-
-        # calculate all the addresses
-        address_dict = {}
-        for n in address_nodes:
-            node_address = n.address()
-            if node_address:
-                lopper.log._debug( f"node %s has address: {n.abs_path,hex(node_address)}" )
-                address_dict[hex(node_address)] = n
+        if type(address) == str:
+            try:
+                address = int( address, 0 )
+            except:
+                return None
 
         try:
-            target_node = address_dict[address]
+            target_node = self.addr_index()['addresses'][address]
         except:
             target_node = None
 
         return target_node
 
+    def addr_nodes(self, address):
+        """Find the nodes in the tree that contain an address
+
+        Where addr_node() matches a translated unit address exactly, this
+        routine finds all the nodes that have a (translated) reg region
+        containing the passed address.
+
+        Args:
+          address (int or string): target translated address. Strings are
+                                   converted to an integer (i.e. "0xff0d0000")
+
+        Returns:
+          list (LopperNode): the nodes containing the address, smallest region
+                             first. [] if no nodes contain the address.
+        """
+        lopper.log._debug( lambda: f"addr_nodes {address}" )
+
+        if type(address) == str:
+            try:
+                address = int( address, 0 )
+            except:
+                return []
+
+        index = self.addr_index()
+        regions = index['regions']
+        max_end = index['max_end']
+
+        matches = []
+        # all regions that start at or before the address are candidates,
+        # walk them backwards and stop once no earlier region can reach the
+        # address.
+        i = bisect.bisect_right( index['starts'], address ) - 1
+        while i >= 0 and max_end[i] > address:
+            start, end, node = regions[i]
+            if start <= address < end:
+                matches.append( (end - start, node) )
+            i = i - 1
+
+        matches.sort( key=lambda m: m[0] )
+
+        matching_nodes = []
+        for size, node in matches:
+            if not node in matching_nodes:
+                matching_nodes.append( node )
+
+        return matching_nodes
+
     def exec_cmd( self, node, cmd, env = None, module_list=[], module_load_paths=[] ):
         """Execute a (limited) code block against a node
 
@@ -3910,6 +5260,76 @@ class LopperTree:
         if type(node) == str:
             n = self[node]
 
+        # the compiled block and its execution namespace are prepared once
+        # per code block (and modules / environment), and reused for the
+        # most recently used blocks.
+        exec_key = ( cmd, tuple(module_list), tuple(module_load_paths),
+                     tuple(env) if env else () )
+        try:
+            prepared = self.__exec_cache__[exec_key]
+            self.__exec_cache__.move_to_end( exec_key )
+        except KeyError:
+            prepared = self.exec_namespace( cmd, module_list, module_load_paths, env )
+            if prepared is None:
+                os._exit(1)
+            self.__exec_cache__[exec_key] = prepared
+            if len(self.__exec_cache__) > exec_cache_size:
+                self.__exec_cache__.popitem( last=False )
+
+        lopper.log._debug( lambda: f"filter: node: {node}" )
+
+        # each call runs in a copy of the prepared namespace, so that globals
+        # set by the block (and the per-node variables) don't leak into the
+        # next call. The block is rebound to the copy.
+        m = dict( prepared )
+        m['__node_test_block'] = types.FunctionType( prepared['__node_test_block'].__code__, m )
+
+        # add the per-node variables
+        m['n'] = n
+        m['node'] = n
+        m['node_number'] = n.number
+        m['node_name' ] = n.abs_path
+        m['prop_list'] = n.__props__
+        m['verbose'] = self.__dbg__
+        m['__selected__'] = self.__selected__
+        m['env'] = env
+
+        if env:
+            for e in env:
+                m[e] = env[e]
+
+        try:
+            m['__nret'] = m['__node_test_block']()
+        except Exception as e:
+            lopper.log._warning( f"Exception ({e}) raised by code block:\n{m['__node_test_block_source']}")
+            os._exit(1)
+
+        lopper.log._debug( lambda: f"return code was: {m['__nret']}" )
+
+        if m['__nret']:
+            return m['__nret']
+        else:
+            return False
+
+    def exec_namespace( self, cmd, module_list=[], module_load_paths=[], env = None ):
+        """Prepare the execution namespace of a code block
+
+        The code block is compiled (wrapped in a function), and the modules
+        in the module list are loaded into a namespace that has the safe
+        functions and variables (see exec_cmd()) available.
+
+        Args:
+            cmd (string): block of python code
+            module_list (list,optional): list of assists to load
+            module_load_paths (list,optional): additional load paths to use
+                                               when loading modules
+            env (dictionary,optional): values to make available as
+                                       variables to the code block
+
+        Returns:
+            dict: the namespace, with the code block available as
+                  '__node_test_block', or None if it could not be prepared
+        """
         # make a list of seed safe functions
         safe_list = []
 
@@ -3924,24 +5344,7 @@ class LopperTree:
         safe_dict['verbose'] = self.__dbg__
         safe_dict['tree'] = self
 
-        lopper.log._debug( f"filter: base safe dict: {safe_dict}"
-                           f"filter: node: {node}" )
-
-        # build up the device tree node path
-        # node_name = node_prefix + n
-        node_name = n.abs_path
-        node_number = n.number
-        prop_list = n.__props__
-
-        # add any needed builtins back in
-        safe_dict['node'] = n
-        safe_dict['node_number'] = node_number
-        safe_dict['node_name' ] = node_name
-        safe_dict['__selected__'] = self.__selected__
-
-        if env:
-            for e in env:
-                safe_dict[e] = env[e]
+        lopper.log._debug( lambda: f"filter: base safe dict: {safe_dict}" )
 
         if module_list:
             mod_load = "assist_dir = os.path.dirname(os.path.realpath(__file__)) + '/assists/'\n"
@@ -3961,22 +5364,21 @@ class LopperTree:
         __nret = False
         # indent everything, its going in a function
         tc_indented = textwrap.indent( tc, '    ' )
-        # define the function, add the body, call the function and grab the return value
-        tc_full_block = mod_load + "def __node_test_block():\n" + tc_indented + "\n__nret = __node_test_block()"
-
-        lopper.log._debug( f"node exec cmd:\n{tc_full_block}" )
+        # define the function, add the body. The function is called by
+        # exec_cmd(), once per node.
+        tc_full_block = mod_load + "def __node_test_block():\n" + tc_indented + "\n"
 
-        # compile the block, so we can evaluate it later
-        b = compile( tc_full_block, '<string>', 'exec' )
+        lopper.log._debug( lambda: f"node exec cmd:\n{tc_full_block}" )
 
         x = locals()
         y = globals()
 
         # we merge the locals and globals into a single dictionary, so that
-        # the local variables of *this* function (i.e. node, node_name) that
-        # change each loop, will be availble when calling the code block as
+        # the per-node variables (i.e. node, node_name) that are set by
+        # exec_cmd() will be availble when calling the code block as
         # globals in that context.
         m = {**x, **y, **safe_dict}
+        m['__node_test_block_source'] = tc_full_block
 
         # TODO: we could restrict the locals and globals a bit more, but
         #       in this function context, the side effects are limited to
@@ -3988,20 +5390,70 @@ class LopperTree:
         #       or
         #          x = eval( b, {"__builtins__" : None }, safe_dict )
         try:
+            # compile the block, and load the modules / define the function
+            b = compile( tc_full_block, '<string>', 'exec' )
             eval( b, m, m )
         except Exception as e:
             lopper.log._warning( f"Exception ({e}) raised by code block:\n{tc_full_block}")
-            os._exit(1)
+            return None
 
-        lopper.log._debug( f"return code was: {m['__nret']}" )
+        return m
 
-        if m['__nret']:
-            return m['__nret']
-        else:
-            return False
 
+    def exec_batch( self, node, nodes, cmd, env = None, module_list=[], module_load_paths=[] ):
+        """Execute a (limited) code block once against a list of nodes
+
+        Rather than executing the code block once per node (see exec_cmd()),
+        the block is executed once, with the list of nodes available to it
+        as the variable 'nodes'. The block returns the nodes that match
+        (any iterable of LopperNodes or node paths), True if all of the
+        nodes match, or False/None if none of them do.
+
+        All the variables described in exec_cmd() are available to the code
+        block, with 'node' set to the passed context node.
+
+        Args:
+            node (LopperNode or string): context node
+            nodes (list or iterable): the LopperNodes to process
+            cmd (string): block of python code to execute
+            env (dictionary,optional): values to make available as
+                                       variables to the code block
+            module_list (list,optional): list of assists to load before
+                                         running the code block
+            module_load_paths (list,optional): additional load paths to use
+                                               when loading modules
+
+        Returns:
+            list: the LopperNodes returned by the code block
+        """
+        nodes = list( nodes )
+
+        batch_env = dict( env ) if env else {}
+        batch_env['nodes'] = nodes
+
+        ret = self.exec_cmd( node, cmd, batch_env, module_list, module_load_paths )
+        if not ret:
+            return []
+
+        if ret is True:
+            return nodes
+
+        if isinstance( ret, (LopperNode, str) ):
+            ret = [ ret ]
+
+        matches = []
+        for n in ret:
+            if type(n) == str:
+                try:
+                    n = self[n]
+                except:
+                    lopper.log._warning( f"batch code block returned an invalid node: {n}" )
+                    continue
+            matches.append( n )
 
-    def filter( self, node_prefix, action, test_cmd, fdt=None, verbose=0 ):
+        return matches
+
+    def filter( self, node_prefix, action, test_cmd, fdt=None, verbose=0, batch=False ):
         """Filter tree nodes and perform an action
 
         Starting from the supplied path (node_prefix), this function walks
@@ -4011,6 +5463,11 @@ class LopperTree:
         If the block of code (test_cmd) returns True, then the action is
         taken. If false, nothing is done.
 
+        In batch mode, the block of code is executed only once, with the
+        list of nodes available as the variable 'nodes', and returns the
+        nodes that match (see exec_batch()). The action is taken for each
+        returned node.
+
         Currently defined actions:
 
            - delete: delete the node
@@ -4032,15 +5489,18 @@ class LopperTree:
             test_cmd (string): block of python code to test against each node
             fdt (FDT,optional): flattended device tree for reference
             verbose (int,optional): verbosity level to use.
+            batch (bool,optional): execute the code block once, against all
+                                   the nodes
 
         Returns:
-            Nothing
+            The result of the last test, or the list of matching nodes in
+            batch mode
 
         """
         # only sync if required
         self.sync( fdt, True )
 
-        lopper.log._debug( f"filtering nodes root: {node_prefix}" )
+        lopper.log._debug( lambda: f"filtering nodes root: {node_prefix}" )
 
         if not node_prefix:
             node_prefix = "/"
@@ -4054,17 +5514,29 @@ class LopperTree:
             lopper.log._error( f"no nodes found that match prefix {node_prefix}" )
 
         if verbose > 1:
-            lopper.log._debug( f"filter: node list: ", end=" " )
+            lopper.log._debug( "filter: node list: ", end=" " )
             for nn in node_list:
-                lopper.log._debug( f"    {nn.abs_path}", end="  " )
-            lopper.log._debug( f"" )
+                lopper.log._debug( lambda: f"    {nn.abs_path}", end="  " )
+            lopper.log._debug( "" )
+
+        if batch:
+            if not node_list:
+                return []
+
+            matches = self.exec_batch( start_node, node_list, test_cmd )
+            for n in matches:
+                if action == LopperAction.DELETE:
+                    lopper.log._info( f"deleting node {n.abs_path}" )
+                    self.delete( n )
+
+            return matches
 
         for n in node_list:
-            lopper.log._debug( f"filter node cmd:\n{test_cmd}" )
+            lopper.log._debug( lambda: f"filter node cmd:\n{test_cmd}" )
 
             test_cmd_result = self.exec_cmd( n, test_cmd )
 
-            lopper.log._debug( f"return code was: {test_cmd_result}" )
+            lopper.log._debug( lambda: f"return code was: {test_cmd_result}" )
 
             # did the block set the return variable to True ?
             if test_cmd_result:
@@ -4105,7 +5577,7 @@ class LopperTree:
         chain_close_dict = {}
         for n in self:
             if self.__dbg__ > 4:
-                lopper.log._debug( f"node: {n.name}:{n.number} [{n.phandle}] parent: {n.parent} children: {n.child_nodes}" )
+                lopper.log._debug( lambda: f"node: {n.name}:{n.number} [{n.phandle}] parent: {n.parent} children: {n.child_nodes}" )
 
             if n.number == 0 or n.abs_path == "/":
                 if self.start_tree_cb:
@@ -4118,7 +5590,7 @@ class LopperTree:
                 # add the last child in our list, we'll use it to know when to end a node.
                 # we could remove these on the close, if memory becomes an issue
                 if self.__dbg__ > 4:
-                    lopper.log._debug( f"node {n.number} ({n.abs_path}) has last child {last_child}" )
+                    lopper.log._debug( lambda: f"node {n.number} ({n.abs_path}) has last child {last_child}" )
 
                 if not n.abs_path in last_children:
                     last_children.append( n.abs_path )
@@ -4126,7 +5598,7 @@ class LopperTree:
                 last_children.append( last_child.abs_path )
                 chain_close_dict[last_child.abs_path] = n
                 if self.__dbg__ > 4:
-                    lopper.log._debug( f"mapped chain close {n.number} ({n.abs_path}) to {last_child}" )
+                    lopper.log._debug( lambda: f"mapped chain close {n.number} ({n.abs_path}) to {last_child}" )
 
             if self.start_node_cb:
                 self.start_node_cb( n )
@@ -4141,7 +5613,7 @@ class LopperTree:
             #if last_children and n.number == last_children[-1]:
             if last_children and n.abs_path == last_children[-1]:
                 if self.__dbg__ > 4:
-                    lopper.log._debug( f"{n.abs_path} matches last {last_children} ({last_children[-1]})" )
+                    lopper.log._debug( lambda: f"{n.abs_path} matches last {last_children} ({last_children[-1]})" )
 
                 # we are closing!
                 if self.end_node_cb:
@@ -4154,12 +5626,12 @@ class LopperTree:
                 to_close = n.abs_path
                 while cc_close in list(chain_close_dict.keys()):
                     if self.__dbg__ > 4:
-                        lopper.log._debug( f"chain close" )
+                        lopper.log._debug( "chain close" )
 
                     to_close = chain_close_dict[cc_close]
 
                     if self.__dbg__ > 4:
-                        lopper.log._debug( f"would close {to_close.abs_path} {to_close}" )
+                        lopper.log._debug( lambda: f"would close {to_close.abs_path} {to_close}" )
 
                     if last_children[-1] == to_close.abs_path:
                         del last_children[-1]
@@ -4175,7 +5647,7 @@ class LopperTree:
                 # we are closing!
                 if self.end_node_cb:
                     if self.__dbg__ > 4:
-                        lopper.log._debug( f"no children, closing node" )
+                        lopper.log._debug( "no children, closing node" )
                     self.end_node_cb( n )
 
         if self.end_tree_cb:
@@ -4208,38 +5680,28 @@ class LopperTree:
         is added to ensure that iterations will see the new node in tree order,
         versus added order.
 
+        A stream of nodes (i.e. from LopperFDT.export_nodes()) can also be
+        passed. In that case, the nodes are loaded as they are produced
+        instead of unrolling a dictionary first.
+
+        The dictionary is not kept once the tree has been loaded. If no
+        dictionary is passed, the tree is reloaded from its own export.
+
         Args:
-           dct (Dictionary): dictionary from a lopper.fdt export, or a tree export
+           dct (Dictionary or generator): dictionary from a lopper.fdt export, or a tree export,
+                                          or a generator of [ node dictionary, parent dictionary ] pairs
 
         Returns:
            Nothing
 
         """
-        if dct:
-            self.dct = dct
-        else:
-            dct = self.dct
-
-        # take the dictionary format, which is a series of nested dicts
-        # representing nodes and properties. We'd rather not recurse to do our
-        # processing below, so we unroll the recursion into an ordered list of
-        # nodes and properties.
+        if not dct:
+            dct = self.export()
 
-        # we have a list of: containing dict, value, parent
-        dwalk = [ [dct,dct,None]  ]
-        node_ordered_list = []
-        while dwalk:
-            firstitem = dwalk.pop()
-            if type(firstitem[1]) is OrderedDict: # or type(firstitem[1]) is dict:
-                node_ordered_list.append( [firstitem[1], firstitem[0]] )
-                for item,value in reversed(firstitem[1].items()):
-                    dwalk.append([firstitem[1],value,firstitem[0]])
-            elif type(firstitem[1]) is dict:
-                node_ordered_list.append( [firstitem[1], firstitem[0]] )
-                for item,value in firstitem[1].items():
-                    dwalk.append([firstitem[1],value,firstitem[0]])
-            else:
-                pass
+        if isinstance( dct, dict ):
+            node_ordered_list = self.unroll( dct )
+        else:
+            node_ordered_list = dct
 
         # We are checking the __must_sync__ flag. Since this routine will throw
         # away unsync'd nodes, due to the fact that it reads from the FDT
@@ -4248,7 +5710,7 @@ class LopperTree:
         # only if this check and exit starts catching valid use cases we can't fix
         if self.__must_sync__:
             lopper.log._error( f"tree should be sync'd before loading. Some nodes may be lost" )
-            lopper.log._debug( f"     caller: {sys._getframe(1).f_lineno}/{sys._getframe(1).f_code.co_name}" )
+            lopper.log._debug( lambda: f"     caller: {sys._getframe(1).f_lineno}/{sys._getframe(1).f_code.co_name}" )
             sys.exit(1)
 
         if self.depth_first:
@@ -4267,56 +5729,14 @@ class LopperTree:
             self.__lnodes__ = OrderedDict()
             # nodes. indexed by alias
             self.__aliases__ = OrderedDict()
+            # nodes, indexed by compatible string
+            self.__cnodes__ = OrderedDict()
+            # properties, indexed by reference. The index (if built) is kept,
+            # and is updated as the nodes are loaded
 
-            lopper.log._debug( f"tree load start: {self}" )
-
-            for n_item in node_ordered_list:
-                node_in = n_item[0]
-                node_in_parent = n_item[1]
-                node_path = node_in['__path__']
-                abs_path = node_path
-                nn =  node_in['__fdt_number__']
-                try:
-                    # we try and re-use the node if possible, since that keeps
-                    # old references valid for adding more properties, etc
-                    node = nodes_saved[abs_path]
-                except:
-                    # node didn't exist before, create it as something new
-                    node = LopperNode( nn, "", self )
-                    node.indent_char = self.indent_char
-
-                # special node processing
-                if abs_path == "/memreserve":
-                    lopper.log._debug( f"tree load: memreserve found: {node_in['__memreserve__']}" )
-                    self.__memreserve__ = node_in["__memreserve__"]
-                    continue
-
-                node.__dbg__ = self.__dbg__
-
-                # resolve the details against the dictionary
-                node.load( node_in, node_in_parent['__path__'] )
-
-                try:
-                    node_check = self.__nodes__[node.abs_path]
-                    if node_check:
-                        lopper.log._error( f"tree inconsistency found, two nodes with the same path ({node_check.abs_path})" )
-                        node_check.print()
-                        # we need to exit the thread/backgound call AND the entire application, so
-                        # hit is with a hammer.
-                        os._exit(1)
-                except:
-                    pass
-
-                # we want to find these by name AND number (but note, number can
-                # change after some tree ops, so make sure to check the state of
-                # a tree/node before using the number
-                self.__nodes__[node.abs_path] = node
+            lopper.log._debug( lambda: f"tree load start: {self}" )
 
-                self.__nnodes__[node.number] = node
-                if node.phandle > 0:
-                    self.__pnodes__[node.phandle] = node
-                if node.label:
-                    self.__lnodes__[node.label] = node
+            self.load_nodes( node_ordered_list, nodes_saved )
 
             for node_abs_path in nodes_saved:
                 # invalidate nodes, in case someone is holding a reference
@@ -4326,65 +5746,446 @@ class LopperTree:
                 except:
                     # the node didn't get copied over, invalidate the state
                     nodes_saved[node_abs_path].__nstate__ = "*invalid*"
+                    for p in nodes_saved[node_abs_path].__props__.values():
+                        self.reference_index_remove( p )
+
+            self.alias_setup()
+
+            self.__addr_index__ = None
+            self.__path_trie__ = None
+            self.__phandle_generation__ += 1
+
+            # everything has just been loaded, there's nothing left for
+            # sync() to reload
+            self.__modified_nodes__ = OrderedDict()
+            self.__topology_modified__ = False
+        else:
+            # breadth first. not currently implemented
+            pass
+
+    def unroll( self, dct ):
+        """unroll an exported dictionary into an ordered list of nodes
+
+        The dictionary format is a series of nested dicts representing nodes
+        and properties. We'd rather not recurse to do our processing, so we
+        unroll the recursion into an ordered (depth first) list of nodes.
+
+        Args:
+           dct (Dictionary): dictionary from a lopper.fdt export, or a tree export
+
+        Returns:
+           list: of [ node dictionary, parent node dictionary ] pairs
+
+        """
+        # we have a list of: containing dict, value, parent
+        dwalk = [ [dct,dct,None]  ]
+        node_ordered_list = []
+        while dwalk:
+            firstitem = dwalk.pop()
+            if type(firstitem[1]) is OrderedDict: # or type(firstitem[1]) is dict:
+                node_ordered_list.append( [firstitem[1], firstitem[0]] )
+                for item,value in reversed(firstitem[1].items()):
+                    dwalk.append([firstitem[1],value,firstitem[0]])
+            elif type(firstitem[1]) is dict:
+                node_ordered_list.append( [firstitem[1], firstitem[0]] )
+                for item,value in firstitem[1].items():
+                    dwalk.append([firstitem[1],value,firstitem[0]])
+            else:
+                pass
+
+        return node_ordered_list
+
+    def load_nodes( self, node_ordered_list, nodes_saved, parent_path = None ):
+        """load a list of node dictionaries into the tree
+
+        Each node dictionary is loaded into a LopperNode (re-using the node
+        from nodes_saved if one exists at the same path) and the node is
+        registered in the tree's path, number, phandle and label dictionaries.
+
+        Args:
+           node_ordered_list (list): [ node dictionary, parent dictionary ] pairs,
+                                     as returned by unroll()
+           nodes_saved (dict): existing nodes, indexed by path
+           parent_path (string,optional): parent path of the first node in the
+                                          list. If not passed, the path of the
+                                          parent dictionary is used.
+
+        Returns:
+           list (LopperNode): the loaded nodes
+
+        """
+        loaded_nodes = []
+        for i,n_item in enumerate(node_ordered_list):
+            node_in = n_item[0]
+            node_in_parent = n_item[1]
+            node_path = node_in['__path__']
+            abs_path = node_path
+            nn =  node_in['__fdt_number__']
+            try:
+                # we try and re-use the node if possible, since that keeps
+                # old references valid for adding more properties, etc
+                node = nodes_saved[abs_path]
+            except:
+                # node didn't exist before, create it as something new
+                node = LopperNode( nn, "", self )
+                node.indent_char = self.indent_char
+
+            # special node processing
+            if abs_path == "/memreserve":
+                lopper.log._debug( lambda: f"tree load: memreserve found: {node_in['__memreserve__']}" )
+                self.__memreserve__ = node_in["__memreserve__"]
+                continue
+
+            node.__dbg__ = self.__dbg__
+
+            if i == 0 and parent_path != None:
+                node_parent_path = parent_path
+            else:
+                node_parent_path = node_in_parent['__path__']
+
+            # resolve the details against the dictionary
+            node.load( node_in, node_parent_path )
 
-            # setup aliases
             try:
-                alias_node = self.__nodes__["/aliases"]
-                lopper.log._debug( f"aliases node found, registering aliases" )
-                for alias in alias_node:
-                    lopper.log._debug( f"alias: {alias.name} {alias.value[0]}" )
+                node_check = self.__nodes__[node.abs_path]
+                if node_check and node_check is not node:
+                    lopper.log._error( f"tree inconsistency found, two nodes with the same path ({node_check.abs_path})" )
+                    node_check.print()
+                    # we need to exit the thread/backgound call AND the entire application, so
+                    # hit is with a hammer.
+                    os._exit(1)
+            except:
+                pass
+
+            # we want to find these by name AND number (but note, number can
+            # change after some tree ops, so make sure to check the state of
+            # a tree/node before using the number
+            self.__nodes__[node.abs_path] = node
+            self.__path_trie__ = None
+            self.__phandle_generation__ += 1
+
+            self.__nnodes__[node.number] = node
+            if node.phandle > 0:
+                self.__pnodes__[node.phandle] = node
+            if node.label:
+                self.__lnodes__[node.label] = node
+
+            loaded_nodes.append( node )
+
+        return loaded_nodes
+
+    def index_nodes( self, nodes ):
+        """set the path, number, phandle and label dictionaries of a tree
+
+        The dictionaries are replaced with ones that contain (only) the
+        passed nodes, in the passed order.
+
+        Args:
+           nodes (list): the LopperNodes to index, in tree order
+
+        Returns:
+           Nothing
+
+        """
+        self.__nodes__ = OrderedDict()
+        self.__nnodes__ = OrderedDict()
+        self.__pnodes__ = OrderedDict()
+        self.__lnodes__ = OrderedDict()
+        for node in nodes:
+            self.__nodes__[node.abs_path] = node
+            self.__nnodes__[node.number] = node
+            if node.phandle > 0:
+                self.__pnodes__[node.phandle] = node
+            if node.label:
+                self.__lnodes__[node.label] = node
+
+        self.__path_trie__ = None
+        self.__phandle_generation__ += 1
+
+    def alias_setup( self ):
+        """register the aliases of a tree
+
+        Looks for an /aliases node, and registers the target of each
+        alias, so they can be found via alias_node()
+
+        Args:
+           None
+
+        Returns:
+           Nothing
+
+        """
+        self.__aliases__ = OrderedDict()
+        try:
+            alias_node = self.__nodes__["/aliases"]
+            lopper.log._debug( "aliases node found, registering aliases" )
+            for alias in alias_node:
+                lopper.log._debug( lambda: f"alias: {alias.name} {alias.value[0]}" )
+                try:
+                    alias_target = self.__nodes__[ alias.value[0] ]
+                except Exception as e:
+                    alias_target = None
+
+                    # TODO: this should be moved to a generic lookup routine so
+                    #       it can be used everywhere for label path based lookups
+                    # was the first component a label ?
+                    components = alias.value[0].split('/')
                     try:
-                        alias_target = self.__nodes__[ alias.value[0] ]
-                    except Exception as e:
-                        alias_target = None
+                        base_component = components[1]
+                    except:
+                        base_component = None
 
-                        # TODO: this should be moved to a generic lookup routine so
-                        #       it can be used everywhere for label path based lookups
-                        # was the first component a label ?
-                        components = alias.value[0].split('/')
+                    label_node = None
+                    if base_component:
                         try:
-                            base_component = components[1]
+                            label_node = self.__lnodes__[base_component]
                         except:
-                            base_component = None
+                            pass
 
-                        label_node = None
-                        if base_component:
-                            try:
-                                label_node = self.__lnodes__[base_component]
-                            except:
-                                pass
+                    if label_node:
+                        label_chunk, _, rest = alias.value[0].partition( base_component )
+                        label_adjusted_path = label_node.abs_path + rest
+                        lopper.log._debug( lambda: f"alias: looking for node via label path: {label_adjusted_path}" )
+                        try:
+                            alias_target = self.__nodes__[ label_adjusted_path ]
+                        except:
+                            alias_target = None
+
+                if alias_target:
+                    lopper.log._debug( lambda: f"alias target node found: {alias_target.abs_path}" )
+                    self.__aliases__[alias.name] = alias_target
+        except:
+            pass
+
+    def reindex( self ):
+        """rebuild the node dictionaries of a tree
+
+        Walks the nodes of the tree (depth first, from the root) and rebuilds
+        the path, number, phandle, label, compatible and alias dictionaries in
+        tree order.
+        No nodes are exported or loaded, so this is much cheaper than a full
+        load, and is used by sync() when nodes have been added, removed or
+        moved.
+
+        Nodes that are no longer reachable from the root are invalidated.
+
+        Args:
+           None
+
+        Returns:
+           Nothing
+
+        """
+        nodes_saved = self.__nodes__
+
+        self.__nodes__ = OrderedDict()
+        self.__nnodes__ = OrderedDict()
+        self.__pnodes__ = OrderedDict()
+        self.__lnodes__ = OrderedDict()
+        self.__cnodes__ = OrderedDict()
+
+        try:
+            root = nodes_saved["/"]
+        except:
+            root = None
+
+        nwalk = [ root ] if root else []
+        while nwalk:
+            node = nwalk.pop()
+            self.__nodes__[node.abs_path] = node
+            self.__nnodes__[node.number] = node
+            if node.phandle > 0:
+                self.__pnodes__[node.phandle] = node
+            if node.label:
+                self.__lnodes__[node.label] = node
+            self.compatible_index_add( node )
 
-                        if label_node:
-                            label_chunk, _, rest = alias.value[0].partition( base_component )
-                            label_adjusted_path = label_node.abs_path + rest
-                            lopper.log._debug( f"alias: looking for node via label path: {label_adjusted_path}" )
-                            try:
-                                alias_target = self.__nodes__[ label_adjusted_path ]
-                            except:
-                                alias_target = None
-
-                    if alias_target:
-                        lopper.log._debug( f"alias target node found: {alias_target.abs_path}" )
-                        self.__aliases__[alias.name] = alias_target
+            # the properties are kept across a reindex, so the reference index
+            # is only updated for nodes that are new to the tree
+            if nodes_saved.get( node.abs_path ) is not node:
+                for p in node.__props__.values():
+                    self.reference_index_add( p )
+
+            nwalk.extend( reversed(node.child_nodes.values()) )
+
+        for node_abs_path,node in nodes_saved.items():
+            try:
+                if self.__nodes__[node.abs_path] is node:
+                    continue
             except:
                 pass
-        else:
-            # breadth first. not currently implemented
-            pass
+
+            # the node didn't make it into the new dictionaries, invalidate
+            # the state in case someone is holding a reference
+            if node.__nstate__ == "resolved":
+                node.__nstate__ = "*invalid*"
+            for p in node.__props__.values():
+                self.reference_index_remove( p )
+
+        self.alias_setup()
+
+        self.__addr_index__ = None
+        self.__path_trie__ = None
+        self.__phandle_generation__ += 1
+
+    # snapshot file: magic, format version, key length, digest length, key,
+    # digest, pickled tree. bump the version if the format (or the tree
+    # layout) changes
+    snapshot_magic = b'LOPTREE\0'
+    snapshot_version = 2
+    snapshot_header = '>8sIII'
+
+    @staticmethod
+    def snapshot_digest( secret, key_bytes, payload ):
+        """Calculate the digest (HMAC) of a snapshot
+
+        Args:
+           secret (bytes): the secret key of the HMAC
+           key_bytes (bytes): the key of the snapshot
+           payload (bytes-like): the pickled tree
+
+        Returns:
+           bytes: the digest
+        """
+        h = hmac.new( secret, digestmod=hashlib.sha256 )
+        h.update( key_bytes )
+        h.update( payload )
+
+        return h.digest()
+
+    def snapshot_write( self, filename, key = "", secret = None ):
+        """Write a snapshot of the tree to a file
+
+        The snapshot holds the fully loaded and resolved tree, including the
+        node indexes (phandle, label, alias, etc) and property type hints, so
+        it can be restored with snapshot_read() without exporting, loading
+        or resolving again.
+
+        Lazily loaded properties are decoded before the snapshot is written.
+        Callbacks, iteration state and the dictionaries the tree was loaded
+        from are not part of the snapshot.
+
+        If a secret is passed, an HMAC of the snapshot is stored with it.
+        Restoring a snapshot unpickles it, so a snapshot that may have been
+        tampered with must be read with the same secret (see snapshot_read()).
+
+        Args:
+           filename (string): the snapshot file
+           key (string,optional): identifies the inputs of the tree, it must
+                                  match when the snapshot is read
+           secret (bytes,optional): the secret key used to authenticate the
+                                    snapshot
+
+        Returns:
+           bool: True if the snapshot was written, False otherwise
+        """
+        for n in self.__nodes__.values():
+            for p in n.__props__.values():
+                p.decode()
+
+        tree_saved = {}
+        for a in [ "start_tree_cb", "start_node_cb", "end_node_cb", "end_tree_cb",
+                   "property_cb", "__node_iter__", "__rnodes__", "__addr_cache__",
+                   "__exec_cache__", "__preorder__" ]:
+            tree_saved[a] = self.__dict__[a]
+
+        try:
+            for a in [ "start_tree_cb", "start_node_cb", "end_node_cb", "end_tree_cb", "property_cb" ]:
+                self.__dict__[a] = ""
+            self.__dict__["__node_iter__"] = None
+            # the reference index is rebuilt on demand, and cached
+            # addresses are indexed by node id
+            self.__dict__["__rnodes__"] = None
+            self.__dict__["__addr_cache__"] = {}
+            # code block namespaces hold modules, and are prepared on demand
+            self.__dict__["__exec_cache__"] = OrderedDict()
+            # the node order is indexed by node id
+            self.__dict__["__preorder__"] = None
+
+            key_bytes = key.encode()
+            snapshot = pickle.dumps( self, protocol=pickle.HIGHEST_PROTOCOL )
+        except Exception as e:
+            _warning( f"tree snapshot: unable to snapshot the tree: {e}" )
+            return False
+        finally:
+            self.__dict__.update( tree_saved )
+
+        digest = b''
+        if secret:
+            digest = LopperTree.snapshot_digest( secret, key_bytes, snapshot )
+
+        try:
+            with open( filename, 'wb' ) as f:
+                f.write( struct.pack( LopperTree.snapshot_header, LopperTree.snapshot_magic,
+                                      LopperTree.snapshot_version, len(key_bytes), len(digest) ) )
+                f.write( key_bytes )
+                f.write( digest )
+                f.write( snapshot )
+        except OSError as e:
+            _warning( f"tree snapshot: unable to write {filename}: {e}" )
+            return False
+
+        return True
+
+    @staticmethod
+    def snapshot_read( filename, key = "", secret = None ):
+        """Read a tree from a snapshot file
+
+        The file is mapped (not read) and the tree is restored directly
+        from the mapping. See snapshot_write().
+
+        If a secret is passed, the snapshot is only restored if its HMAC
+        matches, which is checked before anything is unpickled.
+
+        Args:
+           filename (string): the snapshot file
+           key (string,optional): the key of the snapshot (see snapshot_write())
+           secret (bytes,optional): the secret key used to authenticate the
+                                    snapshot
+
+        Returns:
+           LopperTree: the restored tree, or None if the snapshot does not
+                       exist, is of a different version, has a different key
+                       or is not authentic
+        """
+        try:
+            with open( filename, 'rb' ) as f:
+                with mmap.mmap( f.fileno(), 0, access=mmap.ACCESS_READ ) as mm:
+                    header_len = struct.calcsize( LopperTree.snapshot_header )
+                    magic, version, key_len, digest_len = struct.unpack_from( LopperTree.snapshot_header, mm, 0 )
+                    if magic != LopperTree.snapshot_magic or \
+                       version != LopperTree.snapshot_version:
+                        _debug( lambda: f"tree snapshot: {filename} is not a (version {LopperTree.snapshot_version}) snapshot" )
+                        return None
+
+                    key_bytes = mm[header_len:header_len + key_len]
+                    if key_bytes != key.encode():
+                        _debug( lambda: f"tree snapshot: {filename} key does not match" )
+                        return None
+
+                    digest = mm[header_len + key_len:header_len + key_len + digest_len]
+                    with memoryview( mm ) as mv, mv[header_len + key_len + digest_len:] as payload:
+                        if secret and \
+                           not hmac.compare_digest( digest, LopperTree.snapshot_digest( secret, key_bytes, payload ) ):
+                            _warning( f"tree snapshot: {filename} is not authentic, ignoring it" )
+                            return None
+
+                        tree = pickle.loads( payload )
+        except Exception as e:
+            _debug( lambda: f"tree snapshot: unable to read {filename}: {e}" )
+            return None
+
+        return tree
 
     def next(self):
         """Returns the next node in a tree iteration
 
         This method maintains the iteration state of a tree and returns
-        the next LopperNode in the iteration.
-
-        Three types of iterations are common:
+        the next LopperNode in the iteration. See iteration_nodes() for the
+        types of iterations.
 
-          - full iteration: a depth first walk of every node in the tree
-          - subnode iteration: a depth first walk of all nodes under a given
-                               starting point
-          - startnode iteration: A depth first walk starting at a given node
-                                 and continuing to the end of the tree
+        Note: iterating the tree (i.e. "for n in tree") does not use or
+        modify this state.
 
         Args:
            None
@@ -4398,24 +6199,8 @@ class LopperTree:
         if self.__new_iteration__:
             self.__new_iteration__ = False
 
-            child_nodes = self.subnodes( self.__nodes__[ "/"] )
-            self.__node_iter__ = iter( child_nodes )
-
-            if self.__current_node__ == "/" and self.__start_node__ == "/":
-                # just get the first node out of the default iterator
-                node = next(self.__node_iter__)
-            elif self.__start_node__ != "/":
-                # this is a starting node, so we fast forward and then use
-                # the default iterator
-                node = next(self.__node_iter__)
-                while node and node.abs_path != self.__start_node__:
-                    node = next(self.__node_iter__)
-            else:
-                # non-zero current_node, that means we'll do a custom iteration
-                # of only the nodes that are underneath of the set current_node
-                child_nodes = self.subnodes( self.__nodes__[self.__current_node__] )
-                self.__node_iter__ = iter( child_nodes )
-                node = next(self.__node_iter__)
+            self.__node_iter__ = iter( self.iteration_nodes() )
+            node = next(self.__node_iter__)
         else:
             if self.depth_first:
                 try:
@@ -4642,5 +6427,10 @@ class LopperTreePrinter( LopperTree ):
             Nothing
         """
 
-        if self.output != sys.stdout:
+        if type(self.output) != str:
+            output_name = self.output.name
+        else:
+            output_name = ""
+
+        if self.output != sys.stdout and output_name != '<stdout>':
             self.output.close()
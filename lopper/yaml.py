@@ -109,7 +109,7 @@ class LopperTreeImporter(object):
 
                 if decode:
                     try:
-                        _debug( f"LopperTreeImporter: json load for prop {p} : {node.__props__[p].value}" )
+                        _debug( lambda: f"LopperTreeImporter: json load for prop {p} : {node.__props__[p].value}" )
 
                         decode_val = ""
                         val = []
@@ -218,12 +218,12 @@ class LopperDictExporter(DictExporter):
                 # if there are children returned, we merge them into a single dictionary, so
                 # that output can represent them as child nodes of the current one (see how
                 # we return data)
-                _debug( f"node: {name} has children: {children}" )
+                _debug( lambda: f"node: {name} has children: {children}" )
 
                 new_dict = {}
                 #for c in reversed(children):
                 for c in children:
-                    _debug( f"        merging dict: {c}" )
+                    _debug( lambda: f"        merging dict: {c}" )
                     new_dict.update( c )
 
                 data.update( new_dict )
@@ -279,8 +279,8 @@ class LopperDictImporter(object):
         attrs = dict(data)
         verbose = 0
 
-        _debug( f"===> __import ({name})" )
-        _debug( f"            attrs: {attrs}" )
+        _debug( lambda: f"===> __import ({name})" )
+        _debug( lambda: f"            attrs: {attrs}" )
 
         if name:
             attrs['name'] = name
@@ -297,7 +297,7 @@ class LopperDictImporter(object):
                 cdict['name'] = k
                 cdict['fdt_name'] = k
 
-                _debug( f"      queuing child from dict node: name: {k} props: {cdict}" )
+                _debug( lambda: f"      queuing child from dict node: name: {k} props: {cdict}" )
 
                 children.append( cdict )
                 # queue it for removal, since we don't want the child attributes to be
@@ -367,7 +367,7 @@ class LopperDictImporter(object):
                 first_val = attrs[first_key]
                 attrs['name'] = first_val
 
-        _debug( f"      creating node with attrs: {attrs}" )
+        _debug( lambda: f"      creating node with attrs: {attrs}" )
 
         node = self.nodecls(parent=parent, **attrs)
         for child in children:
@@ -517,7 +517,7 @@ class LopperJSON():
 
             props = self.props( node )
             for p in props:
-                _debug( f" prop: {p} ({props[p]})" )
+                _debug( lambda: f" prop: {p} ({props[p]})" )
 
                 if serialize_json:
                     use_json = False
@@ -607,13 +607,13 @@ class LopperJSON():
                 # "<<*" is a node extended expand
                 expand_string = "<<+"
                 if p.name == "<<*":
-                    _debug( f"node extension <<* detected in node {p.node.abs_path}" )
+                    _debug( lambda: f"node extension <<* detected in node {p.node.abs_path}" )
                     # to make the standard processing work below, we upgrade the
                     # property to json formatted if it already isn't
                     expand_string = "<<*"
                     if p.pclass != "json":
                         p.pclass = "json"
-                        p.__dict__["value"] = json.dumps(p.value)
+                        object.__setattr__( p, "value", json.dumps(p.value) )
 
                     # we could do special processing here, with merging, etc, but
                     # for now, we'll just leave it as a placeholder, since it is
@@ -624,23 +624,23 @@ class LopperJSON():
                     #         print( "[DBG]: target found, pulling properties" )
 
                 if p.pclass == "json":
-                    _debug( f"json: {p.value} (len: {len(p)})" )
+                    _debug( lambda: f"json: {p.value} (len: {len(p)})" )
                     extension_found = False
                     for x in range(0, len(p)):
                         try:
                             m_val = p[x][expand_string]
                             extension_found = True
-                            _debug( f"found extension marker: {m_val}" )
+                            _debug( lambda: f"found extension marker: {m_val}" )
                         except:
                             pass
 
                     if not extension_found:
                         if p.name == expand_string:
                             extension_found = True
-                            _debug( f"found extension name ({expand_string})" )
+                            _debug( lambda: f"found extension name ({expand_string})" )
 
                     for x in range(0, len(p)):
-                        _debug( f"     [{x}] chunk: {p[x]} ({type(p[x])})" )
+                        _debug( lambda: f"     [{x}] chunk: {p[x]} ({type(p[x])})" )
                         try:
                             # an exception is raised if the chunk doesn't have an index
                             # with <<+, so everything below can assume this is true.
@@ -785,7 +785,7 @@ class LopperJSON():
                     # we've finished looping through all the json chunks
                     if new_list and extension_found:
                         # we do this to avoid the wrapping routines in LopperProperty
-                        p.__dict__["value"] = json.dumps(new_list)
+                        object.__setattr__( p, "value", json.dumps(new_list) )
                         p.resolve( False )
 
             # we've finished looping through all the properties
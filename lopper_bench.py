@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+
+#/*
+# * Copyright (c) 2020 Xilinx Inc. All rights reserved.
+# *
+# * SPDX-License-Identifier: BSD-3-Clause
+# */
+
+# Benchmarks of lopper tree operations.
+#
+# The benchmarks only use interfaces that predate the changes they measure,
+# so the results can be compared against an older revision by running the
+# script from a checkout of that revision, i.e.:
+#
+#   % git worktree add /tmp/lopper-old <revision>
+#   % cp lopper_bench.py /tmp/lopper-old
+#   % python3 /tmp/lopper-old/lopper_bench.py --all
+#   % python3 ./lopper_bench.py --all
+
+import sys
+import os
+import gc
+import copy
+import time
+import getopt
+import tracemalloc
+import tempfile
+
+import lopper
+import lopper.dt
+import lopper.log
+from lopper import LopperSDT
+from lopper.tree import LopperTree
+
+def bench_load( sdt_file ):
+    """Load a system device tree, without libfdt
+
+    Args:
+        sdt_file (string): the system device tree
+
+    Returns:
+        LopperTree: the loaded tree
+    """
+    device_tree = LopperSDT( sdt_file )
+    device_tree.use_libfdt = False
+    device_tree.verbose = 0
+    device_tree.setup( sdt_file, [], "", True, libfdt = False )
+    device_tree.cleanup()
+
+    return device_tree.tree
+
+def bench_report( name, seconds ):
+    print( "[BENCH]: %-40s %8.1fms" % (name, seconds * 1000) )
+
+def bench_tree( tree, count ):
+    """Tree storage: memory of loaded trees, and attribute access
+
+    'count' copies of the tree are loaded (from its export), and the memory
+    they keep allocated is reported. The name and value of every property,
+    and the path and tree of its node, are then read (ten times).
+    """
+    tree_dict = tree.export()
+
+    gc.collect()
+    tracemalloc.start()
+    trees = []
+    for i in range(count):
+        t = LopperTree()
+        t.load( copy.deepcopy( tree_dict ) )
+        trees.append( t )
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print( "[BENCH]: %-40s %8.2fMB" % ("%s tree loads, allocated" % count, current / 1e6) )
+
+    start = time.perf_counter()
+    for i in range(10):
+        for t in trees:
+            # the node and property dictionaries are walked directly, so the
+            # cost of the tree iterators isn't included
+            for n in t.__nodes__.values():
+                for p in n.__props__.values():
+                    p.name
+                    p.value
+                    n.abs_path
+                    n.tree
+    bench_report( "10 x %s tree attribute walks" % count, time.perf_counter() - start )
+
+def bench_address( tree, count ):
+    """Address translation: translate the address of every node
+
+    The unit address of every node (with one) is translated to a cpu
+    address, 'count' times.
+    """
+    nodes = [ n for n in tree.__nodes__.values() if "@" in n.name ]
+
+    start = time.perf_counter()
+    for i in range(count):
+        for n in nodes:
+            n.address()
+    bench_report( "%s x %s node address translations" % (count, len(nodes)),
+                  time.perf_counter() - start )
+
+def bench_log( tree, count ):
+    """Logging: tree operations with debug messages, at the default log level
+
+    The tree is loaded (from its export) 'count' times, and its address
+    index is rebuilt 'count' times. Neither outputs anything at the default
+    log level, but both pass through debug messages.
+    """
+    tree_dict = tree.export()
+
+    start = time.perf_counter()
+    for i in range(count):
+        t = LopperTree()
+        t.load( copy.deepcopy( tree_dict ) )
+    bench_report( "%s tree loads" % count, time.perf_counter() - start )
+
+    start = time.perf_counter()
+    for i in range(count):
+        t.__addr_index__ = None
+        t.addr_index()
+    bench_report( "%s address index rebuilds" % count, time.perf_counter() - start )
+
+def bench_lops( sdt_file, count ):
+    """Lops: execute a lop file of 'count' modify lops
+
+    Each lop adds a property to /cpus. They are followed by a code lop and
+    a print lop, so the lookup of more than one lop type is exercised.
+    """
+    with tempfile.TemporaryDirectory() as lops_dir:
+        lop_file = lops_dir + "/lops-bench.dts"
+        with open( lop_file, "w" ) as w:
+            w.write( "/dts-v1/;\n\n/ {\n" )
+            w.write( "        compatible = \"system-device-tree-v1\";\n" )
+            w.write( "        lops {\n" )
+            for i in range(count):
+                w.write( "                lop_%s {\n" % i )
+                w.write( "                        compatible = \"system-device-tree-v1,lop,modify\";\n" )
+                w.write( "                        modify = \"/cpus:lopper-bench-%s:%s\";\n" % (i,i) )
+                w.write( "                };\n" )
+            w.write( """\
+                lop_code {
+                        compatible = "system-device-tree-v1,lop,code-v1";
+                        code = "return True";
+                };
+                lop_print {
+                        compatible = "system-device-tree-v1,lop,print-v1";
+                        print = "done";
+                };
+        };
+};
+""" )
+
+        device_tree = LopperSDT( sdt_file )
+        device_tree.use_libfdt = False
+        device_tree.verbose = 0
+        device_tree.dryrun = False
+        device_tree.outdir = lops_dir
+        device_tree.setup( sdt_file, [lop_file], "", True, libfdt = False )
+
+        start = time.perf_counter()
+        device_tree.perform_lops()
+        bench_report( "%s modify lops" % count, time.perf_counter() - start )
+
+        device_tree.cleanup()
+
+def usage():
+    prog = os.path.basename(sys.argv[0])
+    print('Usage: %s [OPTION] [<system device tree>]' % prog)
+    print('  -t, --tree          run the tree storage benchmark' )
+    print('  -a, --address       run the address translation benchmark' )
+    print('  -l, --log           run the logging benchmark' )
+    print('  -o, --lops          run the lop execution benchmark' )
+    print('    , --all           run all benchmarks' )
+    print('  -n, --count         number of iterations (default: 5, 20 for translations, 1500 lops)' )
+    print('  -h, --help          display this help and exit')
+    print('')
+    print('The default system device tree is demos/openamp/inputs/dt/host-device-tree.dts')
+    print('')
+
+def main():
+    tree = False
+    address = False
+    log = False
+    lops = False
+    count = None
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "taolhn:", [ "tree", "address", "log", "lops", "all", "count=", "help" ])
+    except getopt.GetoptError as err:
+        print('%s' % str(err))
+        usage()
+        sys.exit(2)
+
+    for o, a in opts:
+        if o in ('-h', '--help'):
+            usage()
+            sys.exit(0)
+        elif o in ('-t', '--tree'):
+            tree = True
+        elif o in ('-a', '--address'):
+            address = True
+        elif o in ('-l', '--log'):
+            log = True
+        elif o in ('-o', '--lops'):
+            lops = True
+        elif o in ('--all'):
+            tree = True
+            address = True
+            log = True
+            lops = True
+        elif o in ('-n', '--count'):
+            count = int(a)
+
+    if not tree and not address and not log and not lops:
+        usage()
+        sys.exit(1)
+
+    if args:
+        sdt_file = args[0]
+    else:
+        sdt_file = os.path.join( os.path.dirname( os.path.realpath( __file__ ) ),
+                                 "demos/openamp/inputs/dt/host-device-tree.dts" )
+
+    lopper.log.init( 0 )
+    lopper.lopper_type( lopper.dt.LopperDT )
+
+    sdt = bench_load( sdt_file )
+
+    if tree:
+        bench_tree( sdt, count or 5 )
+
+    if address:
+        bench_address( sdt, count or 20 )
+
+    if log:
+        bench_log( sdt, count or 5 )
+
+    if lops:
+        bench_lops( sdt_file, count or 1500 )
+
+if __name__ == "__main__":
+    main()
@@ -16,6 +16,7 @@ import os
 import re
 import shutil
 import filecmp
+import subprocess
 from pathlib import Path
 from pathlib import PurePath
 import tempfile
@@ -345,6 +346,32 @@ def setup_code_lops( outdir ):
                                ";
                       };
                 };
+                lop_15_2_1 {
+                      compatible = "system-device-tree-v1,lop,conditional-v1";
+                      cond_root = "cpus";
+                      cond_select = "/cpus/cpu@.*";
+                      cpus {
+                           cpu@ {
+                               compatible = ".*invalid-proc-72.*";
+                           };
+                      };
+                      false {
+                           compatible = "system-device-tree-v1,lop,code-v1";
+                           code = "
+                               return True
+                               ";
+                           // not a false block, and below a conditional, it is
+                           // never executed
+                           nested {
+                                compatible = "system-device-tree-v1,lop,code-v1";
+                                code = "
+                                    print( '[ERROR] nested lop of a false conditional executed' )
+
+                                    return True
+                                    ";
+                           };
+                      };
+                };
                 lop_15_3 {
                       compatible = "system-device-tree-v1,lop,conditional-v1";
                       cond_root = "cpus";
@@ -532,6 +559,26 @@ def setup_code_lops( outdir ):
                               print( 'selected2: %s' % s.abs_path )
                       ";
                 };
+                lop_17_6 {
+                      compatible = "system-device-tree-v1,lop,select-v1";
+                      // clear any old selections
+                      select_1;
+                };
+                lop_17_7 {
+                      compatible = "system-device-tree-v1,lop,code-v1";
+                      // executed once, over the nodes under the start node. The
+                      // returned nodes are selected for the follow up lops
+                      batch;
+                      options = "start_node:/cpus";
+                      code = "
+                          return [ n for n in nodes if n.name.startswith( 'cpu@' ) ]
+                      ";
+                };
+                lop_17_8 {
+                      compatible = "system-device-tree-v1,lop,output";
+                      // no nodes, the selected nodes are written
+                      outfile = "batch-cpus.dts";
+                };
         };
 };
             """)
@@ -567,6 +614,51 @@ def setup_assist_lops( outdir ):
 
     return outdir + "/lops-assists.dts"
 
+def setup_jobs_lops( outdir ):
+    with open( outdir + "/lops-jobs.dts", "w") as w:
+            w.write("""\
+/dts-v1/;
+
+/ {
+        compatible = "system-device-tree-v1";
+        lops {
+                // independent outputs, executed concurrently with -j
+                lop_0 {
+                        compatible = "system-device-tree-v1,lop,output";
+                        outfile = "jobs-cpus.dts";
+                        nodes = "cpus";
+                };
+                lop_1 {
+                        compatible = "system-device-tree-v1,lop,output";
+                        outfile = "jobs-amba.dts";
+                        nodes = ".*amba.*";
+                };
+                lop_2 {
+                        compatible = "system-device-tree-v1,lop,output";
+                        outfile = "jobs-all.dts";
+                        nodes = "*";
+                };
+                // conflicts with the outputs around it
+                lop_3 {
+                        compatible = "system-device-tree-v1,lop,modify";
+                        modify = "/cpus/cpu@0:jobs-prop:<0x1>";
+                };
+                lop_4 {
+                        compatible = "system-device-tree-v1,lop,output";
+                        outfile = "jobs-cpus-modified.dts";
+                        nodes = "cpus";
+                };
+                lop_5 {
+                        compatible = "system-device-tree-v1,lop,output";
+                        outfile = "jobs-memory.dts";
+                        nodes = "memory@.*";
+                };
+        };
+};
+            """)
+
+    return outdir + "/lops-jobs.dts"
+
 
 def setup_device_tree( outdir ):
     with open( outdir + "/tester.dts", "w") as w:
@@ -1464,6 +1556,49 @@ def tree_sanity_test( fdt, verbose=0 ):
 
     print( "[TEST]: end: subnode calls\n" )
 
+    print( "[TEST]: start: lazy walk" )
+    walked = [ n.abs_path for n in printer.walk( "/amba" ) ]
+    subnodes = [ n.abs_path for n in printer['/amba'].subnodes() ]
+    if verbose:
+        print( "/amba walk: %s" % walked )
+    if walked == subnodes:
+        test_passed( "walk matches subnodes" )
+    else:
+        test_failed( "walk matches subnodes (%s vs %s)" % (walked,subnodes))
+
+    walked = [ n.abs_path for n in printer.walk( "/", max_depth = 1, children_only = True ) ]
+    if verbose:
+        print( "/ walk, max depth 1: %s" % walked )
+    expected = [ "/cpus", "/amba", "/amba_apu", "/domains", "/memory@00000000",
+                 "/tcm", "/ethernet0", "/aliases" ]
+    if walked == expected:
+        test_passed( "walk max depth" )
+    else:
+        test_failed( "walk max depth (%s vs %s)" % (walked,expected))
+
+    walked = [ n.abs_path for n in printer.walk( "/amba_apu",
+                                                 prune = lambda n: n.name.startswith( "interrupt-controller" ) ) ]
+    if verbose:
+        print( "/amba_apu walk, interrupt controllers pruned: %s" % walked )
+    expected = [ "/amba_apu", "/amba_apu/interrupt-controller@f9000000",
+                 "/amba_apu/interrupt-controller@f9f00000", "/amba_apu/smmu@fd800000",
+                 "/amba_apu/timer" ]
+    if walked == expected:
+        test_passed( "walk prune" )
+    else:
+        test_failed( "walk prune (%s vs %s)" % (walked,expected))
+
+    walked = [ n.abs_path for n in printer.walk( "/", max_depth = 2, compatible = "arm,cortex-a72" ) ]
+    if verbose:
+        print( "/ walk, max depth 2, a72 compatible: %s" % walked )
+    expected = [ "/cpus/cpu@0", "/cpus/cpu@1" ]
+    if walked == expected:
+        test_passed( "walk compatible" )
+    else:
+        test_failed( "walk compatible (%s vs %s)" % (walked,expected))
+
+    print( "[TEST]: end: lazy walk\n" )
+
     print( "[TEST]: start: resolve test" )
     refcount = 0
     root_found = False
@@ -1919,6 +2054,396 @@ def tree_sanity_test( fdt, verbose=0 ):
     else:
         test_passed( "alias lookup for invalid node" )
 
+    # the index and cache tests modify a tree after it has been queried,
+    # and check the answers against a walk of a freshly loaded copy of it
+    indexed = LopperTree()
+    indexed.load( Lopper.export( fdt ) )
+
+    print( "[TEST]: start: address index" )
+    serial = indexed["/amba/serial@ff000000"]
+    if indexed.addr_node( 0xff000000 ) == serial and indexed.addr_nodes( 0xff000800 ) == [ serial ]:
+        test_passed( "address lookup" )
+    else:
+        test_failed( "address lookup (%s,%s)" % (indexed.addr_node( 0xff000000 ),
+                                                 indexed.addr_nodes( 0xff000800 )) )
+
+    # move the bus, and add a node to it
+    indexed["/amba"]["ranges"].value = [ 0x0, 0xff000000, 0x0, 0x80000000, 0x0, 0x1000000 ]
+    timer = LopperNode( -1, "/amba/timer@ff110000" )
+    timer + LopperProp( "reg", -1, timer, [ 0x0, 0xff110000, 0x0, 0x100 ] )
+    indexed + timer
+
+    fresh = LopperTree()
+    fresh.load( indexed.export() )
+    walked = {}
+    for n in fresh:
+        # as addr_node(), address 0 is not indexed
+        if "@" in n.name and n.address():
+            walked[n.address()] = n.abs_path
+
+    found = {}
+    for a in walked.keys():
+        n = indexed.addr_node( a )
+        found[a] = n.abs_path if n else None
+    if verbose:
+        print( "addresses: %s" % [ (hex(a),p) for a,p in walked.items() ] )
+    if found == walked and walked.get( 0x80000000 ) == "/amba/serial@ff000000" and \
+       not indexed.addr_node( 0xff000000 ):
+        test_passed( "address lookup after bus ranges change" )
+    else:
+        test_failed( "address lookup after bus ranges change (%s vs %s)" % (found,walked) )
+
+    timer_address = timer.address()
+    contained = [ n.abs_path for n in indexed.addr_nodes( hex(timer_address + 0x80) ) ]
+    if contained == [ "/amba/timer@ff110000" ] and not indexed.addr_nodes( timer_address + 0x100 ):
+        test_passed( "address range lookup after node add" )
+    else:
+        test_failed( "address range lookup after node add (%s)" % contained )
+
+    indexed - timer
+    if not indexed.addr_nodes( timer_address + 0x80 ) and not indexed.addr_node( timer_address ):
+        test_passed( "address lookup after node delete" )
+    else:
+        test_failed( "address lookup after node delete" )
+    print( "[TEST]: end: address index\n" )
+
+    print( "[TEST]: start: compatible index" )
+    queries = [ ("simple-bus", True), ("arm,cortex-a72", True), ("arm,pl011", True), ("arm,armv8", True),
+                ("^arm,cortex-a", False), ("pl011", False), ("^simple", False) ]
+    # build the index, then change it
+    for q, exact in queries:
+        indexed.cnodes( q, exact )
+
+    indexed["/amba/serial@ff000000"]["compatible"].value = [ "arm,pl011-test", "arm,cortex-a72-uart" ]
+    bus = LopperNode( -1, "/amba_apu/bus" )
+    bus + LopperProp( "compatible", -1, bus, [ "simple-bus" ] )
+    indexed + bus
+    indexed - indexed["/amba_apu/timer"]
+    # the first a72 is re-indexed after the second one
+    indexed["/cpus/cpu@0"]["compatible"].value = [ "arm,cortex-a53" ]
+    indexed["/cpus/cpu@0"]["compatible"].value = [ "arm,cortex-a72", "arm,armv8" ]
+
+    fresh = LopperTree()
+    fresh.load( indexed.export() )
+    for q, exact in queries:
+        walked = []
+        for n in fresh:
+            compat = n.propval( "compatible" )
+            if exact and q in compat or \
+               not exact and [ c for c in compat if re.search( q, c ) ]:
+                walked.append( n.abs_path )
+
+        found = [ n.abs_path for n in indexed.cnodes( q, exact ) ]
+        if verbose:
+            print( "cnodes %s (exact: %s): %s" % (q,exact,found) )
+        if found == walked:
+            test_passed( "compatible lookup: %s (exact: %s)" % (q,exact) )
+        else:
+            test_failed( "compatible lookup: %s (exact: %s) (%s vs %s)" % (q,exact,found,walked) )
+    print( "[TEST]: end: compatible index\n" )
+
+    print( "[TEST]: start: node regex lookups" )
+    node_queries = [ "/amba/serial@ff000000", "^/amba/.*", "^/amba_apu/interrupt-controller@f9.*",
+                     "^/amb", "serial", "^/cpus/cpu@[01]$", "^/amba_apu/timer.*" ]
+    label_queries = [ ("serial0", True), ("gic_.*", True), ("gic", False), ("^uart", False) ]
+    # compile the regexes and build the path trie, then change the tree
+    for q in node_queries:
+        indexed.nodes( q )
+    for q, exact in label_queries:
+        indexed.lnodes( q, exact )
+
+    serial1 = LopperNode( -1, "/amba/serial@ff010000" )
+    serial1 + LopperProp( "compatible", -1, serial1, [ "arm,pl011" ] )
+    indexed + serial1
+    serial1.label_set( "uart1" )
+    indexed - indexed["/amba_apu/smmu@fd800000"]
+    indexed["/amba_apu/interrupt-controller@f9f00000"].name = "interrupt-controller@f9f10000"
+    indexed.sync()
+
+    fresh = LopperTree()
+    fresh.load( indexed.export() )
+    for q in node_queries:
+        walked = [ n.abs_path for n in fresh if re.search( q, n.abs_path ) ]
+        found = [ n.abs_path for n in indexed.nodes( q ) ]
+        if verbose:
+            print( "nodes %s: %s" % (q,found) )
+        if found == walked:
+            test_passed( "node lookup: %s" % q )
+        else:
+            test_failed( "node lookup: %s (%s vs %s)" % (q,found,walked) )
+
+    for q, exact in label_queries:
+        if exact:
+            walked = [ n.abs_path for n in fresh if n.label and re.search( "^" + q + "$", n.label ) ]
+        else:
+            walked = [ n.abs_path for n in fresh if n.label and re.search( q, n.label ) ]
+        found = [ n.abs_path for n in indexed.lnodes( q, exact ) ]
+        if verbose:
+            print( "lnodes %s (exact: %s): %s" % (q,exact,found) )
+        if sorted(found) == sorted(walked):
+            test_passed( "label lookup: %s (exact: %s)" % (q,exact) )
+        else:
+            test_failed( "label lookup: %s (exact: %s) (%s vs %s)" % (q,exact,found,walked) )
+    print( "[TEST]: end: node regex lookups\n" )
+
+    print( "[TEST]: start: lazy property decode" )
+    try:
+        import lopper.fdt
+        lazy_fdt = lopper.fdt.LopperFDT.fdt()
+        lopper.fdt.LopperFDT.sync( lazy_fdt, indexed.export() )
+    except Exception as e:
+        lazy_fdt = None
+        print( "[INFO]: libfdt is not available, skipping lazy decode test (%s)" % e )
+
+    if lazy_fdt:
+        def prop_values( tree ):
+            return [ (p.abs_path, p.value, p.string_val) for n in tree for p in n ]
+
+        lazy = LopperTree()
+        lazy.load( lopper.fdt.LopperFDT.export( lazy_fdt, lazy = True ) )
+        eager = LopperTree()
+        eager.load( lopper.fdt.LopperFDT.export( lazy_fdt ) )
+
+        # change properties that haven't been read, and one that has
+        lazy["/amba/serial@ff000000"]["current-speed"].value = [ 0x2580 ]
+        lazy["/amba_apu/interrupt-controller@f9000000"]["num_interrupts"].value = [ 0x80 ]
+        lazy["/cpus/cpu@0"]["compatible"].value = [ "arm,cortex-a72" ]
+        lazy.sync()
+        eager["/amba/serial@ff000000"]["current-speed"].value = [ 0x2580 ]
+        eager["/amba_apu/interrupt-controller@f9000000"]["num_interrupts"].value = [ 0x80 ]
+        eager["/cpus/cpu@0"]["compatible"].value = [ "arm,cortex-a72" ]
+        eager.sync()
+
+        # export the lazy tree before anything else reads its values
+        fresh = LopperTree()
+        fresh.load( lazy.export() )
+
+        lazy_values = prop_values( lazy )
+        if lazy_values == prop_values( eager ):
+            test_passed( "lazy decode matches eager decode" )
+        else:
+            test_failed( "lazy decode matches eager decode" )
+
+        if prop_values( fresh ) == prop_values( eager ):
+            test_passed( "lazy tree export" )
+        else:
+            test_failed( "lazy tree export" )
+
+        if not lazy.__modified_nodes__:
+            test_passed( "lazy decode does not modify nodes" )
+        else:
+            test_failed( "lazy decode does not modify nodes (%s)" %
+                         [ n.abs_path for n in lazy.__modified_nodes__.values() ] )
+    print( "[TEST]: end: lazy property decode\n" )
+
+    print( "[TEST]: start: phandle maps" )
+    def phandle_maps( tree ):
+        maps = []
+        for n in tree:
+            for p in n:
+                pmap = [ [ r.abs_path if isinstance( r, LopperNode ) else r for r in record ]
+                         for record in p.phandle_map() ]
+                if pmap:
+                    maps.append( (n.abs_path + "/" + p.name, pmap) )
+        return maps
+
+    # a reference to a phandle that no node has yet
+    intc = LopperNode( -1, "/amba/interrupt-controller" )
+    intc + LopperProp( "#interrupt-cells", -1, intc, [ 0x1 ] )
+    indexed + intc
+    intc_phandle = indexed.phandle_gen()
+    serial1 = indexed["/amba/serial@ff010000"]
+    serial1 + LopperProp( "interrupt-parent", -1, serial1, [ intc_phandle ] )
+    phandle_maps( indexed )
+
+    intc.phandle_or_create()
+    indexed - indexed["/amba_apu/interrupt-controller@f9f10000"]
+    indexed["/amba_apu/interrupt-controller@f9000000"]["#interrupt-cells"].value = [ 0x2 ]
+
+    fresh = LopperTree()
+    fresh.load( indexed.export() )
+    found = phandle_maps( indexed )
+    walked = phandle_maps( fresh )
+    if verbose:
+        print( "phandle maps: %s" % found )
+    if found == walked and \
+       [ "/amba/interrupt-controller" ] in dict(found)["/amba/serial@ff010000/interrupt-parent"]:
+        test_passed( "phandle maps after node add, delete and #cells change" )
+    else:
+        test_failed( "phandle maps after node add, delete and #cells change (%s vs %s)" % (found,walked) )
+    print( "[TEST]: end: phandle maps\n" )
+
+    print( "[TEST]: start: referrers" )
+    def referring_props( tree ):
+        # { referenced node path: [ referring property path, ... ] }
+        refs = {}
+        for n in tree:
+            for p in n:
+                for record in p.phandle_map():
+                    for r in record:
+                        if isinstance( r, LopperNode ):
+                            prop_path = n.abs_path + "/" + p.name
+                            if prop_path not in refs.setdefault( r.abs_path, [] ):
+                                refs[r.abs_path].append( prop_path )
+        return refs
+
+    # build the index, then change the references
+    for n in indexed:
+        indexed.referrers( n )
+
+    gic = indexed["/amba_apu/interrupt-controller@f9000000"]
+    serial0 = indexed["/amba/serial@ff000000"]
+    serial0 + LopperProp( "interrupt-parent", -1, serial0, [ gic.phandle ] )
+    indexed["/cpus/cpu@0"]["clocks"].value = [ intc.phandle, 0x1 ]
+    indexed - indexed["/amba/interrupt-multiplex"]
+    indexed["/domains/openamp_r5"] - indexed["/domains/openamp_r5"]["access"]
+
+    fresh = LopperTree()
+    fresh.load( indexed.export() )
+    walked = referring_props( fresh )
+    found = {}
+    for n in indexed:
+        refs = [ p.node.abs_path + "/" + p.name for p in indexed.referrers( n ) ]
+        if refs:
+            found[n.abs_path] = refs
+    if verbose:
+        print( "referrers: %s" % found )
+    if { k: sorted(v) for k,v in found.items() } == { k: sorted(v) for k,v in walked.items() } and \
+       "/cpus/cpu@0/clocks" in found.get( "/amba/interrupt-controller", [] ):
+        test_passed( "referrers after reference changes" )
+    else:
+        test_failed( "referrers after reference changes (%s vs %s)" % (found,walked) )
+    print( "[TEST]: end: referrers\n" )
+
+    print( "[TEST]: start: address translation cache" )
+    def translations( tree ):
+        addresses = [ (n.abs_path, n.address()) for n in tree if "@" in n.name ]
+        translated = [ (n.abs_path, t) for n, t in tree.translate_all().items() ]
+        return addresses, translated
+
+    # fill the cache, then change the mappings
+    translations( indexed )
+    indexed["/amba_apu"]["ranges"].value = [ 0x0, 0xf9000000, 0x0, 0xa0000000, 0x0, 0x1000000 ]
+    indexed["/amba_apu/interrupt-controller@f9000000"]["reg"].value = [ 0x0, 0xf9000000, 0x0, 0x40000 ]
+    indexed["/amba/serial@ff010000"].name = "serial@ff020000"
+    indexed["/amba"]["#size-cells"].value = [ 0x1 ]
+    indexed.sync()
+
+    fresh = LopperTree()
+    fresh.load( indexed.export() )
+    found = translations( indexed )
+    walked = translations( fresh )
+    if verbose:
+        print( "translated addresses: %s" % found[1] )
+    if found == walked and \
+       ("/amba_apu/interrupt-controller@f9000000", 0xa0000000) in found[0]:
+        test_passed( "address translations after mapping changes" )
+    else:
+        test_failed( "address translations after mapping changes (%s vs %s)" % (found,walked) )
+    print( "[TEST]: end: address translation cache\n" )
+
+    print( "[TEST]: start: code block cache" )
+    # (lopper-label properties carry the labels of an exported tree)
+    code = "return [ node_name ] + [ p.name for p in node if not p.name.startswith( 'lopper-label' ) ] + " \
+           "[ c.name for c in node.child_nodes.values() ]"
+    # prepare the block, then change the tree
+    for n in indexed:
+        indexed.exec_cmd( n, code )
+
+    serial0 = indexed["/amba/serial@ff000000"]
+    serial0 + LopperProp( "exec-test", -1, serial0, [ 1 ] )
+    serial0 - serial0["cts-override"]
+    cpu_sleep = LopperNode( -1, "/cpus/idle-states/cpu-sleep-1" )
+    indexed + cpu_sleep
+    indexed - indexed["/tcm"]
+
+    fresh = LopperTree()
+    fresh.load( indexed.export() )
+    found = [ indexed.exec_cmd( n, code ) for n in indexed ]
+    walked = [ fresh.exec_cmd( n, code ) for n in fresh ]
+    if found == walked:
+        test_passed( "code block results after tree changes" )
+    else:
+        test_failed( "code block results after tree changes (%s vs %s)" % (found,walked) )
+
+    # globals set by a block are not seen by the next call
+    code = """
+global first_node
+try:
+    return first_node
+except NameError:
+    first_node = node_name
+    return "unset"
+"""
+    found = [ indexed.exec_cmd( n, code ) for n in [ "/cpus", "/amba", "/cpus" ] ]
+    if found == [ "unset", "unset", "unset" ]:
+        test_passed( "code block globals" )
+    else:
+        test_failed( "code block globals (%s)" % found )
+
+    for i in range( lopper.tree.exec_cache_size * 2 ):
+        indexed.exec_cmd( "/cpus", "return %s" % i )
+    if len( indexed.__exec_cache__ ) == lopper.tree.exec_cache_size and \
+       indexed.exec_cmd( "/cpus", "return 1" ) == 1:
+        test_passed( "code block cache size" )
+    else:
+        test_failed( "code block cache size (%s)" % len( indexed.__exec_cache__ ) )
+    print( "[TEST]: end: code block cache\n" )
+
+    print( "[TEST]: start: node iteration" )
+    def child_walk( node ):
+        walked = [ node.abs_path ]
+        for c in node.child_nodes.values():
+            walked.extend( child_walk( c ) )
+        return walked
+
+    # build the node order, then change the tree
+    for n in indexed:
+        pass
+
+    serial_child = LopperNode( -1, "/amba/serial@ff000000/port" )
+    indexed + serial_child
+    indexed - indexed["/domains/openamp_r5"]
+    indexed["/amba_apu/bus"].name = "bus@0"
+    indexed.sync()
+
+    fresh = LopperTree()
+    fresh.load( indexed.export() )
+    walked = child_walk( fresh["/"] )
+
+    # every node of a full iteration, runs a subnode iteration (and a
+    # full iteration) of its own
+    outer = []
+    inner_ok = True
+    for n in indexed:
+        outer.append( n.abs_path )
+        indexed.__current_node__ = n.abs_path
+        subnodes = [ s.abs_path for s in indexed ]
+        if subnodes != child_walk( fresh[n.abs_path] ) or \
+           [ s.abs_path for s in indexed ] != walked:
+            inner_ok = False
+            if verbose:
+                print( "%s iteration: %s" % (n.abs_path,subnodes) )
+
+    if outer == walked:
+        test_passed( "full iteration after tree changes" )
+    else:
+        test_failed( "full iteration after tree changes (%s vs %s)" % (outer,walked) )
+
+    if inner_ok:
+        test_passed( "nested iterations after tree changes" )
+    else:
+        test_failed( "nested iterations after tree changes" )
+
+    indexed.__start_node__ = "/amba_apu"
+    started = [ n.abs_path for n in indexed ]
+    indexed.reset()
+    if started == walked[walked.index( "/amba_apu" ):]:
+        test_passed( "start node iteration after tree changes" )
+    else:
+        test_failed( "start node iteration after tree changes (%s)" % started )
+    print( "[TEST]: end: node iteration\n" )
+
 
 def lops_code_test( device_tree, lop_file, verbose ):
 
@@ -1937,6 +2462,11 @@ def lops_code_test( device_tree, lop_file, verbose ):
     else:
         test_failed( "code block exec" )
 
+    if re.search( "nested lop of a false conditional executed", test_output ):
+        test_failed( "nested lop of a false conditional" )
+    else:
+        test_passed( "nested lop of a false conditional" )
+
     if re.search( "\[FOUND\] enable-method", test_output ):
         test_passed( "enable-method, true block" )
     else:
@@ -2019,8 +2549,159 @@ def lops_code_test( device_tree, lop_file, verbose ):
     else:
         test_failed( "selection test (or) (found %s, expected: %s)" %(c,4))
 
+    batch_output = device_tree.outdir + "/batch-cpus.dts"
+    if os.path.exists( batch_output ):
+        c = test_pattern_count( batch_output, r"cpu@[0-9]+ {" )
+        if c == 3 and test_pattern_count( batch_output, "idle-states {" ) == 0:
+            test_passed( "batch code lop selection output" )
+        else:
+            test_failed( "batch code lop selection output (found %s cpus, expected: %s)" %(c,3))
+    else:
+        test_failed( "batch code lop selection output (%s not written)" % batch_output )
+
     output.reset()
 
+def lops_jobs_test( dt, lop_file, outdir, verbose ):
+    outputs = [ "jobs-cpus.dts", "jobs-amba.dts", "jobs-all.dts",
+                "jobs-cpus-modified.dts", "jobs-memory.dts" ]
+
+    for jobs in [ 1, 4 ]:
+        jobs_outdir = outdir + "/jobs-%s" % jobs
+        shutil.rmtree( jobs_outdir, ignore_errors = True )
+        os.makedirs( jobs_outdir )
+
+        device_tree = LopperSDT( dt )
+        device_tree.dryrun = False
+        device_tree.verbose = verbose
+        device_tree.werror = werror
+        device_tree.output_file = jobs_outdir + "/jobs-output.dts"
+        device_tree.cleanup_flag = True
+        device_tree.save_temps = False
+        device_tree.outdir = jobs_outdir
+        device_tree.use_libfdt = libfdt
+        device_tree.jobs = jobs
+
+        print( "[TEST]: running output lops with -j%s" % jobs )
+        device_tree.setup( dt, [lop_file], "", True, libfdt = libfdt )
+        device_tree.perform_lops()
+        device_tree.cleanup()
+
+    for o in outputs:
+        j1 = outdir + "/jobs-1/" + o
+        j4 = outdir + "/jobs-4/" + o
+        if not os.path.exists( j1 ) or not os.path.exists( j4 ):
+            test_failed( "jobs output %s not written" % o )
+        elif filecmp.cmp( j1, j4, shallow = False ):
+            test_passed( "jobs output %s (-j1 vs -j4)" % o )
+        else:
+            test_failed( "jobs output %s differs (-j1 vs -j4)" % o )
+
+    c = test_pattern_count( outdir + "/jobs-4/jobs-cpus-modified.dts", "jobs-prop" )
+    if c == 1 and test_pattern_count( outdir + "/jobs-4/jobs-cpus.dts", "jobs-prop" ) == 0:
+        test_passed( "jobs lop ordering" )
+    else:
+        test_failed( "jobs lop ordering" )
+
+def batch_test( dt, outdir, verbose ):
+    batch_outdir = outdir + "/batch"
+    shutil.rmtree( batch_outdir, ignore_errors = True )
+    os.makedirs( batch_outdir )
+
+    # the second job fails, its assist doesn't exist
+    batch_file = batch_outdir + "/jobs.txt"
+    with open( batch_file, "w" ) as w:
+        w.write( ":%s/batch-ok.dts\n" % batch_outdir )
+        w.write( ":%s/batch-fail.dts::no_such_assist\n" % batch_outdir )
+
+    cmd = [ sys.executable, "-m", "lopper", "-f", "-O", batch_outdir, "--batch", batch_file, dt ]
+    if not libfdt:
+        cmd.insert( 3, "--no-libfdt" )
+
+    print( "[TEST]: running batch: %s" % " ".join( cmd ) )
+    result = subprocess.run( cmd, cwd = os.path.dirname( os.path.realpath( __file__ ) ),
+                             stdout = subprocess.PIPE, stderr = subprocess.STDOUT,
+                             universal_newlines = True )
+    if verbose:
+        print( result.stdout )
+
+    if result.returncode != 0:
+        test_passed( "batch exit status" )
+    else:
+        test_failed( "batch exit status (expected failure, got %s)" % result.returncode )
+
+    if os.path.exists( batch_outdir + "/batch-ok.dts" ):
+        test_passed( "batch job output" )
+    else:
+        test_failed( "batch job output" )
+
+    if not os.path.exists( batch_outdir + "/batch-fail.dts" ) and \
+       re.search( r"batch job 1 .* failed", result.stdout ):
+        test_passed( "batch failed job" )
+    else:
+        test_failed( "batch failed job" )
+
+def sync_test( dt, outdir, verbose ):
+    def sync_state( tree ):
+        # a full load carries the node labels in lopper-label properties
+        # (see LopperNode.export()), they are compared as node labels
+        state = []
+        for n in tree:
+            state.append( ( n.abs_path, n.label,
+                            [ (p.name, p.value, p.string_val) for p in n
+                              if not re.match( r'lopper-label.*', p.name ) ] ) )
+        return state, list( tree.__lnodes__.keys() )
+
+    changes = { "unrelated property": [ ( "/amba/ethernet@ff0c0000", "status", "disabled" ) ],
+                "phandle reference": [ ( "/amba/ethernet@ff0c0000", "iommus", [ 0x1b, 0x234 ] ) ],
+                "phandle value": [ ( "/amba_apu/smmu@fd800000", "phandle", [ 0x70 ] ),
+                                   ( "/amba/ethernet@ff0c0000", "iommus", [ 0x70, 0x234 ] ) ] }
+
+    for name, change in changes.items():
+        # one tree is synced incrementally (only the modified nodes are
+        # reloaded), the other is fully reloaded. They must match.
+        trees = []
+        for i in range(2):
+            device_tree = LopperSDT( dt )
+            device_tree.dryrun = False
+            device_tree.verbose = verbose
+            device_tree.outdir = outdir
+            device_tree.use_libfdt = libfdt
+            device_tree.setup( dt, [], "", True, libfdt = libfdt )
+
+            tree = device_tree.tree
+            for path, pname, value in change:
+                tree[path][pname].value = value
+
+            if i == 0:
+                tree.sync()
+            else:
+                tree.load( tree.export() )
+
+            trees.append( tree )
+            device_tree.cleanup()
+
+        # neither the sync, nor an export, leaves nodes to be synced
+        trees[0].export()
+        if trees[0].__modified_nodes__:
+            test_failed( "incremental sync (%s): nodes left modified: %s" %
+                         (name, [ n.abs_path for n in trees[0].__modified_nodes__.values() ]) )
+
+        incremental_nodes, incremental_labels = sync_state( trees[0] )
+        full_nodes, full_labels = sync_state( trees[1] )
+
+        if incremental_labels != full_labels:
+            test_failed( "incremental sync (%s): labels %s, full load: %s" %
+                         (name, incremental_labels, full_labels) )
+        elif incremental_nodes != full_nodes:
+            for i, f in zip( incremental_nodes, full_nodes ):
+                if i != f:
+                    test_failed( "incremental sync (%s): %s differs from a full load" % (name, i[0]) )
+                    if verbose:
+                        print( "    incremental: %s\n    full:        %s" % (i, f) )
+                    break
+        else:
+            test_passed( "incremental sync (%s) matches a full load" % name )
+
 def lops_sanity_test( device_tree, lop_file, verbose ):
     if not libfdt:
         return
@@ -2174,6 +2855,68 @@ def format_sanity_test( device_tree, verbose ):
     device_tree.write( enhanced = True )
 
 
+def dtb_blocks( dtb ):
+    """the header and blocks of a dtb, with the padding of property values zeroed
+
+    libfdt leaves stale bytes in the padding of the property values that it
+    inserts, so they are not compared.
+    """
+    header = struct.unpack_from( '>10I', dtb )
+    magic, totalsize, off_dt_struct, off_dt_strings, off_mem_rsvmap, \
+        version, last_comp_version, boot_cpuid_phys, size_dt_strings, size_dt_struct = header
+
+    dt_struct = bytearray( dtb[off_dt_struct:off_dt_struct + size_dt_struct] )
+    offset = 0
+    while offset < len(dt_struct):
+        tag, = struct.unpack_from( '>I', dt_struct, offset )
+        offset += 4
+        if tag == 0x1:
+            name_end = dt_struct.index( 0, offset ) + 1
+            offset = name_end + ( -name_end % 4 )
+        elif tag == 0x3:
+            prop_len, name_offset = struct.unpack_from( '>II', dt_struct, offset )
+            offset += 8 + prop_len
+            pad = -offset % 4
+            dt_struct[offset:offset + pad] = bytes( pad )
+            offset += pad
+
+    return ( header, bytes( dtb[off_mem_rsvmap:off_dt_struct] ), bytes( dt_struct ),
+             bytes( dtb[off_dt_strings:off_dt_strings + size_dt_strings] ) )
+
+def dtb_encode_test( device_tree, verbose ):
+    try:
+        import lopper.fdt
+    except Exception as e:
+        print( "[INFO]: libfdt is not available, skipping dtb encode test (%s)" % e )
+        return
+
+    dct = device_tree.tree.export()
+    encoded = Lopper.encode_dtb( dct )
+
+    fdt = lopper.fdt.LopperFDT.fdt()
+    lopper.fdt.LopperFDT.sync( fdt, device_tree.tree.export() )
+    synced = fdt.as_bytearray()
+
+    encoded_blocks = dtb_blocks( encoded )
+    synced_blocks = dtb_blocks( synced )
+    if verbose:
+        print( "[INFO]: encoded dtb header: %s" % (encoded_blocks[0],) )
+        print( "[INFO]: synced dtb header:  %s" % (synced_blocks[0],) )
+
+    for i, block in enumerate( [ "header", "memory reservation map", "structure block", "strings block" ] ):
+        if encoded_blocks[i] == synced_blocks[i]:
+            test_passed( "dtb encode matches libfdt sync: %s" % block )
+        else:
+            test_failed( "dtb encode matches libfdt sync: %s" % block )
+
+    # an encoded dtb that is read back, encodes to the same bytes
+    lt = LopperTree()
+    lt.load( Lopper.dtb_export( bytes( encoded ) ) )
+    if Lopper.encode_dtb( lt.export() ) == encoded:
+        test_passed( "dtb re-encode" )
+    else:
+        test_failed( "dtb re-encode" )
+
 def fdt_sanity_test( device_tree, verbose ):
 
     device_tree.setup( dt, [], "", True, libfdt = libfdt )
@@ -2459,6 +3202,13 @@ if __name__ == "__main__":
 
         lops_code_test( device_tree, lop_file_2, verbose )
 
+        lop_file_3 = setup_jobs_lops( outdir )
+        lops_jobs_test( dt, lop_file_3, outdir, verbose )
+
+        batch_test( dt, outdir, verbose )
+
+        sync_test( dt, outdir, verbose )
+
     if assists:
         dt = setup_system_device_tree( outdir )
         lop_file = setup_assist_lops( outdir )
@@ -2513,4 +3263,6 @@ if __name__ == "__main__":
 
         fdt_sanity_test( device_tree, verbose )
 
+        dtb_encode_test( device_tree, verbose )
+
         device_tree.tree.print()